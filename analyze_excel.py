@@ -1,17 +1,22 @@
-import pandas as pd
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "app"))
+from xlsx_reader import read_sheet, list_sheets
 
 # Path to the Excel file
 file_path = '/mnt/c/Users/charl/Projects/Cannabis-order-app/CannabisRetailersManualOrderForm.xlsm'
 
 try:
     # Get the sheet names
-    excel_file = pd.ExcelFile(file_path)
-    print(f"Sheet names in the file: {excel_file.sheet_names}")
+    sheet_names = list_sheets(file_path)
+    print(f"Sheet names in the file: {sheet_names}")
     
     # Try to read the Catalogue sheet (if it exists)
-    if 'Catalogue' in excel_file.sheet_names:
-        # Read with openpyxl engine to handle .xlsm files
-        df = pd.read_excel(file_path, sheet_name='Catalogue', engine='openpyxl')
+    if 'Catalogue' in sheet_names:
+        # The header row is found by looking for AGLC SKU / EachesPerCase
+        df = read_sheet(file_path, 'Catalogue')
+        print(f"\nHeader found in row {df.attrs['header_row']}")
         print(f"\nColumns in the Catalogue sheet: {df.columns.tolist()}")
         
         # Check for EachesPerCase column
@@ -23,7 +28,7 @@ try:
             print("\nEachesPerCase column NOT found!")
             
             # Look for columns with 'case' in the name
-            case_cols = [col for col in df.columns if 'case' in col.lower()]
+            case_cols = [col for col in df.columns if 'case' in str(col).lower()]
             if case_cols:
                 print(f"Found case-related columns: {case_cols}")
                 # Show sample values from these columns
@@ -37,8 +42,8 @@ try:
         print(df.head().to_string())
     else:
         # If 'Catalogue' not found, try other sheets
-        for sheet in excel_file.sheet_names:
-            df = pd.read_excel(file_path, sheet_name=sheet, engine='openpyxl')
+        for sheet in sheet_names:
+            df = read_sheet(file_path, sheet, header_detect=False)
             print(f"\nColumns in sheet '{sheet}': {df.columns.tolist()}")
             
             # Check for EachesPerCase in this sheet
@@ -0,0 +1,134 @@
+"""
+Compact catalogue built once per order-form template version.
+
+The Catalogue sheet is mostly text (Brand Name, Format, Subcategory, THC /
+CBD ranges, ...) that repeats across thousands of SKUs. ``compact_frame``
+dictionary-encodes those columns as categoricals and narrows the integer
+columns to int32, so the numeric data sits in a few consolidated blocks and
+every later copy and merge in main.py moves far fewer bytes.
+
+The compact frame is pickled under ``.cache/catalogue`` keyed by the
+template's SHA-256, so an unchanged template is never re-parsed. The last
+few catalogues are also kept in memory, shared by every Streamlit session
+of the server process, so a rerun or another user's run with the same
+template reads neither the sheet nor the pickle. The pickle is written
+under a temporary name of its own and moved into place, so server
+processes building the same catalogue at once never read a partial file.
+"""
+import os
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from etl.checkpoint import atomic_write
+from xlsx_reader import read_sheet, CATALOGUE_SHEETS
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.path.join(PROJECT_ROOT, ".cache", "catalogue")
+
+# bump when compact_frame changes so stale pickles are rebuilt
+CATALOGUE_FORMAT = 1
+
+# a text column becomes categorical when it has at most this many distinct
+# values per row (SKU codes and descriptions are unique and stay as text)
+CATEGORY_MAX_RATIO = 0.5
+
+INT32 = np.iinfo(np.int32)
+
+# catalogues kept in memory, least recently used first; one per template
+# version, so a handful covers a template update mid-day
+MEMORY_ENTRIES = 4
+_memory = OrderedDict()
+# held while a catalogue is loaded, so sessions asking for the same new
+# template at once wait for one parse instead of each running their own
+_load_lock = threading.Lock()
+
+
+def compact_frame(df: pd.DataFrame, max_ratio: float = CATEGORY_MAX_RATIO) -> pd.DataFrame:
+    """
+    Dictionary-encodes repetitive text columns and narrows integer
+    columns to int32. Text is never parsed as numbers, so SKU codes keep any leading
+    zeros. ``df.attrs`` is carried over.
+    """
+    columns = {}
+    for col in df.columns:
+        s = df[col]
+        if pd.api.types.is_integer_dtype(s.dtype) and not pd.api.types.is_bool_dtype(s.dtype):
+            # int32 rather than the smallest type, so products like
+            # cases × EachesPerCase cannot overflow
+            if s.empty or (s.min() >= INT32.min and s.max() <= INT32.max):
+                s = s.astype("int32")
+        elif pd.api.types.is_object_dtype(s.dtype) or pd.api.types.is_string_dtype(s.dtype):
+            non_null = s.notna().sum()
+            if non_null and s.nunique(dropna=True) <= max_ratio * non_null:
+                s = s.astype("category")
+        columns[col] = s
+    compact = pd.DataFrame(columns, index=df.index)
+    compact.attrs.update(df.attrs)
+    return compact
+
+
+def _cache_path(cache_dir: str, sha256: str) -> str:
+    return os.path.join(cache_dir, f"{sha256}-v{CATALOGUE_FORMAT}.pkl")
+
+
+def _remember(key: str, df: pd.DataFrame):
+    _memory[key] = df
+    _memory.move_to_end(key)
+    while len(_memory) > MEMORY_ENTRIES:
+        _memory.popitem(last=False)
+
+
+def _recall(key: str):
+    df = _memory.get(key)
+    if df is not None:
+        _memory.move_to_end(key)
+    return df
+
+
+def _load(template, cache_dir: str):
+    path = _cache_path(cache_dir, template.sha256)
+    if os.path.exists(path):
+        try:
+            return pd.read_pickle(path), True
+        except Exception as e:
+            logger.warning("Ignoring unreadable catalogue cache %s: %s", path, e)
+
+    df = compact_frame(read_sheet(template, CATALOGUE_SHEETS))
+    os.makedirs(cache_dir, exist_ok=True)
+    atomic_write(path, df.to_pickle)
+    return df, False
+
+
+def _copy_on_write() -> bool:
+    # always on from pandas 3; before that only when switched on
+    if int(pd.__version__.split(".")[0]) >= 3:
+        return True
+    return pd.get_option("mode.copy_on_write") is True
+
+
+def load_catalogue(template, cache_dir: str = CACHE_DIR):
+    """
+    The compact catalogue of a TemplateFile. Returns ``(df, reused)``, where
+    ``reused`` is True when it came from memory or the cache for this
+    template version rather than from parsing the sheet.
+
+    The caller may add or overwrite columns of the frame returned without
+    touching the one kept in memory for other sessions: with pandas'
+    copy-on-write (always on from pandas 3) it is a shallow copy, otherwise
+    a deep one.
+
+    ``df.attrs`` holds the ``sheet`` and ``header_row`` it was read from.
+    Errors from read_sheet (no catalogue sheet, no header row) propagate.
+    """
+    key = _cache_path(cache_dir, template.sha256)
+    with _load_lock:
+        df = _recall(key)
+        reused = df is not None
+        if df is None:
+            df, reused = _load(template, cache_dir)
+            _remember(key, df)
+    return df.copy(deep=not _copy_on_write()), reused
@@ -7,11 +7,15 @@ import sys
 from io import BytesIO
 import pandas as pd
 from openpyxl import load_workbook
+from xlsx_reader import quick_check
 
 def check_excel_file(file_path):
     """
     Verify that a file is a valid Excel document and has expected structure.
     Returns True if valid, False otherwise.
+
+    Uses xlsx_reader.quick_check and only loads the workbook with openpyxl
+    (then pandas) when the zip-level check cannot read it.
     """
     try:
         # Check file exists
@@ -33,6 +37,25 @@ def check_excel_file(file_path):
                 print(f"First 8 bytes: {header}")
                 return False
         
+        # Fast path: read only the zip directory, workbook.xml and the first
+        # rows of the catalogue sheet (verdicts are cached by file hash)
+        verdict = quick_check(file_path)
+        if verdict["valid"]:
+            print(f"Sheets in workbook: {verdict['sheets']}")
+            if verdict["sheet"] is None:
+                print("Warning: Neither 'Catalog' nor 'Catalogue' sheet found.")
+                print(f"Available sheets: {verdict['sheets']}")
+            else:
+                print(f"Found expected sheet: '{verdict['sheet']}'")
+                if verdict["header_row"] is None:
+                    print("Warning: No header row with 'AGLC SKU' or 'EachesPerCase' in the first 20 rows.")
+                elif verdict["missing_headers"]:
+                    print(f"Warning: Header row {verdict['header_row']} is missing {verdict['missing_headers']}")
+                else:
+                    print(f"Found catalogue headers in row {verdict['header_row']}")
+            return True
+        print(f"Fast check could not read the workbook ({verdict['error']}), trying openpyxl")
+
         # Try opening with openpyxl
         try:
             wb = load_workbook(filename=file_path, read_only=True)
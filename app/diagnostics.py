@@ -0,0 +1,104 @@
+"""
+Lazily formatted diagnostics for the merge pipeline in main.py.
+
+The pipeline used to send dozens of ``st.info`` / ``st.code`` / ``st.write``
+messages per location (full column lists, sample rows, merge keys) to the
+browser on every run. A ``Diagnostics`` log keeps them instead, to be
+rendered on demand in a collapsible panel: a message above the chosen
+verbosity returns after one comparison, without formatting its arguments or
+calling the callables among them. A kept message is formatted when it is
+logged and a kept frame copied, so the log, which outlives the run in the
+session state, holds text and small frames rather than references to the
+pipeline's catalogue and ETL frames.
+
+Like template_source, this module makes no Streamlit calls itself;
+``render`` is given the Streamlit module or a container to draw into.
+"""
+import pandas as pd
+import numpy as np
+
+OFF, INFO, DEBUG = 0, 1, 2
+LEVELS = {"Off": OFF, "Info": INFO, "Debug": DEBUG}
+
+# longest list shown in full; longer ones are cut with a count
+MAX_ITEMS = 60
+
+
+def _plain(value):
+    # a callable argument is a value too costly to compute unless rendered;
+    # Index / array arguments read like the .tolist() output they replace
+    if callable(value):
+        value = value()
+    if isinstance(value, (pd.Index, pd.Series, np.ndarray)):
+        value = value.tolist()
+    if isinstance(value, (list, tuple)) and len(value) > MAX_ITEMS:
+        return f"{list(value[:MAX_ITEMS])} … ({len(value)} items)"
+    return value
+
+
+class Diagnostics:
+    """
+    A structured log of ``(level, kind, section, rendered)`` entries.
+
+    ``kind`` is "text", "code" or "frame"; text and code messages are
+    ``str.format`` templates filled from their arguments (callable
+    arguments are called first), a frame message is a callable returning
+    the DataFrame to show. Either is only evaluated if the message is
+    kept. ``section`` groups entries in the panel (see ``section``).
+    """
+
+    def __init__(self, level: int = INFO):
+        self.level = level
+        self.entries = []
+        self._section = None
+
+    def _add(self, level: int, kind: str, message, args):
+        if level > self.level:
+            return
+        if kind == "frame":
+            rendered = message().copy()
+        else:
+            rendered = message.format(*(_plain(a) for a in args))
+        self.entries.append((level, kind, self._section, rendered))
+
+    def info(self, message: str, *args):
+        self._add(INFO, "text", message, args)
+
+    def debug(self, message: str, *args):
+        self._add(DEBUG, "text", message, args)
+
+    def code(self, message: str, *args, level: int = DEBUG):
+        self._add(level, "code", message, args)
+
+    def frame(self, build, level: int = DEBUG):
+        """Logs a copy of a frame; ``build`` (e.g. ``df.head``) is only called if it is kept."""
+        self._add(level, "frame", build, ())
+
+    def section(self, name: str):
+        """Entries logged from now on are grouped under ``name``."""
+        self._section = name
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lines(self):
+        """``(section, kind, rendered)`` for every entry."""
+        for _, kind, section, rendered in self.entries:
+            yield section, kind, rendered
+
+    def render(self, target, title: str = "Diagnostics"):
+        """Draws the log into a collapsed expander of ``target`` (``st`` or a container)."""
+        if not self.entries:
+            return
+        with target.expander(f"{title} ({len(self.entries)} messages)", expanded=False):
+            current = None
+            for section, kind, rendered in self.lines():
+                if section != current and section is not None:
+                    target.markdown(f"**{section}**")
+                current = section
+                if kind == "frame":
+                    target.dataframe(rendered)
+                elif kind == "code":
+                    target.code(rendered)
+                else:
+                    target.text(rendered)
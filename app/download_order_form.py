@@ -1,20 +1,202 @@
 import os
+import json
 import requests
 import sys
+import shutil
 from bs4 import BeautifulSoup
 from dotenv import load_dotenv
 
+# when run directly only app/ is on sys.path; the cache files are written
+# with the ETL's atomic_write
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from etl.checkpoint import atomic_write
+from session_store import load_cookies, save_cookies, clear_cookies
+from template_file import TemplateFile, NotATemplateError, stream_to_file
+
 load_dotenv()  # expects RETAIL_USER and RETAIL_PASS in .env
 
+CACHE_DIR = os.path.join(PROJECT_ROOT, ".cache", "order_form")
+COOKIE_PATH = os.path.join(CACHE_DIR, "session.bin")
+TEMPLATE_CACHE_PATH = os.path.join(CACHE_DIR, "CannabisRetailersManualOrderForm.xlsm")
+TEMPLATE_META_PATH = os.path.join(CACHE_DIR, "template.json")
+
+
+def _load_template_meta():
+    """Validators (ETag / Last-Modified) of the cached template, if it is still there."""
+    if not (os.path.exists(TEMPLATE_META_PATH) and os.path.exists(TEMPLATE_CACHE_PATH)):
+        return {}
+    try:
+        with open(TEMPLATE_META_PATH, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_template_meta(template, headers):
+    # written aside and moved into place: a reader never sees a partial
+    # file, which would silently drop the conditional download
+    meta = {
+        "etag":          headers.get("ETag"),
+        "last_modified": headers.get("Last-Modified"),
+        "sha256":        template.sha256,
+        "size":          template.size
+    }
+
+    def write(tmp_path: str):
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+
+    atomic_write(TEMPLATE_META_PATH, write)
+
+
+def _cached_template(meta):
+    # trust the recorded hash while the file still has the recorded size
+    if meta.get("sha256") and meta.get("size") == os.path.getsize(TEMPLATE_CACHE_PATH):
+        return TemplateFile(TEMPLATE_CACHE_PATH, sha256=meta["sha256"], size=meta["size"])
+    return TemplateFile(TEMPLATE_CACHE_PATH)
+
+
+def _login(session):
+    """Logs the session in: GET login page → CSRF token → POST credentials → verify."""
+    USERNAME = os.getenv("RETAIL_USER") or input("Retailer Username: ")
+    PASSWORD = os.getenv("RETAIL_PASS") or input("Retailer Password: ")
+
+    # 1) GET login page → extract CSRF token & initial cookies
+    login_page = session.get("https://retail.albertacannabis.org/login")
+    login_page.raise_for_status()
+    soup = BeautifulSoup(login_page.text, "html.parser")
+    token_input = soup.find("input", {"name": "__RequestVerificationToken"})
+    if not token_input:
+        raise RuntimeError("Could not find CSRF token on login page")
+    csrf_token = token_input["value"]
+
+    # 2) POST credentials + token
+    login_api = "https://retail.albertacannabis.org/api/cxa/AglcLogin/AglcLogin"
+    login_payload = {
+        "__RequestVerificationToken": csrf_token,
+        "returnUrl": "/api/cxa/quickorder/downloadquickorderform?downloadFileName=CannabisRetailersManualOrderForm.xlsm&mediaLibraryGuid=51f2bf35-856d-484e-b84b-f6e66710b54b",
+        "UserName": USERNAME,
+        "Password": PASSWORD,
+        "g-recaptcha-response": "",
+        "g-recaptcha-currentItemId": ""
+    }
+    login_headers = {
+        "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
+        "X-Requested-With": "XMLHttpRequest",
+        "Referer": "https://retail.albertacannabis.org/login"
+    }
+
+    resp = session.post(login_api, data=login_payload, headers=login_headers)
+    resp.raise_for_status()
+    result = resp.json()
+    if not result.get("success", True) or result.get("HasErrors", False):
+        # Check for CAPTCHA error specifically
+        if any('captcha' in str(err).lower() for err in result.get('Errors', [])):
+            raise RuntimeError(
+                "Login failed: CAPTCHA verification required. "
+                "The website now requires manual CAPTCHA verification. "
+                "Please use the manual download option instead."
+            )
+        else:
+            raise RuntimeError("Login failed: " + str(result))
+
+    # Verify login success by checking a protected page
+    dashboard = session.get("https://retail.albertacannabis.org/dashboard")
+    if "Log out" not in dashboard.text and "Sign out" not in dashboard.text:
+        raise RuntimeError("Login succeeded but session was not established properly.")
+
+
+def _download(session):
+    """
+    Downloads the order form with the session as it is.
+
+    Sends If-None-Match / If-Modified-Since for the cached copy, so an
+    unchanged template costs a single 304. A new template is streamed
+    straight into the cache file (see template_file.stream_to_file). Returns
+    a TemplateFile, or None when the site answered with its login page
+    (session not valid).
+    """
+    download_url = (
+        "https://retail.albertacannabis.org/api/cxa/QuickOrder/DownloadQuickOrderForm"
+    )
+    # The mediaLibraryGuid might have changed. If this doesn't work,
+    # you'll need to manually check the site to get the updated GUID.
+    download_params = {
+        "downloadFileName": "CannabisRetailersManualOrderForm.xlsm",
+        "mediaLibraryGuid": "51f2bf35-856d-484e-b84b-f6e66710b54b"
+    }
+
+    download_headers = {
+        "Accept": "application/vnd.ms-excel.sheet.macroEnabled.12,application/vnd.openxmlformats-officedocument.spreadsheetml.sheet,application/octet-stream,*/*",
+        "Referer": "https://retail.albertacannabis.org/quick-order",
+    }
+    meta = _load_template_meta()
+    if meta.get("etag"):
+        download_headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        download_headers["If-Modified-Since"] = meta["last_modified"]
+
+    dl = session.get(download_url, params=download_params, headers=download_headers,
+                     stream=True)
+    if dl.status_code == 304:
+        dl.close()
+        print("Order form unchanged since last download (304), using cached copy")
+        return _cached_template(meta)
+    if dl.status_code in (401, 403):
+        dl.close()
+        return None
+    if not dl.ok:
+        dl.close()
+    dl.raise_for_status()
+
+    content_type = dl.headers.get('Content-Type', 'unknown')
+    print(f"Content-Type received: {content_type}")
+    print(f"Response status code: {dl.status_code}")
+    print(f"Content-Length header: {dl.headers.get('Content-Length', 'not sent')}")
+
+    try:
+        template = stream_to_file(dl, TEMPLATE_CACHE_PATH)
+    except NotATemplateError as e:
+        # We got HTML instead of Excel
+        snippet = e.head[:200].decode("utf-8", errors="replace")
+
+        # A login page means the session is not (or no longer) logged in
+        if 'login' in snippet.lower() or 'sign in' in snippet.lower():
+            return None
+
+        print(f"Response URL: {dl.url}")
+        print(f"Full headers: {dict(dl.headers)}")
+
+        # Save the HTML response for debugging
+        debug_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'download_response.html')
+        with open(debug_path, 'wb') as f:
+            f.write(e.head)
+
+        raise RuntimeError(
+            "Download did not return a valid Office file. "
+            f"Content type was {content_type} (expected Excel). "
+            f"Debug file saved to {debug_path}. "
+            "First 200 bytes:\n" + snippet
+        )
+
+    print(f"Downloaded {template.size} bytes, sha256 {template.sha256}")
+    _save_template_meta(template, dl.headers)
+    return template
+
+
 def download_order_form():
     """
     Attempts to download the Cannabis Retailers Manual Order Form.
-    Returns the file content as bytes if successful.
+    Returns a TemplateFile for the downloaded (or unchanged, cached) file
+    if successful; open() or mmap() it rather than reading it into memory.
     Raises RuntimeError with detailed message if download fails.
-    """
-    USERNAME = os.getenv("RETAIL_USER") or input("Retailer Username: ")
-    PASSWORD = os.getenv("RETAIL_PASS") or input("Retailer Password: ")
 
+    A session saved by a previous run (see session_store) is tried first, and
+    the full login flow only runs when the site no longer accepts it.
+    """
     session = requests.Session()
     session.headers.update({
         "User-Agent": (
@@ -25,103 +207,27 @@ def download_order_form():
     })
 
     try:
-        # 1) GET login page → extract CSRF token & initial cookies
-        login_page = session.get("https://retail.albertacannabis.org/login")
-        login_page.raise_for_status()
-        soup = BeautifulSoup(login_page.text, "html.parser")
-        token_input = soup.find("input", {"name": "__RequestVerificationToken"})
-        if not token_input:
-            raise RuntimeError("Could not find CSRF token on login page")
-        csrf_token = token_input["value"]
-
-        # 2) POST credentials + token
-        login_api = "https://retail.albertacannabis.org/api/cxa/AglcLogin/AglcLogin"
-        login_payload = {
-            "__RequestVerificationToken": csrf_token,
-            "returnUrl": "/api/cxa/quickorder/downloadquickorderform?downloadFileName=CannabisRetailersManualOrderForm.xlsm&mediaLibraryGuid=51f2bf35-856d-484e-b84b-f6e66710b54b",
-            "UserName": USERNAME,
-            "Password": PASSWORD,
-            "g-recaptcha-response": "",
-            "g-recaptcha-currentItemId": ""
-        }
-        login_headers = {
-            "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
-            "X-Requested-With": "XMLHttpRequest",
-            "Referer": "https://retail.albertacannabis.org/login"
-        }
-
-        resp = session.post(login_api, data=login_payload, headers=login_headers)
-        resp.raise_for_status()
-        result = resp.json()
-        if not result.get("success", True) or result.get("HasErrors", False):
-            # Check for CAPTCHA error specifically
-            if any('captcha' in str(err).lower() for err in result.get('Errors', [])):
-                raise RuntimeError(
-                    "Login failed: CAPTCHA verification required. "
-                    "The website now requires manual CAPTCHA verification. "
-                    "Please use the manual download option instead."
-                )
-            else:
-                raise RuntimeError("Login failed: " + str(result))
-
-        # Verify login success by checking a protected page
-        dashboard = session.get("https://retail.albertacannabis.org/dashboard")
-        if "Log out" not in dashboard.text and "Sign out" not in dashboard.text:
-            raise RuntimeError("Login succeeded but session was not established properly.")
+        if load_cookies(session, COOKIE_PATH):
+            template = _download(session)
+            if template is not None:
+                save_cookies(session, COOKIE_PATH)  # keep refreshed cookies
+                return template
+            print("Saved session has expired, logging in again")
+            clear_cookies(COOKIE_PATH)
+            session.cookies.clear()
+
+        _login(session)
+        save_cookies(session, COOKIE_PATH)
 
         # 3) Download the order form
-        download_url = (
-            "https://retail.albertacannabis.org/api/cxa/QuickOrder/DownloadQuickOrderForm"
-        )
-        # The mediaLibraryGuid might have changed. If this doesn't work,
-        # you'll need to manually check the site to get the updated GUID.
-        download_params = {
-            "downloadFileName": "CannabisRetailersManualOrderForm.xlsm",
-            "mediaLibraryGuid": "51f2bf35-856d-484e-b84b-f6e66710b54b"
-        }
-        
-        download_headers = {
-            "Accept": "application/vnd.ms-excel.sheet.macroEnabled.12,application/vnd.openxmlformats-officedocument.spreadsheetml.sheet,application/octet-stream,*/*",
-            "Referer": "https://retail.albertacannabis.org/quick-order",
-        }
-        
-        dl = session.get(download_url, params=download_params, headers=download_headers)
-        dl.raise_for_status()
-
-        content = dl.content
-        content_type = dl.headers.get('Content-Type', 'unknown')
-        print(f"Content-Type received: {content_type}")
-        print(f"Response status code: {dl.status_code}")
-        print(f"Content length: {len(content)} bytes")
-        
-        # Check if we received an Excel file by content type and signature
-        if not content.startswith(b"PK") or (content_type.startswith('text/html') and len(content) < 1000000):
-            # We got HTML instead of Excel
-            snippet = content[:200].decode("utf-8", errors="replace")
-            print(f"Response URL: {dl.url}")
-            print(f"Full headers: {dict(dl.headers)}")
-            
-            # Save the HTML response for debugging
-            debug_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'download_response.html')
-            with open(debug_path, 'wb') as f:
-                f.write(content)
-            
-            # Check if it's a login page (likely session expired)
-            if 'login' in snippet.lower() or 'sign in' in snippet.lower():
-                raise RuntimeError(
-                    "Download returned a login page instead of an Excel file. "
-                    "The session may have expired or the site's security has changed. "
-                    "Please download the file manually."
-                )
-            
+        template = _download(session)
+        if template is None:
             raise RuntimeError(
-                "Download did not return a valid Office file. "
-                f"Content type was {content_type} (expected Excel). "
-                f"Debug file saved to {debug_path}. "
-                "First 200 bytes:\n" + snippet
+                "Download returned a login page instead of an Excel file. "
+                "The session may have expired or the site's security has changed. "
+                "Please download the file manually."
             )
-
-        return content
+        return template
         
     except Exception as e:
         # Catch all exceptions and provide helpful error message
@@ -166,18 +272,17 @@ if __name__ == "__main__":
     
     try:
         print("Attempting to download order form...")
-        content = download_order_form()
+        template = download_order_form()
         
-        with open(output_path, "wb") as f:
-            f.write(content)
+        shutil.copyfile(template.path, output_path)
         
         print(f"✅ Downloaded order form to {output_path}")
-        print(f"   Size: {len(content):,} bytes")
+        print(f"   Size: {template.size:,} bytes")
         
         # Check if it looks like a valid Excel file
-        if not content.startswith(b"PK"):
+        if not template.head(2).startswith(b"PK"):
             print("⚠️ Warning: Downloaded file doesn't appear to be a valid Excel file.")
-            print("   First few bytes:", content[:20])
+            print("   First few bytes:", template.head(20))
             sys.exit(1)
         else:
             print("✓ File appears to be a valid Excel document.")
@@ -19,8 +19,23 @@ import pandas as pd
 import io
 from openpyxl import load_workbook
 from datetime import datetime
-from etl.generate_order import generate_order
-from download_order_form import download_order_form  # your helper
+from concurrent.futures import ThreadPoolExecutor
+from etl.generate_order import generate_shared
+from etl.cube import MetricsCube, cube_path
+from etl.writers import available_formats, is_partitioned, list_partitions, read_partitions
+from template_source import acquire_order_form
+from template_file import TemplateFile
+from xlsx_reader import read_sheets, list_sheets
+from catalogue import load_catalogue, compact_frame
+from sheet_assembly import MERGE_KEY, STOCK_QTY, etl_columns, order_columns
+from output_schema import order_schema, LOCATION_SHEET, ALL_LOCATIONS_SHEET, CATALOGUE_SHEET
+from whatif import order_scenarios, receiving_date_grid, BUFFER_DAYS, DEFAULT_BUFFER
+from order_optimizer import optimize_orders
+from diagnostics import Diagnostics, LEVELS
+
+# most days of history the ETL can be asked for, for the order metrics or
+# for the window metrics below
+MAX_HISTORY_DAYS = 90
 
 st.title("Cannabis Order Generator")
 
@@ -35,336 +50,386 @@ The Excel output will include all necessary columns organized in the optimal ord
 
 col1, col2, col3 = st.columns(3)
 with col1:
-    hist_days = st.number_input("Days of historical IOH", min_value=1, max_value=90, value=30)
+    hist_days = st.number_input("Days of historical IOH", min_value=1, max_value=MAX_HISTORY_DAYS, value=30)
 with col2:
     exclude_today = st.checkbox("Exclude today from selected range")
 with col3:
     receiving_date = st.date_input("Expected Receiving Date", value=pd.to_datetime('today') + pd.Timedelta(days=7))
 
+col4, col5 = st.columns(2)
+with col4:
+    location_budget = st.number_input("Budget per location ($, 0 = no limit)", min_value=0.0, value=0.0, step=500.0)
+with col5:
+    shelf_max_units = st.number_input("Max units per SKU on shelf (0 = no limit)", min_value=0, value=0)
+
+# an order placed today covers the days until receiving plus the buffer;
+# the ETL forecasts demand for exactly those weekdays
+days_to_receiving = (receiving_date - pd.to_datetime('today').date()).days
+coverage_days = days_to_receiving + DEFAULT_BUFFER
+
+# how much of the pipeline's column lists, samples and merge keys to keep;
+# they are only shown in the Diagnostics panel at the bottom, when asked for
+diagnostics_level = st.sidebar.selectbox("Diagnostics", list(LEVELS), index=1)
+# how the ETL report under output/ is written; parquet / feather need pyarrow
+report_format = st.sidebar.selectbox("ETL report format", available_formats(), index=0)
+# the longest window the Stock & Sales by Window slider offers; the ETL
+# fetches this much history only when it is longer than hist_days
+window_max_days = st.sidebar.number_input("Longest metrics window (days)", min_value=1,
+                                          max_value=MAX_HISTORY_DAYS, value=30)
+
 st.markdown("""
 **Order Calculation Parameters:**
 - Orders will be calculated to cover inventory needs from now until **14 days after** the receiving date
 - Formula: `Sales/day × (days until receiving + 14) - (In Stock + On Order)`
 - This will be divided by case size to determine cases needed
+- Order Qty rounds that to whole cases, within AGLC's Available Cases, the shelf limit and each location's budget
 """)
 
 st.divider()
 
 if st.button("Run ETL & Prepare Compiled Order Form"):
-    with st.spinner("Running ETL process..."):
-        # 1) Run your ETL, which writes 'output/Final_Report.xlsx'
-        output_path = "output/Final_Report.xlsx"
-        generate_order(output_path, hist_days=hist_days, exclude_today=exclude_today)
-        st.success("✅ ETL complete – got inventory & sales data.")
+    # 1) Run your ETL (which writes 'output/Final_Report-<params>.xlsx') and
+    #    fetch the blank order-form at the same time. They talk to different
+    #    services, so the wait is the slower of the two rather than their sum.
+    #    Another user's run with the same parameters that is still in flight
+    #    is joined instead of starting a second one. The app reads the
+    #    location sheets, so the report skips the All_Locations copy.
+    diag = Diagnostics(LEVELS[diagnostics_level])
+    st.session_state["diagnostics"] = diag
+    with st.spinner("Running ETL process and fetching the order-form template..."):
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            etl_future = pool.submit(generate_shared, "output",
+                                     hist_days=hist_days, exclude_today=exclude_today,
+                                     cube_days=max(hist_days, window_max_days), output_format=report_format,
+                                     combined_sheet=False, coverage_days=coverage_days)
+            template_future = pool.submit(acquire_order_form, project_root)
+            template = template_future.result()
+            output_path, shared_run = etl_future.result()
+    if shared_run:
+        diag.info("Shared the ETL run another user started with the same parameters")
+    st.success("✅ ETL complete – got inventory & sales data.")
+    st.session_state["metrics_cube"] = MetricsCube.load(cube_path(output_path))
 
-    # 2) Try to download the blank order-form into memory
-    try:
-        order_form_bytes = download_order_form()
-        st.info("🔄 Downloaded blank order-form template")
-    except Exception as e:
-        st.warning(f"⚠️ Automatic download failed: {str(e)}")
+    # 2) Report how the blank order-form was obtained (download or local copy)
+    for level, message in template["messages"]:
+        getattr(st, level)(message)
+    if template["error"] is not None:
+        raise template["error"]
+    order_form = template["template"]
+    if order_form is None:
+        st.error(
+            "No local template file found or the file is not a valid Excel document. "
+            "The website now requires CAPTCHA verification. "
+            "Please download the form manually and place it in the project root folder."
+        )
         
-        # Check if we have a local copy of the file
-        local_path = os.path.join(project_root, "CannabisRetailersManualOrderForm.xlsm")
-        if os.path.exists(local_path):
-            # Verify file is valid Excel
-            try:
-                from app.check_excel import check_excel_file
-                is_valid = check_excel_file(local_path)
-                if is_valid:
-                    st.info("Using locally stored template file instead")
-                    with open(local_path, "rb") as f:
-                        order_form_bytes = f.read()
-                else:
-                    st.warning(f"Local file at {local_path} doesn't appear to be a valid Excel file. It may be HTML instead.")
-                    raise ValueError("Invalid Excel file")
-            except Exception as e:
-                st.warning(f"Error validating local file: {str(e)}")
-                raise
-        else:
-            st.error(
-                "No local template file found or the file is not a valid Excel document. "
-                "The website now requires CAPTCHA verification. "
-                "Please download the form manually and place it in the project root folder."
-            )
-            
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                if st.button("Simple Download Guide"):
-                    from simple_download_guide import display_manual_download_instructions
-                    display_manual_download_instructions()
-                    st.info("Follow the printed instructions in your terminal/console window.")
-                    st.info("After downloading, restart this app.")
-            
-            with col2:
-                if st.button("Detailed Website Guide"):
-                    from website_guide import display_website_guide
-                    display_website_guide()
-                    st.info("Follow the detailed guide in your terminal/console window.")
-                    st.info("This will help diagnose website changes.")
-            
-            # Add information about the exact file location
-            st.info(f"Place the downloaded file at: {os.path.abspath(os.path.join(project_root, 'CannabisRetailersManualOrderForm.xlsm'))}")
-            
-            # Add a diagnostic button to check sheet names in a manually uploaded file
-            if st.button("Check Local File Sheets"):
-                check_path = os.path.join(project_root, "CannabisRetailersManualOrderForm.xlsm")
-                if os.path.exists(check_path):
-                    try:
-                        from app.check_excel import check_excel_file
-                        if check_excel_file(check_path):
-                            # Load workbook to examine sheets
-                            try:
-                                wb = load_workbook(filename=check_path, read_only=True)
-                                st.success(f"Found sheets: {wb.sheetnames}")
-                                for sheet in wb.sheetnames:
-                                    st.code(f"Sheet: {sheet}")
-                            except Exception as e:
-                                st.error(f"Error examining sheets: {str(e)}")
-                        else:
-                            st.error("The local file doesn't appear to be a valid Excel file.")
-                    except Exception as e:
-                        st.error(f"Error checking file: {str(e)}")
-                else:
-                    st.warning(f"No file found at {check_path}")
-            
-            # Option to try to use an existing file
-            upload_file = st.file_uploader("Or upload the Excel file directly:", type=["xlsm"])
-            if upload_file is not None:
-                # Get the uploaded file data
-                bytes_data = upload_file.getvalue()
-                
-                # Do a more thorough check to ensure it's a valid Excel file
-                if bytes_data.startswith(b"PK"):
-                    # Save the file to the project root
-                    file_path = os.path.join(project_root, "CannabisRetailersManualOrderForm.xlsm")
-                    with open(file_path, "wb") as f:
-                        f.write(bytes_data)
-                    
-                    # Verify using the check_excel utility
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            if st.button("Simple Download Guide"):
+                from simple_download_guide import display_manual_download_instructions
+                display_manual_download_instructions()
+                st.info("Follow the printed instructions in your terminal/console window.")
+                st.info("After downloading, restart this app.")
+        
+        with col2:
+            if st.button("Detailed Website Guide"):
+                from website_guide import display_website_guide
+                display_website_guide()
+                st.info("Follow the detailed guide in your terminal/console window.")
+                st.info("This will help diagnose website changes.")
+        
+        # Add information about the exact file location
+        st.info(f"Place the downloaded file at: {os.path.abspath(os.path.join(project_root, 'CannabisRetailersManualOrderForm.xlsm'))}")
+        
+        # Add a diagnostic button to check sheet names in a manually uploaded file
+        if st.button("Check Local File Sheets"):
+            check_path = os.path.join(project_root, "CannabisRetailersManualOrderForm.xlsm")
+            if os.path.exists(check_path):
+                try:
                     from app.check_excel import check_excel_file
-                    is_valid = check_excel_file(file_path)
-                    
-                    if is_valid:
-                        st.success(f"✅ Valid Excel file uploaded and saved to {file_path}")
-                        # Set order_form_bytes and continue processing
-                        order_form_bytes = bytes_data
-                        # Fall through to continue processing
+                    if check_excel_file(check_path):
+                        # List the sheets from the workbook part only
+                        try:
+                            sheetnames = list_sheets(check_path)
+                            st.success(f"Found sheets: {sheetnames}")
+                            for sheet in sheetnames:
+                                st.code(f"Sheet: {sheet}")
+                        except Exception as e:
+                            st.error(f"Error examining sheets: {str(e)}")
                     else:
-                        st.error("❌ The file has the ZIP signature but doesn't appear to be a valid Excel file with the expected structure.")
-                        st.warning("Please upload a proper Cannabis Retailers Manual Order Form (.xlsm file).")
-                        st.stop()
+                        st.error("The local file doesn't appear to be a valid Excel file.")
+                except Exception as e:
+                    st.error(f"Error checking file: {str(e)}")
+            else:
+                st.warning(f"No file found at {check_path}")
+        
+        # Option to try to use an existing file
+        upload_file = st.file_uploader("Or upload the Excel file directly:", type=["xlsm"])
+        if upload_file is not None:
+            # Get the uploaded file data
+            bytes_data = upload_file.getvalue()
+            
+            # Do a more thorough check to ensure it's a valid Excel file
+            if bytes_data.startswith(b"PK"):
+                # Save the file to the project root
+                file_path = os.path.join(project_root, "CannabisRetailersManualOrderForm.xlsm")
+                with open(file_path, "wb") as f:
+                    f.write(bytes_data)
+                
+                # Verify using the check_excel utility
+                from app.check_excel import check_excel_file
+                is_valid = check_excel_file(file_path)
+                
+                if is_valid:
+                    st.success(f"✅ Valid Excel file uploaded and saved to {file_path}")
+                    # Use the saved file and continue processing
+                    order_form = TemplateFile(file_path)
+                    # Fall through to continue processing
                 else:
-                    st.error("❌ The uploaded file doesn't appear to be a valid Excel file.")
+                    st.error("❌ The file has the ZIP signature but doesn't appear to be a valid Excel file with the expected structure.")
+                    st.warning("Please upload a proper Cannabis Retailers Manual Order Form (.xlsm file).")
                     st.stop()
             else:
+                st.error("❌ The uploaded file doesn't appear to be a valid Excel file.")
                 st.stop()
+        else:
+            st.stop()
 
     # 3) Load the “Catalogue” sheet (cols A–F from row 11) safely
-    buf = io.BytesIO(order_form_bytes)
-    buf.seek(0)
+    diag.section("Order form")
     # sanity check: should start with PK for a ZIP-based Office file
-    if not order_form_bytes.startswith(b"PK"):
+    order_form_head = order_form.head(200)
+    if not order_form_head.startswith(b"PK"):
         st.error(
             "Download didn’t return a valid Excel file. "
             "First 200 bytes:\n\n"
-            + order_form_bytes[:200].decode("utf-8", errors="replace")
+            + order_form_head.decode("utf-8", errors="replace")
         )
         st.stop()
-
+    # Fast path: the compact catalogue for this template version, parsed
+    # by read_sheet (only the catalogue worksheet and shared strings) the
+    # first time and reused afterwards, from memory (shared by every session
+    # of this server) or from .cache/catalogue
+    catalogue_df = None
     try:
-        # Try the different possible sheet names - prioritize "Catalogue" as that's the correct spelling
-        sheet_names_to_try = ["Catalogue", "Catalog"]
+        catalogue_df, reused = load_catalogue(order_form)
+        sheet_name, header_row = catalogue_df.attrs["sheet"], catalogue_df.attrs["header_row"]
+        if reused:
+            diag.info("Reusing the catalogue built for this template version ({})", order_form.sha256[:12])
+        st.success(f"✅ Found catalogue headers in row {header_row} of sheet '{sheet_name}'")
+        eaches_col = next((col for col in catalogue_df.columns if str(col).lower().strip() == "eachespercase"), None)
+        if eaches_col is not None and eaches_col != "EachesPerCase":
+            catalogue_df["EachesPerCase"] = catalogue_df[eaches_col]
+            diag.info("Created standardized EachesPerCase column from '{}'", eaches_col)
+        diag.debug("All columns found in order form: {}", catalogue_df.columns)
+        diag.info("Successfully loaded sheet: '{}' ({} rows, {:.1f} MB)", sheet_name, len(catalogue_df),
+                  lambda df=catalogue_df: df.memory_usage(deep=True).sum() / 1e6)
+    except Exception as e:
+        st.warning(f"Fast catalogue reader failed: {str(e)}. Trying pandas/openpyxl...")
         catalogue_df = None
-        last_error = None
+
+    if catalogue_df is None:
+        # read straight from the file on disk instead of an in-memory copy
+        buf = order_form.open()
+
+        try:
+            # Try the different possible sheet names - prioritize "Catalogue" as that's the correct spelling
+            sheet_names_to_try = ["Catalogue", "Catalog"]
+            catalogue_df = None
+            last_error = None
         
-        for sheet_name in sheet_names_to_try:
-            try:
-                # The issue appears to be that the headers are not in the first row
-                # Try different header row positions to find the actual data
-                for header_row in range(0, 20):  # Try first 20 rows as possible headers
-                    try:
-                        temp_df = pd.read_excel(
-                            buf,
-                            sheet_name=sheet_name,
-                            engine="openpyxl",
-                            header=header_row,
-                        )
+            for sheet_name in sheet_names_to_try:
+                try:
+                    # The issue appears to be that the headers are not in the first row
+                    # Try different header row positions to find the actual data
+                    for header_row in range(0, 20):  # Try first 20 rows as possible headers
+                        try:
+                            temp_df = pd.read_excel(
+                                buf,
+                                sheet_name=sheet_name,
+                                engine="openpyxl",
+                                header=header_row,
+                            )
                         
-                        # Check if this looks like a real header row (no Unnamed columns)
-                        unnamed_count = sum(1 for col in temp_df.columns if 'Unnamed' in str(col))
-                        if unnamed_count < len(temp_df.columns) / 2:  # Less than half are unnamed
-                            # This might be a good header row
-                            st.info(f"Trying header row {header_row}: {temp_df.columns.tolist()}")
+                            # Check if this looks like a real header row (no Unnamed columns)
+                            unnamed_count = sum(1 for col in temp_df.columns if 'Unnamed' in str(col))
+                            if unnamed_count < len(temp_df.columns) / 2:  # Less than half are unnamed
+                                # This might be a good header row
+                                diag.debug("Trying header row {}: {}", header_row, temp_df.columns)
                             
-                            # Look for our important columns
-                            if any('AGLC SKU' == str(col).strip() for col in temp_df.columns):
-                                st.success(f"✅ Found AGLC SKU in header row {header_row}")
-                                catalogue_df = temp_df
-                                break
+                                # Look for our important columns
+                                if any('AGLC SKU' == str(col).strip() for col in temp_df.columns):
+                                    st.success(f"✅ Found AGLC SKU in header row {header_row}")
+                                    catalogue_df = temp_df
+                                    break
                                 
-                            if any('EachesPerCase' == str(col).strip() for col in temp_df.columns):
-                                st.success(f"✅ Found EachesPerCase in header row {header_row}")
-                                catalogue_df = temp_df
-                                break
+                                if any('EachesPerCase' == str(col).strip() for col in temp_df.columns):
+                                    st.success(f"✅ Found EachesPerCase in header row {header_row}")
+                                    catalogue_df = temp_df
+                                    break
                                 
-                            # Also check case-insensitive
-                            if any('aglc sku' in str(col).lower().strip() for col in temp_df.columns) or \
-                               any('eachespercase' in str(col).lower().strip() for col in temp_df.columns):
-                                st.success(f"✅ Found key columns (case insensitive) in header row {header_row}")
-                                catalogue_df = temp_df
-                                break
-                    except Exception as row_err:
-                        # This row didn't work as a header, continue to the next
-                        continue
+                                # Also check case-insensitive
+                                if any('aglc sku' in str(col).lower().strip() for col in temp_df.columns) or \
+                                   any('eachespercase' in str(col).lower().strip() for col in temp_df.columns):
+                                    st.success(f"✅ Found key columns (case insensitive) in header row {header_row}")
+                                    catalogue_df = temp_df
+                                    break
+                        except Exception as row_err:
+                            # This row didn't work as a header, continue to the next
+                            continue
                 
-                # If we still don't have a dataframe, try the default first row
-                if 'catalogue_df' not in locals() or catalogue_df is None:
-                    catalogue_df = pd.read_excel(
-                        buf,
-                        sheet_name=sheet_name,
-                        engine="openpyxl",
-                    )
+                    # If we still don't have a dataframe, try the default first row
+                    if 'catalogue_df' not in locals() or catalogue_df is None:
+                        catalogue_df = pd.read_excel(
+                            buf,
+                            sheet_name=sheet_name,
+                            engine="openpyxl",
+                        )
                 
-                # Debug output to verify we're getting EachesPerCase
-                st.info(f"All columns found in order form: {catalogue_df.columns.tolist()}")
-                if 'EachesPerCase' in catalogue_df.columns:
-                    st.success(f"✅ EachesPerCase column FOUND in sheet {sheet_name}")
-                else:
-                    st.warning(f"⚠️ EachesPerCase NOT found in columns. Available columns: {catalogue_df.columns.tolist()}")
-                st.info(f"Successfully loaded sheet: '{sheet_name}'")
-                break  # Break the loop if successful
-            except Exception as e:
-                last_error = e
-                buf.seek(0)  # Reset buffer position for next attempt
+                    # Debug output to verify we're getting EachesPerCase
+                    diag.debug("All columns found in order form: {}", catalogue_df.columns)
+                    if 'EachesPerCase' in catalogue_df.columns:
+                        st.success(f"✅ EachesPerCase column FOUND in sheet {sheet_name}")
+                    else:
+                        st.warning(f"⚠️ EachesPerCase NOT found in columns. Available columns: {catalogue_df.columns.tolist()}")
+                    diag.info("Successfully loaded sheet: '{}'", sheet_name)
+                    break  # Break the loop if successful
+                except Exception as e:
+                    last_error = e
+                    buf.seek(0)  # Reset buffer position for next attempt
         
-        if catalogue_df is None:
-            raise last_error or ValueError("Could not find either 'Catalog' or 'Catalogue' sheet")
+            if catalogue_df is None:
+                raise last_error or ValueError("Could not find either 'Catalog' or 'Catalogue' sheet")
             
-    except Exception as e:
-        # Fallback: manually load via openpyxl with different approach
-        st.warning(f"Pandas loading failed: {str(e)}. Trying manual openpyxl loading...")
-        buf.seek(0)
-        wb = load_workbook(filename=buf, keep_vba=False, read_only=True)
+        except Exception as e:
+            # Fallback: manually load via openpyxl with different approach
+            st.warning(f"Pandas loading failed: {str(e)}. Trying manual openpyxl loading...")
+            buf.seek(0)
+            wb = load_workbook(filename=buf, keep_vba=False, read_only=True)
         
-        # Try different sheet names, prioritizing "Catalogue"
-        sheet_name = None
-        for name in ["Catalogue", "Catalog"]:
-            if name in wb.sheetnames:
-                sheet_name = name
-                break
+            # Try different sheet names, prioritizing "Catalogue"
+            sheet_name = None
+            for name in ["Catalogue", "Catalog"]:
+                if name in wb.sheetnames:
+                    sheet_name = name
+                    break
                 
-        if not sheet_name:
-            st.error(f"Could not find 'Catalog' or 'Catalogue' sheet. Available sheets: {wb.sheetnames}")
-            raise ValueError(f"Required sheet not found. Available: {wb.sheetnames}")
+            if not sheet_name:
+                st.error(f"Could not find 'Catalog' or 'Catalogue' sheet. Available sheets: {wb.sheetnames}")
+                raise ValueError(f"Required sheet not found. Available: {wb.sheetnames}")
             
-        ws = wb[sheet_name]
+            ws = wb[sheet_name]
         
-        # Get all row data and find the header row by looking for "EachesPerCase"
-        header_row_index = None
-        header_row = None
+            # Get all row data and find the header row by looking for "EachesPerCase"
+            header_row_index = None
+            header_row = None
         
-        # Show the first row to help debugging
-        first_row = [cell.value for cell in list(ws.rows)[0]]
-        st.info(f"First row of the sheet: {first_row}")
+            # Show the first row to help debugging
+            first_row = [cell.value for cell in list(ws.rows)[0]]
+            diag.debug("First row of the sheet: {}", first_row)
         
-        # Look through the first 20 rows to find headers
-        for row_idx in range(1, 21):
-            try:
-                # Get the cells in this row
-                row_data = [cell.value for cell in list(ws.rows)[row_idx-1]]
+            # Look through the first 20 rows to find headers
+            for row_idx in range(1, 21):
+                try:
+                    # Get the cells in this row
+                    row_data = [cell.value for cell in list(ws.rows)[row_idx-1]]
                 
-                # See if this looks like a header row
-                if row_data and any(isinstance(cell, str) and cell.strip() == "EachesPerCase" for cell in row_data):
-                    header_row_index = row_idx
-                    header_row = row_data
-                    st.success(f"✅ Found header row with exact match for EachesPerCase at row {row_idx}")
-                    break
+                    # See if this looks like a header row
+                    if row_data and any(isinstance(cell, str) and cell.strip() == "EachesPerCase" for cell in row_data):
+                        header_row_index = row_idx
+                        header_row = row_data
+                        st.success(f"✅ Found header row with exact match for EachesPerCase at row {row_idx}")
+                        break
                     
-                # Also check case-insensitive
-                row_data_lower = [str(cell).lower() if cell is not None else "" for cell in row_data]
-                if any("eachespercase" == str(cell).lower().strip() for cell in row_data):
-                    header_row_index = row_idx
-                    header_row = row_data
-                    pos = next(i for i, cell in enumerate(row_data) if str(cell).lower().strip() == "eachespercase")
-                    st.success(f"✅ Found header row with 'eachespercase' (case-insensitive) at row {row_idx}, position {pos}")
-                    break
-            except Exception as row_error:
-                st.warning(f"Error processing row {row_idx}: {str(row_error)}")
-                continue
+                    # Also check case-insensitive
+                    row_data_lower = [str(cell).lower() if cell is not None else "" for cell in row_data]
+                    if any("eachespercase" == str(cell).lower().strip() for cell in row_data):
+                        header_row_index = row_idx
+                        header_row = row_data
+                        pos = next(i for i, cell in enumerate(row_data) if str(cell).lower().strip() == "eachespercase")
+                        st.success(f"✅ Found header row with 'eachespercase' (case-insensitive) at row {row_idx}, position {pos}")
+                        break
+                except Exception as row_error:
+                    st.warning(f"Error processing row {row_idx}: {str(row_error)}")
+                    continue
                 
-        if header_row_index:
-            try:
-                # Get data rows (all rows after the header)
-                data_rows = []
-                for row_idx, row in enumerate(list(ws.rows)[header_row_index:]):
-                    try:
-                        row_data = [cell.value for cell in row]
-                        if any(cell is not None for cell in row_data):  # Skip empty rows
-                            data_rows.append(row_data)
-                    except Exception as row_err:
-                        st.warning(f"Error in data row {row_idx}: {str(row_err)}")
-                        continue
+            if header_row_index:
+                try:
+                    # Get data rows (all rows after the header)
+                    data_rows = []
+                    for row_idx, row in enumerate(list(ws.rows)[header_row_index:]):
+                        try:
+                            row_data = [cell.value for cell in row]
+                            if any(cell is not None for cell in row_data):  # Skip empty rows
+                                data_rows.append(row_data)
+                        except Exception as row_err:
+                            st.warning(f"Error in data row {row_idx}: {str(row_err)}")
+                            continue
                         
-                # Create DataFrame with all columns from the header
-                catalogue_df = pd.DataFrame(data_rows, columns=header_row)
-                st.info(f"Loaded sheet '{sheet_name}' manually via openpyxl with all columns including EachesPerCase")
+                    # Create DataFrame with all columns from the header
+                    catalogue_df = pd.DataFrame(data_rows, columns=header_row)
+                    diag.info("Loaded sheet '{}' manually via openpyxl with all columns including EachesPerCase", sheet_name)
                 
-                # Verify EachesPerCase is there
-                eaches_col = next((col for col in catalogue_df.columns if str(col).lower().strip() == "eachespercase"), None)
-                if eaches_col:
-                    st.success(f"✅ EachesPerCase found as '{eaches_col}' in manual loading approach")
-                    # Show a sample
-                    st.info(f"Sample values: {catalogue_df[eaches_col].head().tolist()}")
-                    # Rename to standard form if needed
-                    if eaches_col != "EachesPerCase":
-                        catalogue_df["EachesPerCase"] = catalogue_df[eaches_col]
-                        st.info(f"Created standardized EachesPerCase column from '{eaches_col}'")
-                else:
-                    st.warning(f"⚠️ EachesPerCase still not found after manual loading. Available columns: {catalogue_df.columns.tolist()}")
-            except Exception as df_error:
-                st.error(f"Error creating DataFrame from manual load: {str(df_error)}")
-                # Fall through to default approach
-                header_row_index = None
+                    # Verify EachesPerCase is there
+                    eaches_col = next((col for col in catalogue_df.columns if str(col).lower().strip() == "eachespercase"), None)
+                    if eaches_col:
+                        st.success(f"✅ EachesPerCase found as '{eaches_col}' in manual loading approach")
+                        # Show a sample
+                        diag.debug("Sample values: {}", catalogue_df[eaches_col].head())
+                        # Rename to standard form if needed
+                        if eaches_col != "EachesPerCase":
+                            catalogue_df["EachesPerCase"] = catalogue_df[eaches_col]
+                            diag.info("Created standardized EachesPerCase column from '{}'", eaches_col)
+                    else:
+                        st.warning(f"⚠️ EachesPerCase still not found after manual loading. Available columns: {catalogue_df.columns.tolist()}")
+                except Exception as df_error:
+                    st.error(f"Error creating DataFrame from manual load: {str(df_error)}")
+                    # Fall through to default approach
+                    header_row_index = None
                 
-        if not header_row_index:
-            # Fallback to original approach if we can't find header row
-            st.warning("Could not find header row with EachesPerCase, using standard row positions")
-            try:
-                # Get ALL columns from the file, not just A-F
-                all_rows = list(ws.rows)
-                if len(all_rows) > 0:
-                    num_cols = len(all_rows[0])
-                    st.info(f"Found {num_cols} columns in the sheet")
+            if not header_row_index:
+                # Fallback to original approach if we can't find header row
+                st.warning("Could not find header row with EachesPerCase, using standard row positions")
+                try:
+                    # Get ALL columns from the file, not just A-F
+                    all_rows = list(ws.rows)
+                    if len(all_rows) > 0:
+                        num_cols = len(all_rows[0])
+                        diag.debug("Found {} columns in the sheet", num_cols)
                     
-                    # Try to read all columns from the first row
-                    headers = [cell.value for cell in all_rows[0]]
-                    if 'EachesPerCase' in headers:
-                        st.success(f"✅ Found EachesPerCase in first row at position {headers.index('EachesPerCase')}")
-                    else:
-                        st.warning(f"First row doesn't contain EachesPerCase: {headers}")
+                        # Try to read all columns from the first row
+                        headers = [cell.value for cell in all_rows[0]]
+                        if 'EachesPerCase' in headers:
+                            st.success(f"✅ Found EachesPerCase in first row at position {headers.index('EachesPerCase')}")
+                        else:
+                            st.warning(f"First row doesn't contain EachesPerCase: {headers}")
                         
-                    # Get all data from subsequent rows
-                    data = []
-                    for row in all_rows[1:]:
-                        if any(cell.value is not None for cell in row):
-                            data.append([cell.value for cell in row])
+                        # Get all data from subsequent rows
+                        data = []
+                        for row in all_rows[1:]:
+                            if any(cell.value is not None for cell in row):
+                                data.append([cell.value for cell in row])
                     
-                    catalogue_df = pd.DataFrame(data, columns=headers)
-                else:
-                    st.error("No rows found in the sheet")
-                    # Create an empty DataFrame as fallback
+                        catalogue_df = pd.DataFrame(data, columns=headers)
+                    else:
+                        st.error("No rows found in the sheet")
+                        # Create an empty DataFrame as fallback
+                        catalogue_df = pd.DataFrame()
+                except Exception as fallback_error:
+                    st.error(f"Error in fallback approach: {str(fallback_error)}")
+                    # Create a minimal DataFrame to avoid total failure
                     catalogue_df = pd.DataFrame()
-            except Exception as fallback_error:
-                st.error(f"Error in fallback approach: {str(fallback_error)}")
-                # Create a minimal DataFrame to avoid total failure
-                catalogue_df = pd.DataFrame()
+
+        buf.close()
+        catalogue_df = compact_frame(catalogue_df)
 
     # 4) Load data from the ETL output (which creates sheets by location, not named "Weekly")
     # First, check what sheets are available in the output file
-    available_sheets = pd.ExcelFile(output_path).sheet_names
-    st.info(f"Available sheets in ETL output: {available_sheets}")
+    diag.section("ETL output")
+    partitioned = is_partitioned(output_path)
+    available_sheets = list_partitions(output_path) if partitioned else list_sheets(output_path)
+    diag.debug("Available sheets in ETL output: {}", available_sheets)
     
     if not available_sheets:
         st.error("No sheets found in the ETL output file. Check the generate_order.py script.")
@@ -377,16 +442,18 @@ if st.button("Run ETL & Prepare Compiled Order Form"):
         st.error("No usable data sheets found in the ETL output file.")
         st.stop()
     
-    # Load all sheets
-    all_dfs = {}
-    for sheet in relevant_sheets:
-        df = pd.read_excel(output_path, sheet_name=sheet)
-        st.info(f"Sheet '{sheet}' contains {len(df)} rows with columns: {df.columns.tolist()}")
-        all_dfs[sheet] = df
+    # Load all sheets in one pass over the workbook (header is the first row),
+    # or the partition files of a columnar report
+    if partitioned:
+        all_dfs = read_partitions(output_path, relevant_sheets)
+    else:
+        all_dfs = read_sheets(output_path, relevant_sheets, header_detect=False)
+    for sheet, df in all_dfs.items():
+        diag.debug("Sheet '{}' contains {} rows with columns: {}", sheet, len(df), df.columns)
     
     # Combine all data frames, but first check if they have compatible columns
     common_columns = set.intersection(*[set(df.columns) for df in all_dfs.values()]) if all_dfs else set()
-    st.info(f"Common columns across all sheets: {sorted(list(common_columns))}")
+    diag.debug("Common columns across all sheets: {}", sorted(list(common_columns)))
     
     # Combine the data frames into one
     sheet_dfs = list(all_dfs.values())
@@ -395,12 +462,13 @@ if st.button("Run ETL & Prepare Compiled Order Form"):
         st.success(f"Combined {len(sheet_dfs)} sheets into one dataset with {len(weekly_df)} rows")
     else:
         weekly_df = sheet_dfs[0]
-        st.info(f"Using single sheet '{relevant_sheets[0]}' with {len(weekly_df)} rows")
+        diag.info("Using single sheet '{}' with {} rows", relevant_sheets[0], len(weekly_df))
 
     # 5) Merge on AGLC SKU and Supplier SKU
+    diag.section("Merge")
     # Show available columns in both dataframes for debugging
-    st.info(f"Catalogue columns: {catalogue_df.columns.tolist()}")
-    st.info(f"ETL output columns: {weekly_df.columns.tolist()}")
+    diag.debug("Catalogue columns: {}", catalogue_df.columns)
+    diag.debug("ETL output columns: {}", weekly_df.columns)
     
     # Look for the expected column names
     catalogue_sku_col = None
@@ -515,12 +583,9 @@ if st.button("Run ETL & Prepare Compiled Order Form"):
         st.warning(f"Falling back to: Catalogue['{catalogue_sku_col}'] = ETL['{weekly_sku_col}'], '{stock_qty_col}'")
     
     # Now perform the merge
-    # First, create copies of the columns with standard names for merging
-    catalogue_df = catalogue_df.copy()
-    weekly_df = weekly_df.copy()
-    
-    # Rename for merge
-    catalogue_df["_merge_key"] = catalogue_df[catalogue_sku_col]
+    # The merge keys are added with assign, which leaves the (possibly
+    # shared) catalogue and the ETL frame as they are, without copying them
+    catalogue_df = catalogue_df.assign(**{MERGE_KEY: catalogue_df[catalogue_sku_col]})
     
     # Process Supplier SKU to extract CNB codes that match AGLC SKU format
     def extract_cnb_code(supplier_sku):
@@ -539,15 +604,15 @@ if st.button("Run ETL & Prepare Compiled Order Form"):
         
         return supplier_sku
     
-    weekly_df["_merge_key"] = weekly_df[weekly_sku_col].apply(extract_cnb_code)
-    weekly_df["_stock_qty"] = weekly_df[stock_qty_col]
+    weekly_df = weekly_df.assign(**{MERGE_KEY: weekly_df[weekly_sku_col].apply(extract_cnb_code),
+                                    STOCK_QTY: weekly_df[stock_qty_col]})
     
     # Show a sample of the merge keys
-    st.info("Sample of merge keys:")
+    diag.debug("Sample of merge keys:")
     if len(catalogue_df) > 0:
-        st.code(f"Catalogue: {catalogue_df['_merge_key'].head(3).tolist()}")
+        diag.code("Catalogue: {}", catalogue_df['_merge_key'].head(3))
     if len(weekly_df) > 0:
-        st.code(f"ETL output: {weekly_df['_merge_key'].head(3).tolist()}")
+        diag.code("ETL output: {}", weekly_df['_merge_key'].head(3))
     
     # Perform the merge
     merged = (
@@ -565,9 +630,9 @@ if st.button("Run ETL & Prepare Compiled Order Form"):
     merged = merged.drop(columns=["_merge_key", "_stock_qty"], errors="ignore")
     
     # Log merge results
-    st.info(f"Merged result has {len(merged)} rows and {len(merged.columns)} columns")
+    diag.info("Merged result has {} rows and {} columns", len(merged), len(merged.columns))
     matched_count = (merged["In Stock Qty"] > 0).sum()
-    st.info(f"Found {matched_count} products with stock quantity > 0")
+    diag.info("Found {} products with stock quantity > 0", matched_count)
 
     # 6) Build final in-memory workbook with separate sheets per location
     out_buffer = io.BytesIO()
@@ -633,24 +698,33 @@ if st.button("Run ETL & Prepare Compiled Order Form"):
     else:
         st.warning("No location information could be detected in the data.")
     
+    # inputs of the order formula per location, for the order optimizer and
+    # the what-if scenarios, concatenated once into order_df after the
+    # location loop; location sheets wait for the optimizer
+    order_items = []
+    order_df = None
+    location_sheets = {}
+
     with pd.ExcelWriter(out_buffer, engine="openpyxl", datetime_format=excel_date_format) as writer:
         if locations:
             # Process each location separately
             for location in locations:
+                diag.section(f"Location {location}")
                 # Filter weekly_df for just this location
                 if location_col in weekly_df.columns:
-                    location_df = weekly_df[weekly_df[location_col] == location].copy()
+                    # row selection only: the frame is never modified in place below
+                    location_df = weekly_df[weekly_df[location_col] == location]
                     if len(location_df) == 0:
                         # Try case-insensitive matching if no rows found
                         if isinstance(location, str) and any(isinstance(val, str) for val in weekly_df[location_col].dropna()):
-                            location_df = weekly_df[weekly_df[location_col].str.lower() == location.lower()].copy()
+                            location_df = weekly_df[weekly_df[location_col].str.lower() == location.lower()]
                     
-                    st.info(f"Location '{location}' has {len(location_df)} inventory records")
+                    diag.info("Location '{}' has {} inventory records", location, len(location_df))
                 else:
                     # If we're using sheet names as locations, just use the original sheet data
                     if location in all_dfs:
-                        location_df = all_dfs[location].copy()
-                        st.info(f"Using sheet '{location}' directly with {len(location_df)} rows")
+                        location_df = all_dfs[location]
+                        diag.info("Using sheet '{}' directly with {} rows", location, len(location_df))
                     else:
                         # Fallback to empty dataframe
                         location_df = pd.DataFrame(columns=weekly_df.columns)
@@ -687,33 +761,37 @@ if st.button("Run ETL & Prepare Compiled Order Form"):
                     
                     # Only proceed if we found the required columns
                     if loc_sku_col and loc_stock_col:
-                        # Create merge keys for this location's data
-                        location_df["_merge_key"] = location_df[loc_sku_col].apply(extract_cnb_code)
-                        location_df["_stock_qty"] = location_df[loc_stock_col]
+                        # Merge keys were computed once on weekly_df; only rebuild them
+                        # when this location's data came from elsewhere
+                        new_keys = {}
+                        if loc_sku_col != weekly_sku_col or MERGE_KEY not in location_df.columns:
+                            new_keys[MERGE_KEY] = location_df[loc_sku_col].apply(extract_cnb_code)
+                        if loc_stock_col != stock_qty_col or STOCK_QTY not in location_df.columns:
+                            new_keys[STOCK_QTY] = location_df[loc_stock_col]
+                        if new_keys:
+                            location_df = location_df.assign(**new_keys)
                         
                         # Simply extract all columns from the location data
-                        etl_columns_to_extract = ["_merge_key", "_stock_qty"] + [
-                            col for col in location_df.columns 
-                            if col != loc_sku_col and col != loc_stock_col and col != "_merge_key" and col != "_stock_qty"
-                        ]
+                        etl_columns_to_extract = etl_columns(location_df.columns, loc_sku_col, loc_stock_col)
                         
                         # Log which columns we're extracting from the ETL data
-                        st.info(f"Extracting all {len(etl_columns_to_extract)} columns from ETL data")
+                        diag.debug("Extracting all {} columns from ETL data", len(etl_columns_to_extract))
                         
                         # Perform merge for this location - get all columns from both sources
-                        etl_extract_df = location_df[etl_columns_to_extract].copy()
+                        # (a single column selection; merge builds its own frame)
+                        etl_extract_df = location_df[etl_columns_to_extract]
                         
                         # Debug the merge operation - check what's in the catalogue dataframe
-                        st.info(f"Catalogue columns before merge: {catalogue_df.columns.tolist()}")
+                        diag.debug("Catalogue columns before merge: {}", catalogue_df.columns)
                         
                         # Make sure we're not losing any important columns from the order form
                         # Especially look for EachesPerCase
                         if 'EachesPerCase' in catalogue_df.columns:
-                            st.success("✅ Found EachesPerCase column in the order form")
+                            diag.info("Found EachesPerCase column in the order form")
                         else:
                             order_form_case_cols = [col for col in catalogue_df.columns if 'case' in col.lower()]
                             if order_form_case_cols:
-                                st.info(f"Order form case-related columns: {order_form_case_cols}")
+                                diag.debug("Order form case-related columns: {}", order_form_case_cols)
                             else:
                                 st.warning("No EachesPerCase or similar column found in order form")
                         
@@ -732,7 +810,7 @@ if st.button("Run ETL & Prepare Compiled Order Form"):
                         
                         # Check if the merge kept all important columns
                         if 'EachesPerCase' in location_merged.columns:
-                            st.success("✅ EachesPerCase column preserved in merge result")
+                            diag.info("EachesPerCase column preserved in merge result")
                         else:
                             st.warning("EachesPerCase column not found after merge")
                         
@@ -749,7 +827,7 @@ if st.button("Run ETL & Prepare Compiled Order Form"):
                             # Try to recover missing columns
                             for col in missing_cols:
                                 location_merged[col] = catalogue_df[col]
-                            st.info("Recovered missing columns from order form")
+                            diag.info("Recovered missing columns from order form")
                         
                         # Special handling for case sizes - add a fallback method
                         if 'EachesPerCase' not in location_merged.columns:
@@ -768,7 +846,7 @@ if st.button("Run ETL & Prepare Compiled Order Form"):
                             for col in location_merged.columns:
                                 col_lower = col.lower()
                                 if 'case' in col_lower and any(str(num) in col for num in range(10)):
-                                    st.info(f"Using column '{col}' as potential case size indicator")
+                                    diag.info("Using column '{}' as potential case size indicator", col)
                                     try:
                                         # See if it contains numeric values
                                         location_merged[col] = pd.to_numeric(location_merged[col], errors='coerce')
@@ -806,82 +884,32 @@ if st.button("Run ETL & Prepare Compiled Order Form"):
                                         lambda x: next((size for category, size in default_case_sizes.items() 
                                                         if category.lower() in str(x).lower()), 12)
                                     )
-                                    st.info("Created EachesPerCase column with values based on product classification")
+                                    diag.info("Created EachesPerCase column with values based on product classification")
                                 else:
                                     # Just use a standard default
                                     location_merged['EachesPerCase'] = 12
-                                    st.info("Created EachesPerCase column with default value of 12")
-                        
-                        # Just use all columns from the merged dataframe
-                        all_cols = location_merged.columns.tolist()
-                        
-                        # Ensure "Order Qty" column exists for the user to fill in
-                        if "Order Qty" not in all_cols:
-                            # Try to position it after In Stock Qty
-                            if "In Stock Qty" in all_cols:
-                                insert_pos = all_cols.index("In Stock Qty") + 1
-                                location_merged.insert(insert_pos, "Order Qty", "")
-                                all_cols.insert(insert_pos, "Order Qty")
-                            else:
-                                location_merged["Order Qty"] = ""
-                                all_cols.append("Order Qty")
+                                    diag.info("Created EachesPerCase column with default value of 12")
                         
                         # Create sheet name from location (ensure it's valid for Excel)
                         sheet_name = str(location)[:31].replace(":", "-").replace("/", "-").replace(" ", "_")
                         
-                        # Ensure In Stock Qty is numeric if it exists
-                        if "In Stock Qty" in location_merged.columns:
-                            try:
-                                location_merged["In Stock Qty"] = location_merged["In Stock Qty"].fillna(0).astype(int)
-                            except:
-                                # Just keep as is if conversion fails
-                                pass
-                        
                         # Enable deeper debugging if EachesPerCase column isn't found
                         if 'EachesPerCase' not in catalogue_df.columns and 'EachesPerCase' not in location_merged.columns:
                             # This is a critical missing column; provide more details to help debug
                             st.error("EachesPerCase column not found! Enabling debug mode.")
-                            st.info(f"All columns in order form (catalogue_df): {sorted(catalogue_df.columns.tolist())}")
-                            st.info(f"First 5 rows of order form data:")
-                            st.write(catalogue_df.head())
+                            diag.debug("All columns in order form (catalogue_df): {}", sorted(catalogue_df.columns.tolist()))
+                            diag.debug("First 5 rows of order form data:")
+                            diag.frame(catalogue_df.head)
                             
                             # Look for similar columns that might contain the case size information
                             case_related = [col for col in catalogue_df.columns if 'case' in col.lower()]
                             if case_related:
-                                st.info(f"Potential case-related columns found: {case_related}")
+                                diag.debug("Potential case-related columns found: {}", case_related)
                                 for col in case_related:
-                                    st.info(f"Sample values for {col}: {catalogue_df[col].head().tolist()}")
-                        
-                        # Format date columns properly
-                        date_columns = [
-                            "First Received Date", "Last Received Date", "Last In Stock Date",
-                            "First Received", "Last Received", "Last In Stock",
-                            "First Receipt Date", "Last Receipt Date"
-                        ]
-                        
-                        for col in location_merged.columns:
-                            if col in date_columns or any(date_term in col.lower() for date_term in ["date", "received", "receipt"]):
-                                try:
-                                    # Convert to datetime if not already
-                                    if not pd.api.types.is_datetime64_dtype(location_merged[col]):
-                                        location_merged[col] = pd.to_datetime(location_merged[col], errors='coerce')
-                                except:
-                                    # Just keep as is if conversion fails
-                                    pass
-                        
-                        # Add order calculation columns - make sure they're visible
-                        today = pd.to_datetime('today')
-                        days_to_receiving = (receiving_date - today.date()).days
-                        
-                        # Add calculation columns at the beginning to make them more visible
-                        # Create a list of existing columns
-                        existing_cols = location_merged.columns.tolist()
-                        
-                        # Add new columns to the beginning
-                        location_merged.insert(0, 'Receiving Date', receiving_date)
-                        location_merged.insert(1, 'Days Until Receiving', days_to_receiving)
-                        location_merged.insert(2, 'Coverage Period', days_to_receiving + 14)  # receiving + 14 days
+                                    diag.debug("Sample values for {}: {}", col, catalogue_df[col].head())
                         
+                        # Order calculation columns are computed from the merged inputs and
+                        # added in one assign; the sheet schema below puts them in their place.
                         # Find sales per day column
                         sales_per_day_col = None
                         for col in location_merged.columns:
@@ -932,179 +960,44 @@ if st.button("Run ETL & Prepare Compiled Order Form"):
                                     case_size_col = col
                                     break
                         
-                        # If we have sales per day, we can calculate order quantities
+                        # If we have sales per day, we can calculate order quantities; the
+                        # projected need comes from the ETL's day-of-week demand forecast where
+                        # it has one and from the flat sales rate otherwise. The forecast per
+                        # day is averaged over the coverage period's own weekdays, so the
+                        # product is the forecast total for those days
                         if sales_per_day_col is not None:
-                            # Make numeric
-                            try:
-                                location_merged[sales_per_day_col] = pd.to_numeric(location_merged[sales_per_day_col], errors='coerce').fillna(0)
-                            except:
-                                pass
-                            
-                            # Calculate projected need
-                            location_merged['Projected Need'] = location_merged[sales_per_day_col] * location_merged['Coverage Period']
-                            
-                            # Current inventory including on order
-                            if "In Stock Qty" in location_merged.columns:
-                                try:
-                                    location_merged["In Stock Qty"] = pd.to_numeric(location_merged["In Stock Qty"], errors='coerce').fillna(0)
-                                except:
-                                    pass
-                                
-                                if on_order_col is not None:
-                                    try:
-                                        location_merged[on_order_col] = pd.to_numeric(location_merged[on_order_col], errors='coerce').fillna(0)
-                                    except:
-                                        pass
-                                    location_merged['Current Inventory'] = location_merged["In Stock Qty"] + location_merged[on_order_col]
-                                else:
-                                    location_merged['Current Inventory'] = location_merged["In Stock Qty"]
-                                    location_merged['On Order'] = 0  # Add placeholder
-                                
-                                # Calculate units needed
-                                location_merged['Units Needed'] = (location_merged['Projected Need'] - location_merged['Current Inventory']).clip(lower=0)
-                                
-                                # Calculate cases needed if we have case size
-                                if case_size_col is not None:
-                                    try:
-                                        location_merged[case_size_col] = pd.to_numeric(location_merged[case_size_col], errors='coerce').fillna(1)
-                                    except:
-                                        pass
-                                    
-                                    # Calculate cases needed (to 1 decimal place without rounding up)
-                                    location_merged['Cases Needed'] = (location_merged['Units Needed'] / location_merged[case_size_col]).round(1)
-                                    
-                                    # Set Order Qty to Cases Needed
-                                    location_merged['Order Qty'] = location_merged['Cases Needed']
-                                else:
-                                    # No case size column found, but check if EachesPerCase exists directly
-                                    if 'EachesPerCase' in location_merged.columns:
-                                        st.info("Using EachesPerCase column from order form for calculations")
-                                        try:
-                                            location_merged['EachesPerCase'] = pd.to_numeric(location_merged['EachesPerCase'], errors='coerce').fillna(1)
-                                            location_merged['Cases Needed'] = (location_merged['Units Needed'] / location_merged['EachesPerCase']).round(1)
-                                            location_merged['Order Qty'] = location_merged['Cases Needed']
-                                        except Exception as e:
-                                            st.error(f"Error using EachesPerCase: {str(e)}")
-                                            # Fallback to simple calculation
-                                            location_merged['Case Size'] = 1  # Add placeholder
-                                            location_merged['Cases Needed'] = location_merged['Units Needed'].round(1)
-                                            location_merged['Order Qty'] = location_merged['Cases Needed']
-                                    else:
-                                        # No case size, just use units
-                                        location_merged['Case Size'] = 1  # Add placeholder
-                                        location_merged['Cases Needed'] = location_merged['Units Needed'].round(1)
-                                        location_merged['Order Qty'] = location_merged['Cases Needed']
-                        
-                        # Define the specific columns to include and their order
-                        desired_columns = [
-                            "AGLC SKU",
-                            "Format",
-                            "Subcategory",
-                            "Type_(Sub 2 Category)",
-                            "Brand Name",
-                            "SKU DESCRIPTION",
-                            "Available Cases",
-                            "EachesPerCase",
-                            "QUANTITY",
-                            "Cases Needed",
-                            "Sales per Day",
-                            "In Stock Qty",
-                            "On Order Qty",
-                            "Week Net Sold",
-                            "2d Net Sold",
-                            "DCE (g)",
-                            "Sell Price Per Unit",
-                            "THC MIN",
-                            "THC MAX",
-                            "CBD MIN",
-                            "CBD MAX",
-                            "Total Days in Stock",
-                            "New SKU This Week",
-                            "On Sale",
-                            "Merchandising Strategy",
-                            "Strain_(Sub 3 Category)",
-                            "In Stock Cost",
-                            "Company Name",
-                            "Avg Unit Cost In Stock",
-                            "Regular Price",
-                            "Retail Value In Stock",
-                            "Profit Margin ($)",
-                            "Profit Margin (%)",
-                            "Markup",
-                            "First Received Date",
-                            "Last Received Date",
-                            "Days Since Last Sold",
-                            "Brand",
-                            "Manufacturer",
-                            "Week Avg Price",
-                            "Week Total Cost",
-                            "2d Avg Price",
-                            "2d Total Cost",
-                            "Total In Stock Qty",
-                            "Last In Stock Date",
-                            "Avg Days In Stock Per Cycle",
-                            "Stock Variability",
-                            "Stockout Frequency",
-                            "Order Qty",
-                            "Projected Need",
-                            "Current Inventory",
-                            "Units Needed"
-                        ]
-                        
-                        # Create a mapping of possible column names to standardized names
-                        column_mappings = {
-                            # SKU mappings
-                            "SKU": "AGLC SKU",
-                            "Product SKU": "AGLC SKU", 
-                            "AGLC Product ID": "AGLC SKU",
-                            "Product ID": "AGLC SKU",
-                            
-                            # Description mappings
-                            "Description": "SKU DESCRIPTION",
-                            "Product Description": "SKU DESCRIPTION",
-                            "Product Name": "SKU DESCRIPTION",
-                            "Name": "SKU DESCRIPTION",
+                            if case_size_col is None and 'EachesPerCase' in location_merged.columns:
+                                diag.info("Using EachesPerCase column from order form for calculations")
+                                case_size_col = 'EachesPerCase'
+                            formula, daily_demand = order_columns(
+                                location_merged, coverage_days, sales_per_day_col,
+                                on_order_col=on_order_col, case_col=case_size_col
+                            )
+                            location_merged = location_merged.assign(**formula)
                             
-                            # Standardize various column names
-                            "Brand": "Brand Name",
-                            "Supplier": "Company Name",
-                            "Supplier Name": "Company Name",
-                            "UPC": "EachesPerCase",
-                            "Case Size": "EachesPerCase",
-                            "Units Per Case": "EachesPerCase",
-                            "Category": "Format",
-                            "Product Type": "Format",
-                            "Format Type": "Format",
-                            "Product Format": "Format",
-                            "Strain": "Strain_(Sub 3 Category)",
-                            "Strain Name": "Strain_(Sub 3 Category)",
-                            "Sub Category": "Subcategory",
-                            "Sub-Category": "Subcategory",
-                            "Product Category": "Subcategory"
-                        }
-                        
-                        # Standardize column names in the merged dataframe
-                        final_location_df = location_merged.copy()
-                        for orig_col, std_col in column_mappings.items():
-                            if orig_col in final_location_df.columns and std_col not in final_location_df.columns:
-                                final_location_df[std_col] = final_location_df[orig_col]
-                        
-                        # Filter to only include desired columns that exist in the dataframe
-                        # but keep any missing columns as empty placeholders
-                        output_columns = []
-                        for col in desired_columns:
-                            if col in final_location_df.columns:
-                                output_columns.append(col)
-                            else:
-                                # Add missing column as empty placeholder
-                                final_location_df[col] = ""
-                                output_columns.append(col)
+                            # Keep the formula inputs so orders can be rounded across all
+                            # locations and other receiving dates and buffers evaluated
+                            # without rebuilding the sheet
+                            if 'Units Needed' in formula:
+                                order_items.append(pd.DataFrame({
+                                    "AGLC SKU": location_merged["AGLC SKU"] if "AGLC SKU" in location_merged.columns else location_merged.index,
+                                    "Location": location,
+                                    "Daily Demand": daily_demand,
+                                    "Current Inventory": formula['Current Inventory'],
+                                    "Case Size": formula.get(case_size_col, 1),
+                                    "Units Needed": formula['Units Needed'],
+                                    "Unit Cost": pd.to_numeric(location_merged.get('Sell Price Per Unit'), errors='coerce'),
+                                    "Available Cases": pd.to_numeric(location_merged.get('Available Cases'), errors='coerce'),
+                                    "Sheet": sheet_name
+                                }))
                         
-                        # Reorder columns to match the desired order
-                        final_location_df = final_location_df[output_columns]
+                        # Standardize column names, keep the order-sheet columns in order and
+                        # fill missing ones with empty placeholders, from a schema compiled
+                        # once per set of merged columns
+                        final_location_df = order_schema(hist_days, LOCATION_SHEET).apply(location_merged)
                         
-                        # Write to sheet with the specified columns in the desired order
-                        final_location_df.to_excel(writer, sheet_name=sheet_name, index=False)
+                        # Written once every location's orders are known
+                        location_sheets[sheet_name] = final_location_df
                         
                         # Report success with stats
                         match_count = 0
@@ -1113,11 +1006,38 @@ if st.button("Run ETL & Prepare Compiled Order Form"):
                         
                         # Log detailed column information
                         st.success(f"Created sheet for location '{location}' with {len(final_location_df)} products ({match_count} with stock > 0)")
-                        st.info(f"Sheet contains {len(final_location_df.columns)} columns")
+                        diag.debug("Sheet contains {} columns", len(final_location_df.columns))
                     else:
                         st.error(f"Could not find required columns for location '{location}'. " 
                                 f"Need SKU column (found: {loc_sku_col}) and stock column (found: {loc_stock_col}).")
             
+            # Round orders to whole cases for all locations together, since
+            # AGLC's Available Cases are shared between them
+            if order_items:
+                order_df = pd.concat(order_items, ignore_index=True)
+                orders = optimize_orders(
+                    order_df["Units Needed"],
+                    order_df["Case Size"],
+                    order_df["Location"],
+                    order_df["AGLC SKU"],
+                    current_inventory=order_df["Current Inventory"],
+                    unit_cost=order_df["Unit Cost"],
+                    available_cases=order_df["Available Cases"],
+                    budget=location_budget or None,
+                    shelf_units=shelf_max_units or None
+                )
+                for sheet, rows in order_df.groupby("Sheet", sort=False).indices.items():
+                    location_sheets[sheet]["Order Qty"] = orders["Order Qty"].to_numpy()[rows]
+                    location_sheets[sheet]["Order Limited By"] = orders["Order Limited By"].to_numpy()[rows]
+                limited = orders["Order Limited By"].value_counts()
+                if len(limited.drop("", errors="ignore")):
+                    st.info("Orders cut by a limit: " + ", ".join(
+                        f"{reason} {count}" for reason, count in limited.drop("", errors="ignore").items()))
+            
+            # Write each location's sheet with the specified columns in the desired order
+            for sheet, sheet_df in location_sheets.items():
+                sheet_df.to_excel(writer, sheet_name=sheet, index=False)
+            
             # Also create a combined sheet with all data
             combined_sheet = "All Locations"
             
@@ -1127,154 +1047,12 @@ if st.button("Run ETL & Prepare Compiled Order Form"):
             if "_stock_qty" in merged.columns:
                 merged = merged.drop(columns=["_stock_qty"], errors="ignore")
             
-            # Ensure Order Qty column exists
-            if "Order Qty" not in merged.columns:
-                # Insert after In Stock Qty if it exists
-                if "In Stock Qty" in merged.columns:
-                    # Find the position of In Stock Qty
-                    cols = merged.columns.tolist()
-                    pos = cols.index("In Stock Qty") + 1
-                    # Insert Order Qty after it
-                    merged.insert(pos, "Order Qty", "")
-                else:
-                    # Add at the end
-                    merged["Order Qty"] = ""
-            
-            # Ensure In Stock Qty is numeric if it exists
-            if "In Stock Qty" in merged.columns:
-                try:
-                    merged["In Stock Qty"] = merged["In Stock Qty"].fillna(0).astype(int)
-                except:
-                    # Keep as is if conversion fails
-                    pass
-            
-            # Format date columns properly
-            date_columns = [
-                "First Received Date", "Last Received Date", "Last In Stock Date",
-                "First Received", "Last Received", "Last In Stock",
-                "First Receipt Date", "Last Receipt Date"
-            ]
-            
-            for col in merged.columns:
-                if col in date_columns or any(date_term in col.lower() for date_term in ["date", "received", "receipt"]):
-                    try:
-                        # Convert to datetime if not already
-                        if not pd.api.types.is_datetime64_dtype(merged[col]):
-                            merged[col] = pd.to_datetime(merged[col], errors='coerce')
-                    except:
-                        # Just keep as is if conversion fails
-                        pass
-            
-            # Define the specific columns to include and their order for the combined sheet
-            desired_columns = [
-                "AGLC SKU",
-                "Format",
-                "Subcategory",
-                "Type_(Sub 2 Category)",
-                "Brand Name",
-                "SKU DESCRIPTION",
-                "Available Cases",
-                "EachesPerCase",
-                "QUANTITY",
-                "Cases Needed",
-                "Sales per Day",
-                "In Stock Qty",
-                "On Order Qty",
-                "Week Net Sold",
-                "2d Net Sold",
-                "DCE (g)",
-                "Sell Price Per Unit",
-                "THC MIN",
-                "THC MAX",
-                "CBD MIN",
-                "CBD MAX",
-                "Total Days in Stock",
-                "New SKU This Week",
-                "On Sale",
-                "Merchandising Strategy",
-                "Strain_(Sub 3 Category)",
-                "In Stock Cost",
-                "Company Name",
-                "Avg Unit Cost In Stock",
-                "Regular Price",
-                "Retail Value In Stock",
-                "Profit Margin ($)",
-                "Profit Margin (%)",
-                "Markup",
-                "First Received Date",
-                "Last Received Date",
-                "Days Since Last Sold",
-                "Brand",
-                "Manufacturer",
-                "Week Avg Price",
-                "Week Total Cost",
-                "2d Avg Price",
-                "2d Total Cost",
-                "Total In Stock Qty",
-                "Last In Stock Date",
-                "Avg Days In Stock Per Cycle",
-                "Stock Variability",
-                "Stockout Frequency",
-                "Order Qty",
-                "Projected Need",
-                "Current Inventory",
-                "Units Needed",
-                "Location"  # Keep location column for the combined sheet
-            ]
-            
-            # Column mappings (same as for individual location sheets)
-            column_mappings = {
-                # SKU mappings
-                "SKU": "AGLC SKU",
-                "Product SKU": "AGLC SKU", 
-                "AGLC Product ID": "AGLC SKU",
-                "Product ID": "AGLC SKU",
-                
-                # Description mappings
-                "Description": "SKU DESCRIPTION",
-                "Product Description": "SKU DESCRIPTION",
-                "Product Name": "SKU DESCRIPTION",
-                "Name": "SKU DESCRIPTION",
-                
-                # Standardize various column names
-                "Brand": "Brand Name",
-                "Supplier": "Company Name",
-                "Supplier Name": "Company Name",
-                "UPC": "EachesPerCase",
-                "Case Size": "EachesPerCase",
-                "Units Per Case": "EachesPerCase",
-                "Category": "Format",
-                "Product Type": "Format",
-                "Format Type": "Format",
-                "Product Format": "Format",
-                "Strain": "Strain_(Sub 3 Category)",
-                "Strain Name": "Strain_(Sub 3 Category)",
-                "Sub Category": "Subcategory",
-                "Sub-Category": "Subcategory",
-                "Product Category": "Subcategory"
-            }
-            
-            # Standardize column names
-            for orig_col, std_col in column_mappings.items():
-                if orig_col in merged.columns and std_col not in merged.columns:
-                    merged[std_col] = merged[orig_col]
-            
-            # Filter to only include desired columns that exist
-            output_columns = []
-            for col in desired_columns:
-                if col in merged.columns:
-                    output_columns.append(col)
-                else:
-                    # Add missing column as empty placeholder
-                    merged[col] = ""
-                    output_columns.append(col)
-            
-            # Reorder columns to match the desired order
-            final_merged = merged[output_columns]
+            # Standardize, order and type the columns in one projection
+            final_merged = order_schema(hist_days, ALL_LOCATIONS_SHEET).apply(merged)
             
             # Write the combined data with the specified columns in the desired order
             final_merged.to_excel(writer, sheet_name=combined_sheet, index=False)
-            st.info(f"Created combined data in sheet: '{combined_sheet}' with {len(merged.columns)} columns")
+            diag.info("Created combined data in sheet: '{}' with {} columns", combined_sheet, len(final_merged.columns))
             
         else:
             # If no locations found, just use the original merged data
@@ -1286,153 +1064,30 @@ if st.button("Run ETL & Prepare Compiled Order Form"):
             if "_stock_qty" in merged.columns:
                 merged = merged.drop(columns=["_stock_qty"], errors="ignore")
             
-            # Ensure Order Qty column exists
-            if "Order Qty" not in merged.columns:
-                # Insert after In Stock Qty if it exists
-                if "In Stock Qty" in merged.columns:
-                    # Find the position of In Stock Qty
-                    cols = merged.columns.tolist()
-                    pos = cols.index("In Stock Qty") + 1
-                    # Insert Order Qty after it
-                    merged.insert(pos, "Order Qty", "")
-                else:
-                    # Add at the end
-                    merged["Order Qty"] = ""
-            
-            # Ensure In Stock Qty is numeric if it exists
-            if "In Stock Qty" in merged.columns:
-                try:
-                    merged["In Stock Qty"] = merged["In Stock Qty"].fillna(0).astype(int)
-                except:
-                    # Keep as is if conversion fails
-                    pass
-            
-            # Format date columns properly
-            date_columns = [
-                "First Received Date", "Last Received Date", "Last In Stock Date",
-                "First Received", "Last Received", "Last In Stock",
-                "First Receipt Date", "Last Receipt Date"
-            ]
-            
-            for col in merged.columns:
-                if col in date_columns or any(date_term in col.lower() for date_term in ["date", "received", "receipt"]):
-                    try:
-                        # Convert to datetime if not already
-                        if not pd.api.types.is_datetime64_dtype(merged[col]):
-                            merged[col] = pd.to_datetime(merged[col], errors='coerce')
-                    except:
-                        # Just keep as is if conversion fails
-                        pass
-            
-            # Define the specific columns to include and their order for the no-location case
-            desired_columns = [
-                "AGLC SKU",
-                "Format",
-                "Subcategory",
-                "Type_(Sub 2 Category)",
-                "Brand Name",
-                "SKU DESCRIPTION",
-                "Available Cases",
-                "EachesPerCase",
-                "QUANTITY",
-                "Cases Needed",
-                "Sales per Day",
-                "In Stock Qty",
-                "On Order Qty",
-                "Week Net Sold",
-                "2d Net Sold",
-                "DCE (g)",
-                "Sell Price Per Unit",
-                "THC MIN",
-                "THC MAX",
-                "CBD MIN",
-                "CBD MAX",
-                "Total Days in Stock",
-                "New SKU This Week",
-                "On Sale",
-                "Merchandising Strategy",
-                "Strain_(Sub 3 Category)",
-                "In Stock Cost",
-                "Company Name",
-                "Avg Unit Cost In Stock",
-                "Regular Price",
-                "Retail Value In Stock",
-                "Profit Margin ($)",
-                "Profit Margin (%)",
-                "Markup",
-                "First Received Date",
-                "Last Received Date",
-                "Days Since Last Sold",
-                "Brand",
-                "Manufacturer",
-                "Week Avg Price",
-                "Week Total Cost",
-                "2d Avg Price",
-                "2d Total Cost",
-                "Total In Stock Qty",
-                "Last In Stock Date",
-                "Avg Days In Stock Per Cycle",
-                "Stock Variability",
-                "Stockout Frequency",
-                "Order Qty",
-                "Projected Need",
-                "Current Inventory",
-                "Units Needed"
-            ]
-            
-            # Column mappings (same as for the other sheets)
-            column_mappings = {
-                # SKU mappings
-                "SKU": "AGLC SKU",
-                "Product SKU": "AGLC SKU", 
-                "AGLC Product ID": "AGLC SKU",
-                "Product ID": "AGLC SKU",
-                
-                # Description mappings
-                "Description": "SKU DESCRIPTION",
-                "Product Description": "SKU DESCRIPTION",
-                "Product Name": "SKU DESCRIPTION",
-                "Name": "SKU DESCRIPTION",
-                
-                # Standardize various column names
-                "Brand": "Brand Name",
-                "Supplier": "Company Name",
-                "Supplier Name": "Company Name",
-                "UPC": "EachesPerCase",
-                "Case Size": "EachesPerCase",
-                "Units Per Case": "EachesPerCase",
-                "Category": "Format",
-                "Product Type": "Format",
-                "Format Type": "Format",
-                "Product Format": "Format",
-                "Strain": "Strain_(Sub 3 Category)",
-                "Strain Name": "Strain_(Sub 3 Category)",
-                "Sub Category": "Subcategory",
-                "Sub-Category": "Subcategory",
-                "Product Category": "Subcategory"
-            }
-            
-            # Standardize column names
-            for orig_col, std_col in column_mappings.items():
-                if orig_col in merged.columns and std_col not in merged.columns:
-                    merged[std_col] = merged[orig_col]
-            
-            # Filter to only include desired columns that exist
-            output_columns = []
-            for col in desired_columns:
-                if col in merged.columns:
-                    output_columns.append(col)
-                else:
-                    # Add missing column as empty placeholder
-                    merged[col] = ""
-                    output_columns.append(col)
-            
-            # Reorder columns to match the desired order
-            final_merged = merged[output_columns]
+            # Standardize, order and type the columns in one projection
+            final_merged = order_schema(hist_days, CATALOGUE_SHEET).apply(merged)
             
             # Write the data with the specified columns in the desired order
             final_merged.to_excel(writer, sheet_name=sheet_name, index=False)
-            st.info(f"Created data in sheet: '{sheet_name}' with {len(merged.columns)} columns (no location data found)")
+            diag.info("Created data in sheet: '{}' with {} columns (no location data found)", sheet_name, len(final_merged.columns))
+        
+        # Compare other receiving dates and coverage buffers in one pass,
+        # each ordered in whole cases within the same limits as the sheets
+        if order_df is not None:
+            scenarios = order_scenarios(
+                order_df[["AGLC SKU", "Location"]],
+                order_df["Daily Demand"],
+                order_df["Current Inventory"],
+                order_df["Case Size"],
+                receiving_date_grid(receiving_date) or [receiving_date],
+                BUFFER_DAYS,
+                unit_cost=order_df["Unit Cost"],
+                available_cases=order_df["Available Cases"],
+                budget=location_budget or None,
+                shelf_units=shelf_max_units or None
+            )
+            scenarios.summary().to_excel(writer, sheet_name="Scenarios", index=False)
+            st.session_state["order_scenarios"] = scenarios
         
         # Add a debug info sheet
         debug_info = pd.DataFrame({
@@ -1491,12 +1146,12 @@ if st.button("Run ETL & Prepare Compiled Order Form"):
     2. For each location, go to the corresponding sheet
     3. Review the automated order calculations:
        - **Receiving Date**: {receiving_date.strftime('%Y-%m-%d')} (selected by you)
-       - **Coverage Period**: {(receiving_date - pd.to_datetime('today').date()).days + 14} days (days until receiving + 14 days)
-       - **Projected Need**: Sales/day × Coverage Period
+       - **Coverage Period**: {coverage_days} days (days until receiving + 14 days)
+       - **Projected Need**: Forecast demand over the Coverage Period's days (Sales/day × Coverage Period when no forecast)
        - **Current Inventory**: In Stock Qty + On Order
        - **Units Needed**: Projected Need - Current Inventory
        - **Cases Needed**: Units Needed ÷ Case Size (rounded to 1 decimal place)
-    4. The "Order Qty" column has been automatically filled with suggested values
+    4. The "Order Qty" column has been automatically filled with suggested whole cases ("Order Limited By" shows lines cut by a limit)
     5. Review and adjust the "Order Qty" values as needed
     6. Save the file and submit according to AGLC instructions
     
@@ -1508,3 +1163,41 @@ if st.button("Run ETL & Prepare Compiled Order Form"):
         st.info(f"Your file contains sheets for these locations: {', '.join(str(loc) for loc in locations)}")
     else:
         st.warning("No location data was found in the inventory. The order form has been created with a single Catalogue sheet.")
+
+# ── Window metrics ──────────────────────────────────────────────────────────
+# Read from the cube of the last ETL run, so moving the slider only reruns
+# this section: every window is a difference of two prefix sums.
+metrics_cube = st.session_state.get("metrics_cube")
+if metrics_cube is not None and len(metrics_cube.days):
+    st.divider()
+    st.subheader("Stock & Sales by Window")
+    window_days = st.slider("Window (days)", min_value=1, max_value=len(metrics_cube.days),
+                            value=min(int(hist_days), len(metrics_cube.days)))
+    st.caption(f"History {metrics_cube.days[0]:%Y-%m-%d} to {metrics_cube.days[-1]:%Y-%m-%d}")
+    st.dataframe(metrics_cube.window_frame(window_days), use_container_width=True)
+
+# ── Order scenarios ─────────────────────────────────────────────────────────
+# Every receiving date × buffer combination was evaluated with the order
+# form, so picking another one is a lookup in the scenario cube.
+order_scenario_cube = st.session_state.get("order_scenarios")
+if order_scenario_cube is not None:
+    st.divider()
+    st.subheader("Order Scenarios")
+    st.dataframe(order_scenario_cube.summary(), use_container_width=True)
+    col1, col2 = st.columns(2)
+    with col1:
+        dates = order_scenario_cube.receiving_dates
+        scenario_date = st.selectbox("Receiving date", dates,
+                                     index=dates.index(receiving_date) if receiving_date in dates else 0)
+    with col2:
+        buffers = order_scenario_cube.buffers
+        scenario_buffer = st.selectbox("Buffer days", buffers,
+                                       index=buffers.index(DEFAULT_BUFFER) if DEFAULT_BUFFER in buffers else 0)
+    st.dataframe(order_scenario_cube.scenario(scenario_date, scenario_buffer), use_container_width=True)
+
+# ── Diagnostics ─────────────────────────────────────────────────────────────
+# Messages of the last run, formatted only when the panel is switched on.
+diagnostics_log = st.session_state.get("diagnostics")
+if diagnostics_log is not None and st.sidebar.checkbox("Show diagnostics"):
+    st.divider()
+    diagnostics_log.render(st)
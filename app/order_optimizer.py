@@ -0,0 +1,125 @@
+"""
+Whole-case order quantities under budget, supply and shelf limits.
+
+``Cases Needed`` on the order sheets is fractional. ``optimize_orders``
+turns it into integer cases for every SKU of every location at once:
+
+1. round each line to the nearest whole case (``round_up_at`` decides
+   when a fraction of a case is worth a full one)
+2. cap it so stock + on order + the order fits the shelf
+3. share each SKU's AGLC ``Available Cases`` between the locations,
+   most urgent lines first
+4. fill each location's budget with its most urgent lines first
+
+Steps 3 and 4 are greedy allocations: the lines are sorted by group and
+priority once, and each group whose lines do not all fit its limit is
+walked in that order, every line getting what the lines before it left.
+"""
+import numpy as np
+import pandas as pd
+
+ROUND_UP_AT = 0.5
+
+LIMIT_SHELF = "Shelf"
+LIMIT_AVAILABLE = "Available Cases"
+LIMIT_BUDGET = "Budget"
+
+
+def _as_array(values, n: int, fill: float) -> np.ndarray:
+    if values is None:
+        return np.full(n, fill)
+    values = pd.to_numeric(pd.Series(np.broadcast_to(values, n) if np.ndim(values) == 0 else values),
+                           errors="coerce").to_numpy(dtype=float)
+    return np.where(np.isnan(values), fill, values)
+
+
+def _prefix_cap(groups: np.ndarray, priority: np.ndarray, amount: np.ndarray,
+                limit: np.ndarray, unit: np.ndarray) -> np.ndarray:
+    """
+    Caps ``amount`` (in units of ``unit`` each) so the lines of each group,
+    taken in descending ``priority``, use at most the group's ``limit``
+    (given per line, the same for every line of a group). Each line gets
+    as much as is left after the lines before it, so a line cut back
+    leaves the rest of the limit to the cheaper lines after it. Returns
+    the capped whole amounts.
+    """
+    order = np.lexsort((-priority, groups))
+    g = groups[order]
+    starts = np.r_[0, np.flatnonzero(g[1:] != g[:-1]) + 1, len(g)]
+    used = amount * unit
+    result = amount.astype(float)
+    for start, stop in zip(starts[:-1], starts[1:]):
+        lines = order[start:stop]
+        left = limit[lines[0]]
+        if not np.isfinite(left):
+            continue
+        # the lines up to the first one that does not fit keep their
+        # amount; from there on each line is walked, until nothing is left
+        cum = np.cumsum(used[lines])
+        first = int(np.searchsorted(cum, left, side="right"))
+        if first == len(lines):
+            continue
+        if first:
+            left -= cum[first - 1]
+        for k, i in enumerate(lines[first:], start=first):
+            if unit[i] > 0:
+                result[i] = min(amount[i], np.floor(max(left, 0) / unit[i]))
+                left -= result[i] * unit[i]
+                if left <= 0:
+                    rest = lines[k + 1:]
+                    result[rest[unit[rest] > 0]] = 0
+                    break
+    return result
+
+
+def optimize_orders(units_needed, case_size, locations, skus,
+                    current_inventory=None, unit_cost=None, available_cases=None,
+                    budget: float = None, shelf_units: float = None,
+                    priority=None, round_up_at: float = ROUND_UP_AT) -> pd.DataFrame:
+    """
+    Integer case orders for a set of lines (one SKU at one location).
+
+    ``available_cases`` is the AGLC supply per line's SKU (the same for all
+    locations of a SKU, NaN: unlimited), ``budget`` the spend allowed per
+    location and ``shelf_units`` the most units of a SKU a location may
+    hold after receiving; None disables a limit. Spend is
+    ``cases × case_size × unit_cost``. ``priority`` ranks lines competing
+    for a limit (default: units needed).
+
+    Returns a frame aligned with the inputs with ``Order Qty`` (int) and
+    ``Order Limited By`` (the last limit that cut the line, or "").
+    """
+    units = np.clip(_as_array(units_needed, len(units_needed), 0.0), 0, None)
+    n = len(units)
+    case = _as_array(case_size, n, 1.0)
+    case = np.where(case > 0, case, 1.0)
+    current = _as_array(current_inventory, n, 0.0)
+    cost = _as_array(unit_cost, n, 0.0) * case
+    priority = units if priority is None else _as_array(priority, n, 0.0)
+    limited = np.full(n, "", dtype=object)
+
+    exact = units / case
+    cases = np.floor(exact) + ((exact - np.floor(exact)) >= round_up_at)
+
+    if shelf_units:
+        room = np.floor(np.maximum(shelf_units - current, 0) / case)
+        limited[room < cases] = LIMIT_SHELF
+        cases = np.minimum(cases, room)
+
+    if available_cases is not None:
+        sku_codes = pd.factorize(pd.Series(skus))[0]
+        supply = _as_array(available_cases, n, np.inf)
+        capped = _prefix_cap(sku_codes, priority, cases, supply, np.ones(n))
+        limited[capped < cases] = LIMIT_AVAILABLE
+        cases = capped
+
+    if budget:
+        location_codes = pd.factorize(pd.Series(locations))[0]
+        capped = _prefix_cap(location_codes, priority, cases, np.full(n, float(budget)), cost)
+        limited[capped < cases] = LIMIT_BUDGET
+        cases = capped
+
+    return pd.DataFrame({
+        "Order Qty":        cases.astype(np.int64),
+        "Order Limited By": limited,
+    })
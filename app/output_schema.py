@@ -0,0 +1,209 @@
+"""
+Declarative schema of the order sheets written by main.py.
+
+The column order, the aliases that feed a standard column from another
+name, the date columns and the integer columns are declared once here.
+``OutputSchema.compile`` resolves them against a set of input columns and
+the compiled result is cached per column set, so every location sheet
+(which all share the merged columns) reuses one. Applying it is a single
+reindex (see sheet_assembly.assemble) plus a conversion of the resolved
+date and integer columns.
+
+The sales window columns are named after the ETL's ``hist_days`` (e.g.
+``30d Net Sold``), so ``order_schema`` builds the schema of each kind of
+sheet per window length.
+"""
+from functools import lru_cache
+import pandas as pd
+from sheet_assembly import ColumnPlan, plan_columns, assemble
+
+ORDER_COLUMNS = (
+    "AGLC SKU",
+    "Format",
+    "Subcategory",
+    "Type_(Sub 2 Category)",
+    "Brand Name",
+    "SKU DESCRIPTION",
+    "Available Cases",
+    "EachesPerCase",
+    "QUANTITY",
+    "Cases Needed",
+    "Sales per Day",
+    "Forecast per Day",
+    "In Stock Qty",
+    "On Order Qty",
+    "Week Net Sold",
+    "{days}d Net Sold",
+    "DCE (g)",
+    "Sell Price Per Unit",
+    "THC MIN",
+    "THC MAX",
+    "CBD MIN",
+    "CBD MAX",
+    "Total Days in Stock",
+    "New SKU This Week",
+    "On Sale",
+    "Merchandising Strategy",
+    "Strain_(Sub 3 Category)",
+    "In Stock Cost",
+    "Company Name",
+    "Avg Unit Cost In Stock",
+    "Regular Price",
+    "Retail Value In Stock",
+    "Profit Margin ($)",
+    "Profit Margin (%)",
+    "Markup",
+    "First Received Date",
+    "Last Received Date",
+    "Days Since Last Sold",
+    "Brand",
+    "Manufacturer",
+    "Week Avg Price",
+    "Week Total Cost",
+    "{days}d Avg Price",
+    "{days}d Total Cost",
+    "Total In Stock Qty",
+    "Last In Stock Date",
+    "Avg Days In Stock Per Cycle",
+    "Stock Variability",
+    "Stockout Frequency",
+    "Days Out of Stock",
+    "Order Qty",
+    "Order Limited By",
+    "Projected Need",
+    "Current Inventory",
+    "Units Needed"
+)
+
+# input name -> standard output name; the first present alias in this
+# order feeds a standard column the input does not have itself
+COLUMN_ALIASES = {
+    # SKU mappings
+    "SKU": "AGLC SKU",
+    "Product SKU": "AGLC SKU",
+    "AGLC Product ID": "AGLC SKU",
+    "Product ID": "AGLC SKU",
+
+    # Description mappings
+    "Description": "SKU DESCRIPTION",
+    "Product Description": "SKU DESCRIPTION",
+    "Product Name": "SKU DESCRIPTION",
+    "Name": "SKU DESCRIPTION",
+
+    # Standardize various column names
+    "Brand": "Brand Name",
+    "Supplier": "Company Name",
+    "Supplier Name": "Company Name",
+    "UPC": "EachesPerCase",
+    "Case Size": "EachesPerCase",
+    "Units Per Case": "EachesPerCase",
+    "Category": "Format",
+    "Product Type": "Format",
+    "Format Type": "Format",
+    "Product Format": "Format",
+    "Strain": "Strain_(Sub 3 Category)",
+    "Strain Name": "Strain_(Sub 3 Category)",
+    "Sub Category": "Subcategory",
+    "Sub-Category": "Subcategory",
+    "Product Category": "Subcategory"
+}
+
+DATE_COLUMNS = (
+    "First Received Date", "Last Received Date", "Last In Stock Date",
+    "First Received", "Last Received", "Last In Stock",
+    "First Receipt Date", "Last Receipt Date"
+)
+# any other input column whose name contains one of these is a date too
+DATE_TERMS = ("date", "received", "receipt")
+
+INTEGER_COLUMNS = ("In Stock Qty",)
+
+
+class CompiledSchema:
+    """An OutputSchema resolved against one set of input columns."""
+
+    def __init__(self, plan: ColumnPlan, date_columns, integer_columns, fill_value):
+        self.plan = plan
+        self.date_columns = tuple(date_columns)
+        self.integer_columns = tuple(integer_columns)
+        self.fill_value = fill_value
+
+    def apply(self, frame: pd.DataFrame) -> pd.DataFrame:
+        out = assemble(frame, self.plan, fill_value=self.fill_value)
+        for col in self.date_columns:
+            if not pd.api.types.is_datetime64_dtype(out[col]):
+                try:
+                    out[col] = pd.to_datetime(out[col], errors="coerce")
+                except (TypeError, ValueError):
+                    pass  # keep as is if conversion fails
+        for col in self.integer_columns:
+            try:
+                out[col] = out[col].fillna(0).astype(int)
+            except (TypeError, ValueError):
+                pass  # keep as is if conversion fails
+        return out
+
+
+class OutputSchema:
+    """
+    Column order, aliases, date and integer columns of one kind of sheet.
+
+    Date columns are the input columns named in ``date_columns`` or
+    containing one of ``date_terms``; they are converted with
+    ``pd.to_datetime(errors="coerce")``. Integer columns get missing values
+    as 0. Output columns that no input feeds are filled with
+    ``fill_value`` and left unconverted.
+    """
+
+    def __init__(self, columns, aliases: dict = None, date_columns=DATE_COLUMNS,
+                 date_terms=DATE_TERMS, integer_columns=INTEGER_COLUMNS, fill_value=""):
+        self.columns = tuple(columns)
+        self.aliases = dict(COLUMN_ALIASES if aliases is None else aliases)
+        self.date_columns = frozenset(date_columns)
+        self.date_terms = tuple(date_terms)
+        self.integer_columns = frozenset(integer_columns)
+        self.fill_value = fill_value
+        self._compiled = {}
+
+    def _is_date(self, name) -> bool:
+        name = str(name)
+        return name in self.date_columns or any(term in name.lower() for term in self.date_terms)
+
+    def compile(self, input_columns) -> CompiledSchema:
+        """The schema resolved for ``input_columns``, cached per column set."""
+        key = tuple(input_columns)
+        compiled = self._compiled.get(key)
+        if compiled is None:
+            plan = plan_columns(key, self.columns, self.aliases)
+            fed = [(out, src) for out, src in zip(plan.output_columns, plan.sources) if src is not None]
+            compiled = self._compiled[key] = CompiledSchema(
+                plan,
+                date_columns=[out for out, src in fed if self._is_date(src)],
+                integer_columns=[out for out, src in fed if out in self.integer_columns],
+                fill_value=self.fill_value,
+            )
+        return compiled
+
+    def apply(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """Projects ``frame`` onto the schema: aliased, ordered, typed."""
+        return self.compile(frame.columns).apply(frame)
+
+
+LOCATION_SHEET, ALL_LOCATIONS_SHEET, CATALOGUE_SHEET = "location", "all_locations", "catalogue"
+
+
+@lru_cache(maxsize=16)
+def order_schema(hist_days: int, sheet: str = LOCATION_SHEET) -> OutputSchema:
+    """
+    The schema of one kind of order sheet, with the sales window columns of
+    a ``hist_days`` ETL run. Location sheets keep the merged values as they
+    are; the All Locations sheet (which also keeps each row's Location)
+    and the no-location Catalogue sheet get their date and In Stock Qty
+    columns typed.
+    """
+    columns = tuple(col.format(days=hist_days) for col in ORDER_COLUMNS)
+    if sheet == LOCATION_SHEET:
+        return OutputSchema(columns, date_columns=(), date_terms=(), integer_columns=())
+    if sheet == ALL_LOCATIONS_SHEET:
+        columns += ("Location",)
+    return OutputSchema(columns)
@@ -0,0 +1,92 @@
+"""
+Encrypted-at-rest persistence of the retail.albertacannabis.org session
+cookies, so a still-valid login can be reused across runs.
+
+Needs the optional ``cryptography`` package and a Fernet key in
+``ORDER_FORM_COOKIE_KEY`` (generate one with
+``python -c "from cryptography.fernet import Fernet; print(Fernet.generate_key().decode())"``).
+Without either, cookies are never written to disk and every run logs in.
+"""
+import os
+import json
+import logging
+import requests
+from etl.checkpoint import atomic_write
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+except ImportError:  # optional dependency: persistence is simply disabled
+    Fernet = None
+    InvalidToken = Exception
+
+logger = logging.getLogger(__name__)
+
+
+def _fernet():
+    key = os.getenv("ORDER_FORM_COOKIE_KEY")
+    if Fernet is None or not key:
+        return None
+    return Fernet(key.encode("utf-8"))
+
+
+def persistence_enabled() -> bool:
+    return _fernet() is not None
+
+
+def save_cookies(session: requests.Session, path: str) -> bool:
+    """Encrypts the session's cookies to ``path``; returns False when disabled."""
+    fernet = _fernet()
+    if fernet is None:
+        return False
+    cookies = [
+        {
+            "name":    c.name,
+            "value":   c.value,
+            "domain":  c.domain,
+            "path":    c.path,
+            "expires": c.expires,
+            "secure":  c.secure,
+            "rest":    c._rest,
+        }
+        for c in session.cookies
+    ]
+    token = fernet.encrypt(json.dumps(cookies).encode("utf-8"))
+
+    def write(tmp_path: str):
+        # the temporary file is created owner-only (0o600) by mkstemp
+        with open(tmp_path, "wb") as f:
+            f.write(token)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    atomic_write(path, write)
+    return True
+
+
+def load_cookies(session: requests.Session, path: str) -> bool:
+    """
+    Restores cookies saved by ``save_cookies`` into ``session``. Returns
+    False when persistence is disabled, nothing was saved, or the file can
+    no longer be decrypted (e.g. the key was rotated).
+    """
+    fernet = _fernet()
+    if fernet is None or not os.path.exists(path):
+        return False
+    try:
+        with open(path, "rb") as f:
+            cookies = json.loads(fernet.decrypt(f.read()))
+    except (InvalidToken, ValueError) as e:
+        logger.warning("Ignoring unreadable saved session at %s: %s", path, str(e) or e.__class__.__name__)
+        return False
+
+    for c in cookies:
+        session.cookies.set(
+            c["name"], c["value"],
+            domain=c["domain"], path=c["path"],
+            expires=c["expires"], secure=c["secure"], rest=c["rest"]
+        )
+    return len(cookies) > 0
+
+
+def clear_cookies(path: str):
+    if os.path.exists(path):
+        os.remove(path)
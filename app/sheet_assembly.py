@@ -0,0 +1,129 @@
+"""
+Copy-free assembly of the per-location order sheets.
+
+Which input column feeds each output column is resolved once into a
+ColumnPlan, cached per input column set. Each sheet is then materialised by
+a single ``reindex(columns=..., fill_value=...)`` instead of copying the
+merged frame, adding placeholder columns one at a time and selecting the
+result. The order-formula columns are computed by ``order_columns`` as one
+mapping, so the merged frame gets them in a single ``assign``.
+"""
+from functools import lru_cache
+import pandas as pd
+
+MERGE_KEY = "_merge_key"
+STOCK_QTY = "_stock_qty"
+
+# reindex label for output columns no input feeds; never a real column name
+_FILL = "\0fill"
+
+
+class ColumnPlan:
+    """Output column order and the input column feeding each one (None: filled)."""
+
+    def __init__(self, output_columns, sources):
+        self.output_columns = tuple(output_columns)
+        self.sources = tuple(sources)
+
+    @property
+    def missing(self) -> list:
+        return [out for out, src in zip(self.output_columns, self.sources) if src is None]
+
+    def __repr__(self):
+        return f"ColumnPlan({len(self.output_columns)} columns, {len(self.missing)} filled)"
+
+
+@lru_cache(maxsize=64)
+def _plan(input_columns: tuple, output_columns: tuple, aliases: tuple) -> ColumnPlan:
+    present = set(input_columns)
+    sources = []
+    for col in output_columns:
+        if col in present:
+            sources.append(col)
+        else:
+            sources.append(next((orig for orig, std in aliases if std == col and orig in present), None))
+    return ColumnPlan(output_columns, sources)
+
+
+def plan_columns(input_columns, output_columns, aliases: dict = None) -> ColumnPlan:
+    """
+    Resolves ``output_columns`` against the columns of an input frame.
+
+    ``aliases`` maps input names to output names (e.g. ``"Brand"`` →
+    ``"Brand Name"``); an output column missing from the input is fed by
+    the first present alias, in map order. Plans are cached per
+    (input columns, output columns, aliases), so every location sheet with
+    the same columns reuses one.
+    """
+    return _plan(tuple(input_columns), tuple(output_columns), tuple((aliases or {}).items()))
+
+
+def assemble(frame: pd.DataFrame, plan: ColumnPlan, fill_value="") -> pd.DataFrame:
+    """
+    Builds the output frame of ``plan`` from ``frame`` in one reindex:
+    columns selected, aliased and ordered, with ``fill_value`` in the
+    columns no input feeds.
+    """
+    labels = [src if src is not None else _FILL for src in plan.sources]
+    out = frame.reindex(columns=labels, fill_value=fill_value)
+    out.columns = list(plan.output_columns)
+    return out
+
+
+def order_columns(frame: pd.DataFrame, coverage_days: int, sales_col: str,
+                  on_order_col: str = None, case_col: str = None,
+                  stock_col: str = "In Stock Qty", forecast_col: str = "Forecast per Day"):
+    """
+    The order-formula columns of a merged location sheet, as
+    ``(columns, daily_demand)`` with ``columns`` ready for one ``assign``:
+
+    - the inputs used, made numeric (missing sales, stock and on order as
+      0, case sizes as 1)
+    - ``Projected Need``: daily demand × ``coverage_days``, the demand being
+      ``forecast_col`` where the ETL forecast one and ``sales_col``
+      otherwise
+    - with a ``stock_col``: ``Current Inventory`` (stock + on order),
+      ``Units Needed``, ``Cases Needed`` (to 1 decimal place) and
+      ``Order Qty``, plus an ``On Order`` placeholder of 0 without
+      ``on_order_col`` and a ``Case Size`` placeholder of 1 without
+      ``case_col``
+    """
+    sales = pd.to_numeric(frame[sales_col], errors="coerce").fillna(0)
+    demand = sales
+    if forecast_col in frame.columns:
+        demand = pd.to_numeric(frame[forecast_col], errors="coerce").fillna(sales)
+    columns = {sales_col: sales, "Projected Need": demand * coverage_days}
+    if stock_col not in frame.columns:
+        return columns, demand
+
+    stock = pd.to_numeric(frame[stock_col], errors="coerce").fillna(0)
+    columns[stock_col] = stock
+    if on_order_col is not None:
+        on_order = pd.to_numeric(frame[on_order_col], errors="coerce").fillna(0)
+        columns[on_order_col] = on_order
+        current = stock + on_order
+    else:
+        current = stock
+        columns["On Order"] = 0
+    if case_col is not None:
+        case_size = columns[case_col] = pd.to_numeric(frame[case_col], errors="coerce").fillna(1)
+    else:
+        case_size = columns["Case Size"] = 1
+    units = (columns["Projected Need"] - current).clip(lower=0)
+    cases = (units / case_size).round(1)
+    columns.update({
+        "Current Inventory": current,
+        "Units Needed":      units,
+        "Cases Needed":      cases,
+        "Order Qty":         cases,
+    })
+    return columns, demand
+
+
+def etl_columns(columns, sku_col: str, stock_col: str) -> list:
+    """
+    The ETL columns merged into the catalogue: merge key and stock first,
+    then everything except the SKU and stock columns they were built from.
+    """
+    skip = {sku_col, stock_col, MERGE_KEY, STOCK_QTY}
+    return [MERGE_KEY, STOCK_QTY] + [col for col in columns if col not in skip]
@@ -0,0 +1,137 @@
+"""
+File-backed handle for the AGLC order-form template and a streaming,
+integrity-checked download into it.
+
+The template is never held in memory as one bytes blob: responses are
+written to disk chunk by chunk and consumers open (or memory-map) the file.
+"""
+import os
+import mmap
+import hashlib
+import tempfile
+import zipfile
+
+ZIP_LOCAL_HEADER = b"PK\x03\x04"
+REQUIRED_PARTS = ("[Content_Types].xml", "xl/workbook.xml")
+CHUNK_SIZE = 1 << 16
+
+
+class _FileMap(mmap.mmap):
+    """An mmap that reports ``seekable()`` (missing before Python 3.13) so zipfile accepts it."""
+
+    def seekable(self):
+        return True
+
+
+class TemplateFile:
+    """A validated template on disk, identified by its SHA-256."""
+
+    def __init__(self, path: str, sha256: str = None, size: int = None):
+        self.path = path
+        self.size = size if size is not None else os.path.getsize(path)
+        self.sha256 = sha256 or file_sha256(path)
+
+    def open(self):
+        """A fresh binary file object positioned at the start."""
+        return open(self.path, "rb")
+
+    def mmap(self) -> mmap.mmap:
+        """A read-only memory map of the whole file (close it when done)."""
+        return map_file(self.path)
+
+    def head(self, n: int = 200) -> bytes:
+        with self.open() as f:
+            return f.read(n)
+
+    def __repr__(self):
+        return f"TemplateFile({self.path!r}, size={self.size}, sha256={self.sha256[:12]}…)"
+
+
+class NotATemplateError(RuntimeError):
+    """The response body is not a zip-based Office file (e.g. an HTML page)."""
+
+    def __init__(self, message: str, head: bytes):
+        super().__init__(message)
+        self.head = head
+
+
+def map_file(path: str) -> mmap.mmap:
+    """A read-only, seekable memory map of ``path`` (close it when done)."""
+    with open(path, "rb") as f:
+        return _FileMap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def file_sha256(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def validate_zip_structure(path: str):
+    """
+    Checks the end-of-central-directory record and the workbook parts by
+    reading the zip directory only; nothing is decompressed.
+    """
+    try:
+        with zipfile.ZipFile(path) as zf:
+            names = set(zf.namelist())
+    except zipfile.BadZipFile as e:
+        raise RuntimeError(f"Downloaded template is not a complete zip archive: {str(e)}")
+    missing = [part for part in REQUIRED_PARTS if part not in names]
+    if missing:
+        raise RuntimeError(f"Downloaded template is missing workbook parts: {missing}")
+
+
+def stream_to_file(resp, dest_path: str, max_error_body: int = 1 << 20) -> TemplateFile:
+    """
+    Writes a ``stream=True`` response to ``dest_path`` atomically.
+
+    The first chunk must carry a zip local-file signature, otherwise the
+    download stops early and ``NotATemplateError`` carries the start of the
+    body (up to ``max_error_body`` bytes) for diagnostics. The byte count is
+    checked against Content-Length, a SHA-256 is computed while writing, and
+    the zip directory is validated before the temporary file is renamed over
+    ``dest_path``.
+    """
+    directory = os.path.dirname(os.path.abspath(dest_path))
+    os.makedirs(directory, exist_ok=True)
+
+    # Content-Length counts encoded bytes; iter_content yields decoded ones
+    expected = None
+    if "Content-Length" in resp.headers and not resp.headers.get("Content-Encoding"):
+        expected = int(resp.headers["Content-Length"])
+
+    hasher = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            chunks = resp.iter_content(chunk_size=CHUNK_SIZE)
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                if size == 0 and not chunk.startswith(ZIP_LOCAL_HEADER):
+                    head = chunk
+                    for more in chunks:
+                        if len(head) >= max_error_body:
+                            break
+                        head += more
+                    raise NotATemplateError("Download did not return a zip-based Office file", head)
+                f.write(chunk)
+                hasher.update(chunk)
+                size += len(chunk)
+
+        if expected is not None and size != expected:
+            raise RuntimeError(f"Template download truncated: got {size} of {expected} bytes")
+        validate_zip_structure(tmp_path)
+        os.replace(tmp_path, dest_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        resp.close()
+
+    return TemplateFile(dest_path, sha256=hasher.hexdigest(), size=size)
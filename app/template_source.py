@@ -0,0 +1,56 @@
+"""
+Acquisition of the blank AGLC order-form template.
+
+Runs without any Streamlit calls so it can execute on a worker thread next
+to the Cova ETL; status messages are collected and rendered by the caller
+once both tasks have been joined.
+"""
+import os
+from download_order_form import download_order_form
+from app.check_excel import check_excel_file
+from template_file import TemplateFile
+
+TEMPLATE_FILENAME = "CannabisRetailersManualOrderForm.xlsm"
+
+
+def acquire_order_form(project_root: str) -> dict:
+    """
+    Downloads the template, falling back to a validated local copy in the
+    project root.
+
+    Returns a dict with:
+      - ``template``: a file-backed TemplateFile, or None when neither
+        source worked and the user has to supply the file manually
+      - ``source``: "download", "local" or None
+      - ``messages``: list of ``(streamlit_level, text)`` to display
+      - ``error``: an exception to re-raise (a local file that is not a
+        valid workbook), else None
+    """
+    result = {"template": None, "source": None, "messages": [], "error": None}
+    messages = result["messages"]
+
+    try:
+        result["template"] = download_order_form()
+        result["source"] = "download"
+        messages.append(("info", "🔄 Downloaded blank order-form template"))
+        return result
+    except Exception as e:
+        messages.append(("warning", f"⚠️ Automatic download failed: {str(e)}"))
+
+    # Check if we have a local copy of the file
+    local_path = os.path.join(project_root, TEMPLATE_FILENAME)
+    if not os.path.exists(local_path):
+        return result
+
+    # Verify file is valid Excel
+    try:
+        if not check_excel_file(local_path):
+            messages.append(("warning", f"Local file at {local_path} doesn't appear to be a valid Excel file. It may be HTML instead."))
+            raise ValueError("Invalid Excel file")
+        messages.append(("info", "Using locally stored template file instead"))
+        result["template"] = TemplateFile(local_path)
+        result["source"] = "local"
+    except Exception as e:
+        messages.append(("warning", f"Error validating local file: {str(e)}"))
+        result["error"] = e
+    return result
@@ -0,0 +1,135 @@
+"""
+What-if evaluation of the order formula over many receiving dates and
+coverage buffers at once.
+
+main.py orders ``daily demand × (days until receiving + buffer) −
+(In Stock + On Order)`` units, divided by case size, for one receiving date
+and a 14-day buffer. ``order_scenarios`` broadcasts the same formula over a
+(receiving date × buffer × item) grid in one NumPy expression and keeps the
+result as a compact float32 cube, so scenarios can be compared without
+rerunning the ETL or rebuilding the order form.
+
+Each scenario's units then go through ``optimize_orders`` with the limits
+of the order sheets, so its Order Qty is in whole cases within the shelf,
+AGLC supply and budget limits, like the sheets' own.
+"""
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+
+from order_optimizer import LIMIT_AVAILABLE, LIMIT_BUDGET, LIMIT_SHELF, optimize_orders
+
+BUFFER_DAYS = (7, 14, 21, 28)
+DEFAULT_BUFFER = 14
+# receiving dates evaluated around the one picked in the app
+RECEIVING_OFFSETS = range(-7, 8)
+# ``ScenarioCube.limited`` holds positions in this tuple
+LIMITS = ("", LIMIT_SHELF, LIMIT_AVAILABLE, LIMIT_BUDGET)
+
+
+class ScenarioCube:
+    """
+    Units needed per (receiving date, buffer, item).
+
+    ``items`` is a frame describing the items (e.g. AGLC SKU and Location),
+    ``units`` a float32 array of shape (dates, buffers, items) and
+    ``case_size`` the case size of each item. ``order_qty`` (int32) and
+    ``limited`` (int8 positions in ``LIMITS``) have the shape of ``units``
+    and hold each scenario's whole-case order and the limit that cut it.
+    """
+
+    def __init__(self, items: pd.DataFrame, receiving_dates: list, buffers: list,
+                 days_until: np.ndarray, units: np.ndarray, case_size: np.ndarray,
+                 order_qty: np.ndarray, limited: np.ndarray):
+        self.items = items
+        self.receiving_dates = list(receiving_dates)
+        self.buffers = list(buffers)
+        self.days_until = days_until
+        self.units = units
+        self.case_size = case_size
+        self.order_qty = order_qty
+        self.limited = limited
+
+    @property
+    def cases(self) -> np.ndarray:
+        """Cases needed (to 1 decimal place, like the order sheets), same shape as ``units``."""
+        return np.round(self.units / self.case_size, 1)
+
+    def _position(self, receiving_date, buffer: int):
+        return self.receiving_dates.index(receiving_date), self.buffers.index(buffer)
+
+    def scenario(self, receiving_date, buffer: int = DEFAULT_BUFFER) -> pd.DataFrame:
+        """The items with their Units Needed, Cases Needed and Order Qty in one scenario."""
+        i, j = self._position(receiving_date, buffer)
+        frame = self.items.copy()
+        frame["Coverage Period"] = int(self.days_until[i] + buffer)
+        frame["Units Needed"] = self.units[i, j]
+        frame["Cases Needed"] = self.cases[i, j]
+        frame["Order Qty"] = self.order_qty[i, j]
+        frame["Order Limited By"] = np.asarray(LIMITS, dtype=object)[self.limited[i, j]]
+        return frame
+
+    def summary(self) -> pd.DataFrame:
+        """One row per scenario with its total units, cases, ordered cases and SKUs to order."""
+        cases = self.cases
+        grid_dates, grid_buffers = np.meshgrid(np.arange(len(self.receiving_dates)),
+                                               np.arange(len(self.buffers)), indexing="ij")
+        return pd.DataFrame({
+            "Receiving Date":  [self.receiving_dates[i] for i in grid_dates.ravel()],
+            "Buffer Days":     [self.buffers[j] for j in grid_buffers.ravel()],
+            "Coverage Period": (self.days_until[:, None] + np.asarray(self.buffers)[None, :]).ravel(),
+            "Units Needed":    self.units.sum(axis=2, dtype=np.float64).ravel().round(1),
+            "Cases Needed":    cases.sum(axis=2, dtype=np.float64).ravel().round(1),
+            "Order Qty":       self.order_qty.sum(axis=2, dtype=np.int64).ravel(),
+            "SKUs to Order":   (self.order_qty > 0).sum(axis=2).ravel(),
+            "Lines Limited":   (self.limited > 0).sum(axis=2).ravel(),
+        })
+
+
+def order_scenarios(items: pd.DataFrame, daily_demand, current_inventory, case_size,
+                    receiving_dates, buffers=BUFFER_DAYS, today: date = None,
+                    sku_col: str = "AGLC SKU", location_col: str = "Location",
+                    **limits) -> ScenarioCube:
+    """
+    Evaluates the order formula for every combination of ``receiving_dates``
+    and ``buffers`` (days of cover after receiving) for all rows of
+    ``items`` at once.
+
+    ``daily_demand``, ``current_inventory`` (In Stock + On Order) and
+    ``case_size`` are per-item sequences; missing demand and inventory
+    count as 0 and missing or non-positive case sizes as 1. ``limits``
+    (``unit_cost``, ``available_cases``, ``budget``, ``shelf_units``, ...)
+    are passed to ``optimize_orders`` for every scenario, with the SKU and
+    location of each item read from ``items[sku_col]`` and
+    ``items[location_col]``.
+    """
+    today = today or date.today()
+    receiving_dates = list(receiving_dates)
+    days_until = np.array([(d - today).days for d in receiving_dates], dtype=np.float32)
+    coverage = days_until[:, None] + np.asarray(buffers, dtype=np.float32)[None, :]
+
+    demand = np.nan_to_num(np.asarray(daily_demand, dtype=np.float32))
+    current = np.nan_to_num(np.asarray(current_inventory, dtype=np.float32))
+    cases = np.asarray(case_size, dtype=np.float32)
+    cases = np.where(np.isfinite(cases) & (cases > 0), cases, np.float32(1))
+
+    units = np.clip(demand[None, None, :] * coverage[:, :, None] - current[None, None, :], 0, None)
+
+    # the supply and budget limits share out what every line of a scenario
+    # asks for, so each scenario is allocated on its own
+    order_qty = np.zeros(units.shape, dtype=np.int32)
+    limited = np.zeros(units.shape, dtype=np.int8)
+    limit_codes = {name: code for code, name in enumerate(LIMITS)}
+    for i, j in np.ndindex(units.shape[:2]):
+        orders = optimize_orders(units[i, j], cases, items[location_col].to_numpy(),
+                                 items[sku_col].to_numpy(), current_inventory=current, **limits)
+        order_qty[i, j] = orders["Order Qty"].to_numpy()
+        limited[i, j] = orders["Order Limited By"].map(limit_codes).to_numpy()
+    return ScenarioCube(items.reset_index(drop=True), receiving_dates, buffers,
+                        days_until.astype(int), units, cases, order_qty, limited)
+
+
+def receiving_date_grid(receiving_date: date, today: date = None) -> list:
+    """The receiving dates around ``receiving_date`` (from today on) to compare."""
+    today = today or date.today()
+    return [d for d in (receiving_date + timedelta(days=k) for k in RECEIVING_OFFSETS) if d >= today]
@@ -0,0 +1,515 @@
+"""
+Minimal .xlsx / .xlsm reading straight from the zip container.
+
+Only the parts that are asked for are touched: ``xl/workbook.xml`` and its
+relationships for the sheet list, one ``xl/worksheets/sheetN.xml`` parsed
+incrementally with ``iterparse``, and as much of ``xl/sharedStrings.xml``
+as the cells read so far refer to. The VBA project and every other sheet
+are never decompressed.
+
+``read_sheet`` is the one entry point for loading a sheet into a DataFrame
+(the order-form catalogue, the ETL output, the diagnostic scripts). It runs
+on the fastest installed backend: ``calamine`` (the optional
+``python-calamine`` package) when available, else the ``iterparse`` reader
+in this module. Set ``XLSX_READER_BACKEND`` to force one by name.
+"""
+import os
+import re
+import io
+import zipfile
+import posixpath
+from itertools import islice
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from xml.etree.ElementTree import iterparse, parse
+
+import pandas as pd
+
+from template_file import file_sha256, map_file
+
+try:
+    from python_calamine import CalamineWorkbook
+except ImportError:  # optional dependency: the iterparse backend is always there
+    CalamineWorkbook = None
+
+NS_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+NS_DOC_REL = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+NS_PKG_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+_ROW = f"{NS_MAIN}row"
+_CELL = f"{NS_MAIN}c"
+_VALUE = f"{NS_MAIN}v"
+_TEXT = f"{NS_MAIN}t"
+
+CATALOGUE_SHEETS = ("Catalogue", "Catalog")
+REQUIRED_HEADERS = ("AGLC SKU", "EachesPerCase")
+
+# built-in number formats that display a date and/or time
+BUILTIN_DATE_FORMATS = frozenset(range(14, 23)) | {45, 46, 47}
+EXCEL_EPOCH = datetime(1899, 12, 30)
+
+# backend names installed here, fastest first
+BACKENDS = (["calamine"] if CalamineWorkbook is not None else []) + ["iterparse"]
+
+
+def workbook_sheets(zf: zipfile.ZipFile) -> dict:
+    """Maps sheet name → worksheet part path, in workbook order."""
+    with zf.open("xl/workbook.xml") as f:
+        workbook = parse(f).getroot()
+    with zf.open("xl/_rels/workbook.xml.rels") as f:
+        rels = parse(f).getroot()
+
+    targets = {}
+    for rel in rels.iter(f"{NS_PKG_REL}Relationship"):
+        target = rel.get("Target")
+        if target.startswith("/"):
+            target = target.lstrip("/")
+        else:
+            target = posixpath.normpath(posixpath.join("xl", target))
+        targets[rel.get("Id")] = target
+
+    return {
+        sheet.get("name"): targets.get(sheet.get(f"{NS_DOC_REL}id"))
+        for sheet in workbook.iter(f"{NS_MAIN}sheet")
+    }
+
+
+def _is_date_format(code: str) -> bool:
+    # ignore quoted literals, escaped characters and [colour] / [$-locale] sections
+    code = re.sub(r'"[^"]*"|\\.|\[[^\]]*\]', "", code).lower()
+    return any(ch in code for ch in "dmyhs")
+
+
+def date_styles(zf: zipfile.ZipFile) -> frozenset:
+    """Indices of the cell styles (``s`` attribute) whose number format is a date or time."""
+    if "xl/styles.xml" not in zf.namelist():
+        return frozenset()
+    with zf.open("xl/styles.xml") as f:
+        styles = parse(f).getroot()
+
+    custom = {
+        int(fmt.get("numFmtId")): fmt.get("formatCode", "")
+        for fmt in styles.iter(f"{NS_MAIN}numFmt")
+    }
+    cell_xfs = styles.find(f"{NS_MAIN}cellXfs")
+    if cell_xfs is None:
+        return frozenset()
+    dates = set()
+    for i, xf in enumerate(cell_xfs.findall(f"{NS_MAIN}xf")):
+        fmt_id = int(xf.get("numFmtId", 0))
+        if fmt_id in BUILTIN_DATE_FORMATS or _is_date_format(custom.get(fmt_id, "")):
+            dates.add(i)
+    return frozenset(dates)
+
+
+class SharedStrings:
+    """
+    ``xl/sharedStrings.xml`` parsed on demand: indexing entry ``i`` only
+    parses the table up to ``i``.
+    """
+
+    def __init__(self, zf: zipfile.ZipFile):
+        self._strings = []
+        self._events = None
+        self._file = None
+        if "xl/sharedStrings.xml" in zf.namelist():
+            self._file = zf.open("xl/sharedStrings.xml")
+            self._events = iterparse(self._file, events=("end",))
+
+    def close(self):
+        self._events = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __getitem__(self, index: int) -> str:
+        while index >= len(self._strings) and self._events is not None:
+            self._parse_next()
+        return self._strings[index]
+
+    def _parse_next(self):
+        for _, elem in self._events:
+            if elem.tag == f"{NS_MAIN}si":
+                # plain <t> or rich-text runs <r><t>; phonetic <rPh> is skipped
+                parts = []
+                for child in elem:
+                    if child.tag == f"{NS_MAIN}t":
+                        parts.append(child.text or "")
+                    elif child.tag == f"{NS_MAIN}r":
+                        t = child.find(f"{NS_MAIN}t")
+                        if t is not None:
+                            parts.append(t.text or "")
+                self._strings.append("".join(parts))
+                elem.clear()
+                return
+        self._events = None
+
+
+_column_indices = {}
+
+
+def column_index(ref: str) -> int:
+    """0-based column of a cell reference such as ``"AB12"``."""
+    letters = ref.rstrip("0123456789")
+    index = _column_indices.get(letters)
+    if index is None:
+        n = 0
+        for ch in letters.upper():
+            n = n * 26 + (ord(ch) - 64)
+        index = _column_indices[letters] = n - 1
+    return index
+
+
+def _cell_value(cell, shared_strings, dates=frozenset()):
+    # empty strings read as empty cells, as calamine and read_excel give them
+    kind = cell.get("t")
+    if kind == "inlineStr":
+        return "".join(t.text or "" for t in cell.iter(_TEXT)) or None
+    v = cell.find(_VALUE)
+    if v is None or v.text is None:
+        return None
+    if kind == "s":
+        return shared_strings[int(v.text)] or None
+    if kind in ("str", "e"):
+        return v.text
+    if kind == "b":
+        return v.text == "1"
+    if kind == "d":
+        return datetime.fromisoformat(v.text)
+    number = float(v.text)
+    if dates and cell.get("s") is not None and int(cell.get("s")) in dates:
+        # serials carry float noise; Excel itself resolves to the millisecond
+        return EXCEL_EPOCH + timedelta(milliseconds=round(number * 86_400_000))
+    return int(number) if number.is_integer() else number
+
+
+def iter_rows(zf: zipfile.ZipFile, part: str, shared_strings: SharedStrings = None,
+              max_rows: int = None, dates=frozenset()):
+    """
+    Yields ``(row_number, values)`` for the non-empty rows of a worksheet
+    part, with ``values`` a dense list up to the last filled column. Stops
+    reading the part after worksheet row ``max_rows``. Numbers in the
+    ``dates`` cell styles (see ``date_styles``) come back as datetimes.
+    """
+    if shared_strings is None:
+        shared_strings = SharedStrings(zf)
+    with zf.open(part) as f:
+        count = 0
+        for _, elem in iterparse(f, events=("end",)):
+            if elem.tag != _ROW:
+                continue
+            values = []
+            for cell in elem:
+                if cell.tag != _CELL:
+                    continue
+                ref = cell.get("r")
+                col = column_index(ref) if ref else len(values)
+                if col >= len(values):
+                    values.extend([None] * (col + 1 - len(values)))
+                values[col] = _cell_value(cell, shared_strings, dates)
+            row_number = int(elem.get("r", count + 1))
+            elem.clear()
+            if any(value is not None for value in values):
+                yield row_number, values
+            count = row_number
+            if max_rows is not None and row_number >= max_rows:
+                return
+
+
+def find_header_row(rows, required_headers=REQUIRED_HEADERS, max_row: int = None):
+    """
+    First ``(row_number, values)`` containing any of ``required_headers``
+    (case-insensitive); returns ``(None, None)`` if there is none up to
+    worksheet row ``max_row``. ``rows`` is consumed only up to the header,
+    so an iterator can go on to yield the data rows.
+    """
+    wanted = {h.lower() for h in required_headers}
+    for row_number, values in rows:
+        if max_row is not None and row_number > max_row:
+            break
+        cells = {str(v).strip().lower() for v in values if v is not None}
+        if cells & wanted:
+            return row_number, values
+    return None, None
+
+
+_verdicts = {}
+_VERDICT_CACHE_SIZE = 32
+
+
+def quick_check(path: str, sha256: str = None,
+                sheet_names=CATALOGUE_SHEETS,
+                required_headers=REQUIRED_HEADERS,
+                max_header_rows: int = 20) -> dict:
+    """
+    Validates an order-form template in milliseconds by reading only the zip
+    directory, the workbook part and the first rows of the catalogue sheet.
+
+    Returns a verdict dict: ``valid`` (a readable workbook), ``usable``
+    (catalogue sheet and all ``required_headers`` found), ``sheet``,
+    ``sheets``, ``header_row``, ``missing_headers`` and ``error``. Verdicts
+    are cached by the file's SHA-256 (pass ``sha256`` if already known).
+    """
+    key = (sha256 or file_sha256(path), tuple(sheet_names), tuple(required_headers))
+    if key in _verdicts:
+        return _verdicts[key]
+
+    verdict = {
+        "valid": False, "usable": False, "sheet": None, "sheets": [],
+        "header_row": None, "missing_headers": list(required_headers), "error": None
+    }
+    try:
+        with zipfile.ZipFile(path) as zf:
+            sheets = workbook_sheets(zf)
+            verdict["sheets"] = list(sheets)
+            verdict["valid"] = True
+            sheet = next((name for name in sheet_names if name in sheets), None)
+            verdict["sheet"] = sheet
+            if sheet is not None:
+                shared_strings = SharedStrings(zf)
+                try:
+                    rows = iter_rows(zf, sheets[sheet], shared_strings, max_rows=max_header_rows)
+                    header_row, header = find_header_row(rows, required_headers)
+                finally:
+                    shared_strings.close()
+                if header_row is not None:
+                    present = {str(v).strip().lower() for v in header if v is not None}
+                    verdict["header_row"] = header_row
+                    verdict["missing_headers"] = [
+                        h for h in required_headers if h.lower() not in present
+                    ]
+                verdict["usable"] = header_row is not None and not verdict["missing_headers"]
+    except (zipfile.BadZipFile, KeyError, OSError, SyntaxError, ValueError) as e:
+        verdict["error"] = f"{e.__class__.__name__}: {str(e)}"
+
+    if len(_verdicts) >= _VERDICT_CACHE_SIZE:
+        _verdicts.pop(next(iter(_verdicts)))
+    _verdicts[key] = verdict
+    return verdict
+
+
+def _column_names(header) -> list:
+    """Header cells as pandas would name them: blanks become ``Unnamed: i``, repeats get ``.1``, ``.2``."""
+    names, seen = [], {}
+    for i, value in enumerate(header):
+        name = f"Unnamed: {i}" if value is None or str(value).strip() == "" else value
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def _numeric_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Object columns holding only numbers and blank text become numeric (the
+    blanks NaN), so every backend returns the dtypes calamine and the old
+    openpyxl path gave. Columns with any real text are left alone.
+    """
+    for i in range(df.shape[1]):
+        s = df.iloc[:, i]
+        if s.dtype != object:
+            continue
+        is_text = s.map(lambda v: isinstance(v, str))
+        if s[is_text].str.strip().ne("").any():
+            continue
+        numbers = s[~is_text].dropna()
+        if numbers.empty or pd.api.types.infer_dtype(numbers) not in ("integer", "floating", "mixed-integer-float"):
+            continue
+        df.isetitem(i, pd.to_numeric(s.mask(is_text)))
+    return df
+
+
+def frame_from_rows(header, rows) -> pd.DataFrame:
+    """
+    DataFrame from a header row and the ``(row_number, values)`` pairs below
+    it. With ``header=None`` the columns are numbered like ``header=None`` in
+    ``pd.read_excel``.
+    """
+    data = [values for _, values in rows]
+    width = max([len(header or [])] + [len(values) for values in data])
+    for values in data:
+        if len(values) < width:
+            values.extend([None] * (width - len(values)))
+    if header is None:
+        return _numeric_columns(pd.DataFrame(data, columns=range(width)))
+    header = list(header) + [None] * (width - len(header))
+    return _numeric_columns(pd.DataFrame(data, columns=_column_names(header)))
+
+
+# ── Backends ─────────────────────────────────────────────────────────────
+# Each opens a workbook source and exposes ``sheet_names`` and
+# ``rows(sheet)``, yielding ``(row_number, values)`` for non-empty rows.
+
+class _IterparseBook:
+    def __init__(self, source):
+        self._zf = zipfile.ZipFile(source)
+        self._sheets = workbook_sheets(self._zf)
+        self._shared_strings = SharedStrings(self._zf)
+        self._dates = None
+        self.sheet_names = list(self._sheets)
+
+    def rows(self, sheet: str):
+        if self._dates is None:
+            self._dates = date_styles(self._zf)
+        return iter_rows(self._zf, self._sheets[sheet], self._shared_strings,
+                         dates=self._dates)
+
+    def close(self):
+        self._shared_strings.close()
+        self._zf.close()
+
+
+class _CalamineBook:
+    def __init__(self, source):
+        if isinstance(source, str):
+            self._wb = CalamineWorkbook.from_path(source)
+        else:
+            self._wb = CalamineWorkbook.from_filelike(source)
+        self.sheet_names = list(self._wb.sheet_names)
+
+    def rows(self, sheet: str):
+        values = self._wb.get_sheet_by_name(sheet).to_python(skip_empty_area=False)
+        for i, row in enumerate(values, start=1):
+            row = [_calamine_value(v) for v in row]
+            while row and row[-1] is None:
+                row.pop()
+            if row:
+                yield i, row
+
+    def close(self):
+        self._wb.close()
+
+
+def _calamine_value(value):
+    # match the iterparse backend: empty → None, whole floats → int, dates → datetime
+    if value == "":
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, date) and not isinstance(value, datetime):
+        return datetime(value.year, value.month, value.day)
+    return value
+
+
+_BOOKS = {"calamine": _CalamineBook, "iterparse": _IterparseBook}
+
+
+def get_backend(name: str = None) -> str:
+    """
+    Returns a backend name. ``name`` (or the ``XLSX_READER_BACKEND``
+    environment variable) picks a specific one; otherwise the fastest
+    installed backend is used.
+    """
+    name = name or os.getenv("XLSX_READER_BACKEND") or "auto"
+    if name == "auto":
+        return BACKENDS[0]
+    if name not in BACKENDS:
+        raise ValueError(f"xlsx backend '{name}' is not installed. Available: {BACKENDS}")
+    return name
+
+
+@contextmanager
+def open_workbook(path_or_bytes, backend: str = None):
+    """
+    Opens a workbook from a path, a TemplateFile, bytes or a binary file
+    object. Paths and TemplateFiles are memory-mapped for the iterparse
+    backend, so the file is never copied into memory.
+    """
+    backend = get_backend(backend)
+    mapped = None
+    if hasattr(path_or_bytes, "mmap"):  # TemplateFile
+        path_or_bytes = path_or_bytes.path
+    if isinstance(path_or_bytes, os.PathLike):
+        path_or_bytes = os.fspath(path_or_bytes)
+
+    if isinstance(path_or_bytes, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(path_or_bytes)
+    elif isinstance(path_or_bytes, str) and backend == "iterparse":
+        source = mapped = map_file(path_or_bytes)
+    else:
+        source = path_or_bytes
+
+    book = None
+    try:
+        book = _BOOKS[backend](source)
+        yield book
+    finally:
+        if book is not None:
+            book.close()
+        if mapped is not None:
+            mapped.close()
+
+
+def list_sheets(path_or_bytes, backend: str = None) -> list:
+    """Sheet names of a workbook, in workbook order."""
+    with open_workbook(path_or_bytes, backend) as book:
+        return book.sheet_names
+
+
+def _read_frame(book, sheet, header_detect, required_headers, max_header_rows,
+                nrows, raw) -> pd.DataFrame:
+    rows = book.rows(sheet)
+    if raw:
+        header_row, header = None, None
+    elif header_detect:
+        header_row, header = find_header_row(rows, required_headers, max_header_rows)
+        if header_row is None:
+            raise ValueError(
+                f"No header row with {list(required_headers)} in the first "
+                f"{max_header_rows} rows of '{sheet}'"
+            )
+    else:
+        header_row, header = next(rows, (None, []))
+    if nrows is not None:
+        rows = islice(rows, nrows)
+    df = frame_from_rows(header, rows)
+    df.attrs["sheet"] = sheet
+    df.attrs["header_row"] = header_row
+    return df
+
+
+def read_sheets(path_or_bytes, sheets=None, header_detect: bool = True,
+                required_headers=REQUIRED_HEADERS, max_header_rows: int = 20,
+                nrows: int = None, raw: bool = False, backend: str = None) -> dict:
+    """
+    ``read_sheet`` for several sheets of one workbook (all of them when
+    ``sheets`` is None), opening it and its shared strings once. Returns
+    ``{sheet_name: DataFrame}`` in workbook order.
+    """
+    with open_workbook(path_or_bytes, backend) as book:
+        names = book.sheet_names if sheets is None else [s for s in book.sheet_names if s in sheets]
+        return {
+            name: _read_frame(book, name, header_detect, required_headers,
+                              max_header_rows, nrows, raw)
+            for name in names
+        }
+
+
+def read_sheet(path_or_bytes, sheet, header_detect: bool = True,
+               required_headers=REQUIRED_HEADERS, max_header_rows: int = 20,
+               nrows: int = None, raw: bool = False, backend: str = None) -> pd.DataFrame:
+    """
+    Loads one sheet into a DataFrame.
+
+    ``sheet`` is a name or a sequence of candidate names, the first one
+    present being read (e.g. ``CATALOGUE_SHEETS``). With ``header_detect``
+    the header is the first of the top ``max_header_rows`` rows naming any
+    of ``required_headers`` (ValueError if there is none); otherwise it is
+    the first non-empty row. ``raw=True`` reads without a header, columns
+    numbered from 0. ``nrows`` limits the data rows. Empty rows are skipped
+    and date-formatted cells come back as datetimes.
+
+    The sheet actually read and its 1-based header row are in
+    ``df.attrs["sheet"]`` and ``df.attrs["header_row"]``. Raises KeyError
+    when the workbook has none of the requested sheets.
+    """
+    candidates = [sheet] if isinstance(sheet, str) else list(sheet)
+    with open_workbook(path_or_bytes, backend) as book:
+        name = next((s for s in candidates if s in book.sheet_names), None)
+        if name is None:
+            raise KeyError(f"None of {candidates} found. Available sheets: {book.sheet_names}")
+        return _read_frame(book, name, header_detect, required_headers,
+                           max_header_rows, nrows, raw)
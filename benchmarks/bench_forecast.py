@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the vectorized demand forecast in etl/forecast.py.
+
+Usage:
+    python benchmarks/bench_forecast.py [series] [days] [repeats]
+
+Builds synthetic daily demand with a weekly pattern and out-of-stock gaps
+for ``series`` SKU/location pairs, then times the pivot into a matrix and
+the fit of every series, and reports how far the fitted level is from the
+true mean demand.
+"""
+import os
+import sys
+import time
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+import numpy as np
+import pandas as pd
+from etl.forecast import series_matrix, fit
+
+
+def synthetic_demand(series: int, days: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    dates = pd.date_range(end=pd.Timestamp.today().normalize(), periods=days, freq="D")
+    base = rng.gamma(2.0, 1.5, size=series)
+    weekly = np.array([0.8, 0.8, 0.9, 1.0, 1.3, 1.4, 0.8])
+    mean = base[:, None] * weekly[dates.weekday.to_numpy()][None, :]
+    demand = rng.poisson(mean).astype(float)
+    demand[rng.random(demand.shape) < 0.1] = np.nan  # out of stock
+    sku, day = np.divmod(np.arange(series * days), days)
+    return pd.DataFrame({
+        "SKU":      sku % max(1, series // 3),
+        "Location": sku // max(1, series // 3),
+        "Date":     dates[day],
+        "Demand":   demand.ravel(),
+    }), base * weekly.mean()
+
+
+def best_of(func, repeats: int):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+if __name__ == "__main__":
+    n_series = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    n_days = int(sys.argv[2]) if len(sys.argv) > 2 else 90
+    repeats = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+
+    df, true_level = synthetic_demand(n_series, n_days)
+    print(f"{n_series} series × {n_days} days ({len(df)} rows)")
+
+    pivot_s, (series, days, values) = best_of(lambda: series_matrix(df, "Demand"), repeats)
+    fit_s, model = best_of(lambda: fit(values, days), repeats)
+    print(f"  pivot {pivot_s * 1000:8.1f} ms")
+    print(f"  fit   {fit_s * 1000:8.1f} ms")
+    error = np.abs(model.level - true_level).mean() / true_level.mean()
+    print(f"  mean absolute level error {error:.1%} of mean demand")
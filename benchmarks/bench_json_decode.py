@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of the report-body decoders in etl/report_json.py.
+
+Usage:
+    python benchmarks/bench_json_decode.py [payload_dir] [repeats]
+
+``payload_dir`` holds raw Cova report bodies, e.g. recorded by running the
+ETL with COVA_RECORD_DIR=<dir>. Without it a synthetic IOH-shaped payload is
+generated so the decoders can still be compared.
+"""
+import os
+import sys
+import glob
+import json
+import time
+import random
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from etl.report_json import DECODERS, frame_from_body
+
+
+def synthetic_payload(rows: int = 20000) -> bytes:
+    """A report body shaped like the historical IOH report."""
+    random.seed(0)
+    data = [
+        {
+            "SKU":          f"SKU-{i % 4000:05d}",
+            "Product":      f"Product name {i % 4000}",
+            "Location":     ["Store A", "Store B", "Store C"][i % 3],
+            "Supplier SKU": f"ABC-{i},CNB-{i:06d}",
+            "In Stock Qty": random.randint(0, 40),
+            "Unit Cost":    round(random.uniform(2, 60), 2),
+            "Classification": "Dried Flower"
+        }
+        for i in range(rows)
+    ]
+    return json.dumps([{"Data": data}]).encode("utf-8")
+
+
+def load_payloads(payload_dir: str) -> dict:
+    payloads = {}
+    for path in sorted(glob.glob(os.path.join(payload_dir, "*.json"))):
+        with open(path, "rb") as f:
+            payloads[os.path.basename(path)] = f.read()
+    return payloads
+
+
+def bench(loads, content: bytes, repeats: int):
+    """Best-of-``repeats`` seconds for decode alone and decode + DataFrame."""
+    decode_times, frame_times = [], []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        body = loads(content)
+        decoded = time.perf_counter()
+        frame_from_body(body)
+        done = time.perf_counter()
+        decode_times.append(decoded - start)
+        frame_times.append(done - start)
+    return min(decode_times), min(frame_times)
+
+
+if __name__ == "__main__":
+    payload_dir = sys.argv[1] if len(sys.argv) > 1 else None
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    payloads = load_payloads(payload_dir) if payload_dir else {}
+    if not payloads:
+        print("No recorded payloads given, using a synthetic 20,000-row IOH body")
+        payloads = {"synthetic_ioh.json": synthetic_payload()}
+
+    print(f"Decoders available: {list(DECODERS)}")
+    for name, content in payloads.items():
+        print(f"\n{name} ({len(content) / 1e6:.1f} MB)")
+        baseline = None
+        for decoder, loads in reversed(list(DECODERS.items())):  # stdlib json first
+            decode_s, frame_s = bench(loads, content, repeats)
+            baseline = baseline or decode_s
+            print(f"  {decoder:<6} decode {decode_s * 1000:8.1f} ms"
+                  f"   decode+frame {frame_s * 1000:8.1f} ms"
+                  f"   speedup x{baseline / decode_s:.2f}")
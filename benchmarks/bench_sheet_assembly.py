@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the per-location sheet loop: the copy / insert / add-column-
+by-column path main.py used to take against the one it takes now.
+
+Usage:
+    python benchmarks/bench_sheet_assembly.py [skus] [locations] [repeats]
+
+Both paths start from the same synthetic compact catalogue and ETL output
+and run everything main.py does per location between selecting its rows
+and writing its sheet: the merge, the order-formula columns (Projected
+Need, Current Inventory, Units Needed, Cases Needed, Order Qty) and the
+projection onto the order-sheet columns. They produce identical sheets.
+Reported per path: best wall time, peak traced memory (tracemalloc) and
+allocation counts, i.e. the DataFrame operations that materialise a new
+frame or column (copy, column selection, merge, setitem, insert, assign,
+reindex), counted at the outermost call.
+"""
+import os
+import sys
+import time
+import random
+import tracemalloc
+from collections import Counter
+from datetime import date, timedelta
+from functools import wraps
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+sys.path.insert(0, os.path.join(project_root, "app"))
+
+import pandas as pd
+from catalogue import compact_frame
+from sheet_assembly import MERGE_KEY, STOCK_QTY, etl_columns, order_columns
+from output_schema import COLUMN_ALIASES, LOCATION_SHEET, order_schema
+
+HIST_DAYS = 30
+RECEIVING_DATE = date.today() + timedelta(days=7)
+DAYS_TO_RECEIVING = (RECEIVING_DATE - date.today()).days
+COVERAGE_DAYS = DAYS_TO_RECEIVING + 14
+
+
+def synthetic_inputs(skus: int, locations: int):
+    random.seed(0)
+    catalogue = compact_frame(pd.DataFrame({
+        "AGLC SKU":        [f"CNB-{i:06d}" for i in range(skus)],
+        "Format":          [random.choice(["Dried Flower", "Pre-Roll", "Vape"]) for _ in range(skus)],
+        "Subcategory":     [random.choice(["Indica", "Sativa", "Hybrid"]) for _ in range(skus)],
+        "Brand Name":      [f"Brand {i % 200}" for i in range(skus)],
+        "SKU DESCRIPTION": [f"Product {i}" for i in range(skus)],
+        "Available Cases": [random.randint(0, 50) for _ in range(skus)],
+        "EachesPerCase":   [random.choice([6, 12, 24]) for _ in range(skus)],
+        "THC MIN":         [random.choice(["18%", "20%", "22%"]) for _ in range(skus)],
+    }))
+    catalogue[MERGE_KEY] = catalogue["AGLC SKU"]
+    rows = []
+    for loc in range(locations):
+        for i in random.sample(range(skus), skus // 2):
+            rows.append({
+                "SKU": f"SKU-{i}", "Product": f"Product {i}", "Location": f"Store {loc}",
+                "Supplier SKU": f"CNB-{i:06d}", "In Stock Qty": random.randint(0, 40),
+                "Sales per Day": round(random.random() * 3, 2),
+                "Forecast per Day": round(random.random() * 3, 2) if i % 4 else None,
+                "Week Net Sold": random.randint(0, 20), f"{HIST_DAYS}d Net Sold": random.randint(0, 90),
+                "Last In Stock Date": pd.Timestamp("2024-01-01") + pd.Timedelta(days=i % 30),
+            })
+    weekly = pd.DataFrame(rows)
+    weekly[MERGE_KEY] = weekly["Supplier SKU"]
+    weekly[STOCK_QTY] = weekly["In Stock Qty"]
+    return catalogue, weekly
+
+
+def _merge(catalogue, etl_extract):
+    return catalogue.merge(etl_extract, on=MERGE_KEY, how="left", suffixes=("", "_etl")) \
+        .assign(**{"In Stock Qty": lambda d: d[STOCK_QTY].fillna(0).astype(int)}) \
+        .drop(columns=[MERGE_KEY, STOCK_QTY])
+
+
+def previous_path(catalogue, weekly, location):
+    location_df = weekly[weekly["Location"] == location].copy()
+    location_df[MERGE_KEY] = location_df["Supplier SKU"]
+    location_df[STOCK_QTY] = location_df["In Stock Qty"]
+    columns = [MERGE_KEY, STOCK_QTY] + [
+        c for c in location_df.columns if c not in ("Supplier SKU", "In Stock Qty", MERGE_KEY, STOCK_QTY)]
+    merged = _merge(catalogue, location_df[columns].copy())
+
+    merged.insert(0, "Receiving Date", RECEIVING_DATE)
+    merged.insert(1, "Days Until Receiving", DAYS_TO_RECEIVING)
+    merged.insert(2, "Coverage Period", COVERAGE_DAYS)
+    merged["Sales per Day"] = pd.to_numeric(merged["Sales per Day"], errors="coerce").fillna(0)
+    daily_demand = pd.to_numeric(merged["Forecast per Day"], errors="coerce").fillna(merged["Sales per Day"])
+    merged["Projected Need"] = daily_demand * merged["Coverage Period"]
+    merged["In Stock Qty"] = pd.to_numeric(merged["In Stock Qty"], errors="coerce").fillna(0)
+    merged["Current Inventory"] = merged["In Stock Qty"]
+    merged["On Order"] = 0
+    merged["Units Needed"] = (merged["Projected Need"] - merged["Current Inventory"]).clip(lower=0)
+    merged["EachesPerCase"] = pd.to_numeric(merged["EachesPerCase"], errors="coerce").fillna(1)
+    merged["Cases Needed"] = (merged["Units Needed"] / merged["EachesPerCase"]).round(1)
+    merged["Order Qty"] = merged["Cases Needed"]
+
+    final = merged.copy()
+    for orig, std in COLUMN_ALIASES.items():
+        if orig in final.columns and std not in final.columns:
+            final[std] = final[orig]
+    output_columns = []
+    for col in order_schema(HIST_DAYS, LOCATION_SHEET).columns:
+        if col not in final.columns:
+            final[col] = ""
+        output_columns.append(col)
+    return final[output_columns]
+
+
+def current_path(catalogue, weekly, location):
+    location_df = weekly[weekly["Location"] == location]
+    merged = _merge(catalogue, location_df[etl_columns(location_df.columns, "Supplier SKU", "In Stock Qty")])
+    formula, _ = order_columns(merged, COVERAGE_DAYS, "Sales per Day", case_col="EachesPerCase")
+    return order_schema(HIST_DAYS, LOCATION_SHEET).apply(merged.assign(**formula))
+
+
+COUNTED = {
+    "copy": "copy", "__getitem__": "select", "merge": "merge", "__setitem__": "setitem",
+    "insert": "insert", "assign": "assign", "reindex": "reindex",
+}
+
+
+class allocation_counter:
+    """Counts outermost calls of the frame-materialising DataFrame methods."""
+
+    def __init__(self):
+        self.counts = Counter()
+        self._depth = 0
+        self._originals = {}
+
+    def _wrap(self, name, label):
+        original = getattr(pd.DataFrame, name)
+        self._originals[name] = original
+
+        @wraps(original)
+        def counted(frame, *args, **kwargs):
+            if self._depth == 0 and not (name == "__getitem__" and not isinstance(args[0], (list, pd.Series))):
+                self.counts[label] += 1
+            self._depth += 1
+            try:
+                return original(frame, *args, **kwargs)
+            finally:
+                self._depth -= 1
+        return counted
+
+    def __enter__(self):
+        for name, label in COUNTED.items():
+            setattr(pd.DataFrame, name, self._wrap(name, label))
+        return self
+
+    def __exit__(self, *exc):
+        for name, original in self._originals.items():
+            setattr(pd.DataFrame, name, original)
+
+
+def run(path, catalogue, weekly, locations, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        sheets = [path(catalogue, weekly, loc) for loc in locations]
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    with allocation_counter() as counter:
+        for loc in locations:
+            path(catalogue, weekly, loc)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(times), peak, counter.counts, sheets
+
+
+if __name__ == "__main__":
+    skus = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    n_locations = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    repeats = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+
+    catalogue, weekly = synthetic_inputs(skus, n_locations)
+    locations = weekly["Location"].unique().tolist()
+    print(f"{skus} catalogue SKUs, {len(weekly)} ETL rows, {len(locations)} locations")
+
+    results = {}
+    for name, path in (("previous", previous_path), ("current", current_path)):
+        seconds, peak, counts, sheets = run(path, catalogue, weekly, locations, repeats)
+        results[name] = sheets
+        total = sum(counts.values())
+        detail = ", ".join(f"{label} {n}" for label, n in sorted(counts.items()))
+        print(f"  {name:<9} {seconds * 1000:8.1f} ms   peak {peak / 1e6:6.1f} MB   "
+              f"{total:3d} allocations ({detail})")
+
+    same = all(a.equals(b) for a, b in zip(results["previous"], results["current"]))
+    print(f"Identical sheets: {same}")
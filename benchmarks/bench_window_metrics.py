@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark of window metrics from etl/cube.py against regrouping the history.
+
+Usage:
+    python benchmarks/bench_window_metrics.py [skus] [locations] [days]
+
+Builds a synthetic daily IOH and sales history, in which each SKU is
+carried at about half of the locations, then computes Total Days in
+Stock, Total In Stock Qty, Net Sold and Sales per Day for every window
+length from 1 to ``days`` twice: by filtering and grouping the long
+history as step 3 of the ETL did, and from the prefix-sum cube. Both give
+the same numbers.
+"""
+import os
+import sys
+import time
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+import numpy as np
+import pandas as pd
+from etl.cube import MetricsCube
+
+
+def synthetic_history(skus: int, locations: int, days: int):
+    rng = np.random.default_rng(0)
+    dates = pd.date_range(end=pd.Timestamp.today().normalize(), periods=days, freq="D")
+    sku, loc, day = np.meshgrid(np.arange(skus), np.arange(locations), np.arange(days), indexing="ij")
+    carried = rng.random((skus, locations)) < 0.5
+    kept = carried[sku, loc]
+    sku, loc, day = sku[kept], loc[kept], day[kept]
+    ioh = pd.DataFrame({
+        "SKU":          sku,
+        "Location":     loc,
+        "Date":         dates[day],
+        "In Stock Qty": rng.integers(0, 30, size=sku.size) * (rng.random(sku.size) > 0.2),
+    })
+    sold = rng.random(sku.size) < 0.4
+    sales = pd.DataFrame({
+        "SKU":      sku[sold],
+        "Location": loc[sold],
+        "Date":     dates[day[sold]],
+        "Net Sold": rng.integers(1, 6, size=sold.sum()),
+    })
+    return ioh, sales
+
+
+def regrouped(ioh: pd.DataFrame, sales: pd.DataFrame, window: int) -> pd.DataFrame:
+    first = ioh["Date"].max() - pd.Timedelta(days=window - 1)
+    recent = ioh[ioh["Date"] >= first].assign(**{"Was In Stock": lambda d: (d["In Stock Qty"] > 0).astype(int)})
+    totals = recent.groupby(["SKU", "Location"], as_index=False) \
+        .agg(**{"Total Days in Stock": ("Was In Stock", "sum"), "Total In Stock Qty": ("In Stock Qty", "sum")})
+    sold = sales[sales["Date"] >= first].groupby(["SKU", "Location"], as_index=False)["Net Sold"].sum()
+    frame = totals.merge(sold, on=["SKU", "Location"], how="left").fillna({"Net Sold": 0})
+    frame["Sales per Day"] = frame["Net Sold"] / frame["Total Days in Stock"].replace(0, np.nan)
+    return frame
+
+
+if __name__ == "__main__":
+    n_skus = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    n_locations = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    n_days = int(sys.argv[3]) if len(sys.argv) > 3 else 90
+
+    ioh, sales = synthetic_history(n_skus, n_locations, n_days)
+    print(f"{n_skus} SKUs × {n_locations} locations × {n_days} days "
+          f"({len(ioh)} IOH rows, {len(sales)} sales rows)")
+
+    start = time.perf_counter()
+    expected = [regrouped(ioh, sales, w) for w in range(1, n_days + 1)]
+    grouped_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cube = MetricsCube.from_history(ioh, sales)
+    build_s = time.perf_counter() - start
+    start = time.perf_counter()
+    frames = [cube.window_frame(w) for w in range(1, n_days + 1)]
+    window_s = time.perf_counter() - start
+    cube_mb = sum(prefix.nbytes for prefix in cube.prefix.values()) / 1e6
+
+    columns = ["Total Days in Stock", "Total In Stock Qty", "Sales per Day"]
+    same = all(
+        np.allclose(e[columns].to_numpy(float), f[columns].to_numpy(float), equal_nan=True)
+        and np.allclose(e["Net Sold"], f[f"{w}d Net Sold"])
+        for w, (e, f) in enumerate(zip(expected, frames), start=1)
+    )
+    print(f"  regroup per window  {grouped_s / n_days * 1000:8.2f} ms / window")
+    print(f"  cube build          {build_s * 1000:8.1f} ms (once), "
+          f"{len(cube.series)} series, {cube_mb:.1f} MB")
+    print(f"  cube per window     {window_s / n_days * 1000:8.2f} ms / window")
+    print(f"Same metrics: {same}")
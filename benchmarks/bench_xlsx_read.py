@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the sheet readers in app/xlsx_reader.py against pd.read_excel.
+
+Usage:
+    python benchmarks/bench_xlsx_read.py [workbook] [repeats]
+
+``workbook`` defaults to the AGLC order form in the project root
+(CannabisRetailersManualOrderForm.xlsm). When it is not there, a synthetic
+catalogue of the same shape (banner rows, header on row 11, 20,000 SKUs) is
+generated so the readers can still be compared.
+"""
+import os
+import sys
+import time
+import random
+import tempfile
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(project_root, "app"))
+
+import pandas as pd
+from openpyxl import Workbook
+from xlsx_reader import BACKENDS, CATALOGUE_SHEETS, read_sheet, list_sheets
+
+
+def synthetic_catalogue(path: str, rows: int = 20000):
+    """An order-form shaped workbook: an instructions sheet and a Catalogue with the header on row 11."""
+    random.seed(0)
+    wb = Workbook()
+    wb.active.title = "Instructions"
+    wb.active["A1"] = "Cannabis Retailers Manual Order Form"
+    ws = wb.create_sheet("Catalogue")
+    for r in range(1, 11):
+        ws.cell(r, 1, f"Banner line {r}" if r % 3 == 0 else None)
+    header = ["AGLC SKU", "Brand Name", "Product", "Format", "Size", "EachesPerCase",
+              "Unit Price", "Available Cases"]
+    for c, name in enumerate(header, start=1):
+        ws.cell(11, c, name)
+    for r in range(12, 12 + rows):
+        ws.append([
+            100000 + r, f"Brand {r % 300}", f"Product {r}",
+            random.choice(["Dried Flower", "Pre-Roll", "Vape", "Edible"]),
+            random.choice([1, 3.5, 7, 28]), random.choice([6, 12, 24, 48]),
+            round(random.uniform(2, 60), 2), random.randint(0, 200)
+        ])
+    wb.save(path)
+
+
+def header_row_of(path: str, sheet: str) -> int:
+    return read_sheet(path, sheet, backend="iterparse", nrows=0).attrs["header_row"]
+
+
+def bench(read, repeats: int):
+    """Best-of-``repeats`` seconds and the frame from the last run."""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        df = read()
+        times.append(time.perf_counter() - start)
+    return min(times), df
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(
+        project_root, "CannabisRetailersManualOrderForm.xlsm")
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    if not os.path.exists(path):
+        path = os.path.join(tempfile.mkdtemp(), "synthetic_catalogue.xlsx")
+        print(f"No order form given, generating a synthetic 20,000-row catalogue at {path}")
+        synthetic_catalogue(path)
+
+    sheet = next(s for s in CATALOGUE_SHEETS if s in list_sheets(path))
+    header = header_row_of(path, sheet)
+    print(f"{os.path.basename(path)} ({os.path.getsize(path) / 1e6:.1f} MB), "
+          f"sheet '{sheet}', header on row {header}")
+    print(f"Backends available: {BACKENDS}")
+
+    baseline, expected = bench(
+        lambda: pd.read_excel(path, sheet_name=sheet, header=header - 1, engine="openpyxl"),
+        repeats)
+    print(f"  {'openpyxl':<10} {baseline * 1000:8.1f} ms   {len(expected)} rows")
+    for backend in reversed(BACKENDS):
+        seconds, df = bench(lambda: read_sheet(path, CATALOGUE_SHEETS, backend=backend), repeats)
+        same = list(df.columns) == list(expected.columns) and len(df) == len(expected)
+        print(f"  {backend:<10} {seconds * 1000:8.1f} ms   {len(df)} rows"
+              f"   speedup x{baseline / seconds:.2f}{'' if same else '   (shape differs)'}")
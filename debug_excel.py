@@ -1,10 +1,12 @@
 #!/usr/bin/env python3
-import pandas as pd
 import openpyxl
 from openpyxl.utils.cell import get_column_letter
 import os
 import sys
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "app"))
+from xlsx_reader import read_sheet, list_sheets, BACKENDS, get_backend
+
 def analyze_excel_file(file_path):
     print(f"Analyzing Excel file: {file_path}")
     print(f"File exists: {os.path.exists(file_path)}")
@@ -55,26 +57,25 @@ def analyze_excel_file(file_path):
     except Exception as e:
         print(f"Error in openpyxl analysis: {str(e)}")
     
-    # Try using pandas
+    # Try using the fast reader (xlsx_reader.read_sheet)
     print("\n" + "="*80)
-    print("PANDAS ANALYSIS:")
+    print(f"READ_SHEET ANALYSIS (backend: {get_backend()}, installed: {BACKENDS}):")
     print("="*80)
     try:
-        # Get sheet names using pandas
-        excel_file = pd.ExcelFile(file_path)
-        sheet_names_pd = excel_file.sheet_names
-        print(f"Pandas found {len(sheet_names_pd)} sheets: {sheet_names_pd}")
+        # Get sheet names from the workbook part
+        sheet_names_pd = list_sheets(file_path)
+        print(f"read_sheet found {len(sheet_names_pd)} sheets: {sheet_names_pd}")
         
         for sheet_name in sheet_names_pd:
-            print(f"\nANALYZING SHEET WITH PANDAS: '{sheet_name}'")
+            print(f"\nANALYZING SHEET WITH READ_SHEET: '{sheet_name}'")
             
             # Read sheet with no header first to see raw data
-            df_no_header = pd.read_excel(file_path, sheet_name=sheet_name, header=None, nrows=10)
+            df_no_header = read_sheet(file_path, sheet_name, raw=True, nrows=10)
             print(f"\nRaw data (first 10 rows, no header):")
             print(df_no_header)
             
-            # Try with header=0
-            df_header0 = pd.read_excel(file_path, sheet_name=sheet_name, nrows=10)
+            # Try with the first row as header
+            df_header0 = read_sheet(file_path, sheet_name, header_detect=False, nrows=10)
             print(f"\nWith header=0:")
             print(df_header0)
             print("\nColumn names:", df_header0.columns.tolist())
@@ -100,7 +101,7 @@ def analyze_excel_file(file_path):
                                 print(f"  Row {i}, Column {j}")
     
     except Exception as e:
-        print(f"Error in pandas analysis: {str(e)}")
+        print(f"Error in read_sheet analysis: {str(e)}")
 
 if __name__ == "__main__":
     # Use provided file path or default
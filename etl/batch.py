@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Multi-tenant batch mode: runs ``generate_order`` for many Cova companies /
+store groups in one process.
+
+All tenants share one HTTP connection pool, one global budget of in-flight
+report calls and one token-bucket rate limit, and tenants that sign in with
+the same credentials share a single bearer token.
+
+Config file format (JSON)::
+
+    {
+      "max_concurrency": 8,
+      "requests_per_second": 5,
+      "hist_days": 30,
+      "exclude_today": false,
+      "tenants": [
+        {"name": "north", "company_id": 131096,
+         "entities": [230791, 167209], "classifications": [3331]},
+        {"name": "south", "company_id": 131096,
+         "entities": [237603], "credentials": "COVA_SOUTH"}
+      ]
+    }
+
+``credentials`` names the environment prefix to sign in with
+(``<prefix>_USERNAME`` / ``_PASSWORD`` / ``_CLIENT``) and defaults to ``COVA``.
+"""
+import os
+import sys
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from etl.cova import (
+    CovaClient,
+    TokenBucket,
+    authenticate,
+    make_session,
+    shared_gate,
+    DEFAULT_COMPANY_ID,
+    DEFAULT_REQUESTS_PER_SECOND,
+)
+from etl.generate_order import generate_order
+
+logger = logging.getLogger(__name__)
+
+
+def load_tenants(config_path: str) -> dict:
+    """Reads a batch config file and validates the tenant entries."""
+    with open(config_path, "r") as f:
+        config = json.load(f)
+
+    tenants = config.get("tenants") or []
+    if not tenants:
+        raise ValueError(f"No tenants defined in {config_path}")
+    names = set()
+    for tenant in tenants:
+        name = tenant.get("name")
+        if not name:
+            raise ValueError(f"Tenant without a name in {config_path}: {tenant}")
+        if name in names:
+            raise ValueError(f"Duplicate tenant name '{name}' in {config_path}")
+        if not tenant.get("entities"):
+            raise ValueError(f"Tenant '{name}' has no entities")
+        names.add(name)
+    return config
+
+
+def generate_orders(tenants: list,
+                    output_dir: str,
+                    hist_days: int = 30,
+                    exclude_today: bool = False,
+                    max_concurrency: int = 8,
+                    requests_per_second: float = DEFAULT_REQUESTS_PER_SECOND) -> dict:
+    """
+    Runs the ETL for every tenant and writes ``<output_dir>/<name>_Final_Report.xlsx``.
+
+    ``max_concurrency`` is the global number of Cova report calls allowed in
+    flight across all tenants and ``requests_per_second`` their combined
+    sustained request rate. Returns ``{name: output_path or exception}``;
+    one tenant failing does not stop the others.
+    """
+    session = make_session(pool_size=max_concurrency)
+    gate = shared_gate(max_concurrency)
+    limiter = TokenBucket(requests_per_second)
+
+    tokens = {}
+    tokens_lock = threading.Lock()
+
+    def headers_for(prefix: str) -> dict:
+        with tokens_lock:
+            if prefix not in tokens:
+                tokens[prefix] = authenticate(session, prefix)
+            return tokens[prefix]
+
+    def run_tenant(tenant: dict) -> str:
+        prefix = tenant.get("credentials", "COVA")
+        client = CovaClient(
+            tenant.get("company_id", DEFAULT_COMPANY_ID),
+            session=session,
+            headers=headers_for(prefix),
+            env_prefix=prefix,
+            gate=gate,
+            limiter=limiter
+        )
+        output_path = os.path.join(output_dir, f"{tenant['name']}_Final_Report.xlsx")
+        generate_order(
+            output_path,
+            hist_days=tenant.get("hist_days", hist_days),
+            exclude_today=tenant.get("exclude_today", exclude_today),
+            company_id=client.company_id,
+            entities=tenant["entities"],
+            classifications=tenant.get("classifications"),
+            client=client,
+            max_workers=max_concurrency
+        )
+        return output_path
+
+    results = {}
+    # tenant threads mostly wait on the shared gate, so one per tenant is fine
+    with ThreadPoolExecutor(max_workers=max(1, len(tenants))) as pool:
+        futures = {tenant["name"]: pool.submit(run_tenant, tenant) for tenant in tenants}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+                logger.info("✅ %s: %s", name, results[name])
+            except Exception as e:
+                results[name] = e
+                logger.error("❌ %s: %s", name, e)
+    return results
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if len(sys.argv) < 2:
+        print("Usage: python -m etl.batch <tenants.json> [output_dir]")
+        sys.exit(2)
+
+    config = load_tenants(sys.argv[1])
+    output_dir = sys.argv[2] if len(sys.argv) > 2 else "output/tenants"
+    results = generate_orders(
+        config["tenants"],
+        output_dir,
+        hist_days=config.get("hist_days", 30),
+        exclude_today=config.get("exclude_today", False),
+        max_concurrency=config.get("max_concurrency", 8),
+        requests_per_second=config.get("requests_per_second", DEFAULT_REQUESTS_PER_SECOND)
+    )
+    sys.exit(0 if all(isinstance(r, str) for r in results.values()) else 1)
@@ -0,0 +1,119 @@
+"""
+On-disk checkpoints for the ETL so fetched data survives a failed run.
+"""
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+def params_key(params: dict) -> str:
+    """Stable short hash of a JSON-serialisable parameter dict."""
+    blob = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:16]
+
+
+def atomic_write(path: str, write, suffix: str = ".tmp"):
+    """
+    Calls ``write(tmp_path)`` and moves the result over ``path``.
+
+    The temporary file is created beside ``path`` under a name of its own
+    (ending in ``suffix``, e.g. ".xlsx" for a writer that goes by the
+    extension), so concurrent writers of the same path never touch each
+    other's file; the last one to finish wins. It is removed if ``write``
+    fails.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".",
+                                    prefix=f".{os.path.basename(path)}.", suffix=suffix)
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _atomic_pickle(obj, path: str):
+    atomic_write(path, lambda tmp_path: pd.to_pickle(obj, tmp_path))
+
+
+class DayCheckpoint:
+    """
+    One pickle per fetched report day under ``<root>/<name>/<key>/``.
+
+    ``key`` identifies the tenant/query (see ``params_key``) so different
+    companies or entity sets never read each other's days. Only closed days
+    should be stored: a day that is still in progress would be served stale.
+    """
+
+    def __init__(self, root: str, name: str, key: str):
+        self.directory = os.path.join(root, name, key)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, day) -> str:
+        return os.path.join(self.directory, f"{day:%Y-%m-%d}.pkl")
+
+    def load(self, day):
+        """Returns the stored frame for ``day`` or None if it was never saved."""
+        path = self.path(day)
+        if not os.path.exists(path):
+            return None
+        try:
+            return pd.read_pickle(path)
+        except Exception as e:
+            logger.warning("Ignoring unreadable checkpoint %s: %s", path, e)
+            return None
+
+    def save(self, day, df: pd.DataFrame):
+        _atomic_pickle(df, self.path(day))
+
+
+class RunCheckpoint:
+    """
+    Saves the output of each ETL step for one parameter set, so a failed
+    run can be resumed from the last completed step.
+
+    The run directory is ``<root>/runs/<params_key(params)>``; the params are
+    written next to the step files for inspection. ``clear`` removes the
+    step files this run saved or resumed from once it has finished; the
+    directory stays, as another run with the same parameters may still be
+    writing to it.
+    """
+
+    def __init__(self, root: str, params: dict):
+        self.directory = os.path.join(root, "runs", params_key(params))
+        self.steps = set()
+        os.makedirs(self.directory, exist_ok=True)
+        params_path = os.path.join(self.directory, "params.json")
+        if not os.path.exists(params_path):
+            with open(params_path, "w") as f:
+                json.dump(params, f, indent=2, sort_keys=True, default=str)
+
+    def path(self, step: str) -> str:
+        return os.path.join(self.directory, f"{step}.pkl")
+
+    def has(self, step: str) -> bool:
+        return os.path.exists(self.path(step))
+
+    def load(self, step: str):
+        result = pd.read_pickle(self.path(step))
+        self.steps.add(step)
+        return result
+
+    def save(self, step: str, result):
+        _atomic_pickle(result, self.path(step))
+        self.steps.add(step)
+
+    def clear(self):
+        for step in self.steps:
+            try:
+                os.remove(self.path(step))
+            except FileNotFoundError:
+                pass
+        self.steps.clear()
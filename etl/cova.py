@@ -0,0 +1,295 @@
+"""
+Helpers for talking to the Cova sign-in service and report API.
+
+A ``CovaClient`` owns the HTTP session (and therefore its connection pool),
+the bearer headers, a concurrency gate and a rate limiter. Several clients
+can be built on the same session, gate and limiter, which is how batch mode
+shares one pool and one global budget of report calls across tenants.
+
+Report calls are retried on 429 / 5xx responses and connection errors with
+jittered exponential backoff, honouring ``Retry-After`` when Cova sends it.
+The body is read inside the same attempt, so a connection that drops or a
+body that is cut off mid-download is retried too. A 401 (the bearer token
+expired during a long run) signs in again once and resends the request.
+Report rows are streamed into a DataFrame when ``ijson`` is available,
+otherwise bodies are decoded with the fastest installed JSON library (see
+``etl.report_json``).
+"""
+import os
+import json
+import time
+import random
+import logging
+import threading
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+import pandas as pd
+
+from etl.report_json import (
+    INCOMPLETE_BODY_ERRORS,
+    frame_from_body,
+    get_decoder,
+    stream_report_frame,
+    streaming_available,
+)
+
+SIGNIN_URL = "https://signinbackend.iqmetrix.net/v1/oauth2/token"
+REPORT_URL = (
+    "https://covareportservice-prod-westus.azurewebsites.net/"
+    "v2/Companies/{company_id}/Reports/{report_id}/Execute"
+)
+TIME_ZONE = "America/Edmonton"
+
+logger = logging.getLogger(__name__)
+
+# The single-store defaults the ETL was originally written against
+DEFAULT_COMPANY_ID      = 131096
+DEFAULT_ENTITIES        = [230791, 167209, 237603]
+DEFAULT_CLASSIFICATIONS = [3331]
+
+# Transient responses worth retrying, and the backoff schedule for them
+RETRY_STATUSES             = {429, 500, 502, 503, 504}
+DEFAULT_MAX_RETRIES        = 5
+DEFAULT_BACKOFF_BASE       = 1.0    # seconds
+DEFAULT_BACKOFF_CAP        = 60.0   # seconds
+DEFAULT_REQUESTS_PER_SECOND = 5.0
+
+# failures of the connection rather than of the request, while sending it
+# or while reading the body (urllib3 errors surface when streaming resp.raw)
+RETRY_ERRORS = (
+    requests.ConnectionError,
+    requests.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+    urllib3.exceptions.ProtocolError,
+    urllib3.exceptions.ReadTimeoutError,
+) + INCOMPLETE_BODY_ERRORS
+
+
+def make_session(pool_size: int = 16) -> requests.Session:
+    """
+    Returns a requests session whose HTTPS pool can keep ``pool_size``
+    connections alive, so concurrent report calls reuse sockets.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    return session
+
+
+def authenticate(session: requests.Session, env_prefix: str = "COVA") -> dict:
+    """
+    Signs in with the ``<env_prefix>_USERNAME`` / ``_PASSWORD`` / ``_CLIENT``
+    credentials from the environment and returns the bearer headers.
+    """
+    auth = session.post(
+        SIGNIN_URL,
+        json={
+            "UsernameOrEmailAddress": os.getenv(f"{env_prefix}_USERNAME"),
+            "Password":               os.getenv(f"{env_prefix}_PASSWORD"),
+            "ClientKey":              os.getenv(f"{env_prefix}_CLIENT")
+        },
+        headers={"Content-Type": "application/json"}
+    )
+    auth.raise_for_status()
+    token = auth.json()["token"]
+    return {
+        "Authorization": f"Bearer {token}",
+        "Content-Type":  "application/json"
+    }
+
+
+class TokenBucket:
+    """
+    Thread-safe token-bucket rate limiter: allows bursts of up to
+    ``capacity`` requests and a sustained ``rate`` requests per second.
+    """
+
+    def __init__(self, rate: float = DEFAULT_REQUESTS_PER_SECOND, capacity: float = None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a token is available, then consumes it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity,
+                                   self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Drains the bucket so every caller backs off for ``seconds`` (used on 429)."""
+        with self._lock:
+            self._tokens = min(self._tokens, -seconds * self.rate)
+
+
+def retry_after_seconds(resp: requests.Response):
+    """Parses a ``Retry-After`` header (delta-seconds or HTTP-date), if any."""
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff_delay(attempt: int,
+                  base: float = DEFAULT_BACKOFF_BASE,
+                  cap: float = DEFAULT_BACKOFF_CAP) -> float:
+    """Full-jitter exponential backoff for the given (0-based) retry attempt."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class CovaClient:
+    """
+    Executes Cova reports for one company.
+
+    ``session``, ``headers``, ``gate`` and ``limiter`` may be shared between
+    clients; ``gate`` is any context manager (normally a ``BoundedSemaphore``)
+    held for the duration of each report request, body download included,
+    and ``limiter`` is a ``TokenBucket`` consulted before every attempt.
+    Shared ``headers`` are refreshed in place, with the ``env_prefix``
+    credentials, when Cova rejects their token. ``streaming`` selects
+    incremental row parsing and defaults to on when ``ijson`` is installed;
+    otherwise whole bodies are decoded with ``decoder`` (see ``get_decoder``).
+    With ``record_dir`` (default ``$COVA_RECORD_DIR``) every raw report body
+    is also saved there, e.g. as input for ``benchmarks/bench_json_decode.py``;
+    recording disables streaming.
+    """
+
+    # one sign-in at a time, so clients sharing headers refresh them once
+    _refresh_lock = threading.Lock()
+
+    def __init__(self,
+                 company_id: int = DEFAULT_COMPANY_ID,
+                 session: requests.Session = None,
+                 headers: dict = None,
+                 gate=None,
+                 env_prefix: str = "COVA",
+                 limiter: TokenBucket = None,
+                 max_retries: int = DEFAULT_MAX_RETRIES,
+                 streaming: bool = None,
+                 decoder=None,
+                 record_dir: str = None):
+        self.company_id = company_id
+        self.env_prefix = env_prefix
+        self.session = session or make_session()
+        self.headers = headers if headers is not None else authenticate(self.session, env_prefix)
+        self.gate = gate if gate is not None else nullcontext()
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.decode = decoder or get_decoder()
+        self.record_dir = record_dir or os.getenv("COVA_RECORD_DIR")
+        if self.record_dir:
+            os.makedirs(self.record_dir, exist_ok=True)
+            streaming = False
+        self.streaming = streaming_available() if streaming is None else streaming
+
+    def refresh_token(self, rejected: str):
+        """
+        Signs in again after a request sent with the ``rejected``
+        Authorization header got a 401, unless another request sharing
+        ``headers`` has already done so.
+        """
+        with self._refresh_lock:
+            if self.headers.get("Authorization") == rejected:
+                self.headers.update(authenticate(self.session, self.env_prefix))
+
+    def _post(self, url: str, payload: dict, read):
+        """
+        POSTs with rate limiting and retries and returns ``read(resp)``;
+        raises once retries run out. The body is streamed and ``read``
+        runs within the attempt, holding the gate, so a failure while
+        reading it is retried like a failed request. The first 401 refreshes
+        the token and resends at once; a second one is raised.
+        """
+        attempt = 0
+        refreshed = False
+        while True:
+            if self.limiter is not None:
+                self.limiter.acquire()
+            try:
+                with self.gate:
+                    token = self.headers.get("Authorization")
+                    resp = self.session.post(url, json=payload, headers=self.headers, stream=True)
+                    expired = resp.status_code == 401 and not refreshed
+                    if not expired and (resp.status_code not in RETRY_STATUSES
+                                        or attempt >= self.max_retries):
+                        try:
+                            resp.raise_for_status()
+                            return read(resp)
+                        finally:
+                            resp.close()
+                    resp.close()
+            except RETRY_ERRORS as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = backoff_delay(attempt)
+                logger.warning("Cova request failed (%s), retrying in %.1fs", e.__class__.__name__, delay)
+            else:
+                if expired:
+                    logger.info("Cova rejected the token, signing in again")
+                    self.refresh_token(token)
+                    refreshed = True
+                    continue
+                delay = retry_after_seconds(resp)
+                if delay is None:
+                    delay = backoff_delay(attempt)
+                if resp.status_code == 429 and self.limiter is not None:
+                    self.limiter.pause(delay)
+                logger.warning("Cova returned %s, retrying in %.1fs", resp.status_code, delay)
+            time.sleep(delay)
+            attempt += 1
+
+    def _report(self, report_id: str, params: dict, read):
+        payload = {
+            "ReportId":   report_id,
+            "TimeZone":   TIME_ZONE,
+            "Parameters": json.dumps(params)
+        }
+        url = REPORT_URL.format(company_id=self.company_id, report_id=report_id)
+        return self._post(url, payload, read)
+
+    def _record(self, report_id: str, content: bytes):
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        path = os.path.join(self.record_dir, f"{report_id}_{stamp}.json")
+        with open(path, "wb") as f:
+            f.write(content)
+
+    def execute(self, report_id: str, params: dict):
+        """Runs a report and returns the decoded JSON body."""
+        content = self._report(report_id, params, lambda resp: resp.content)
+        if self.record_dir:
+            self._record(report_id, content)
+        return self.decode(content)
+
+    def execute_frame(self, report_id: str, params: dict) -> pd.DataFrame:
+        """Runs a report and returns the ``Data`` rows of its first result."""
+        if self.streaming:
+            return self._report(report_id, params, stream_report_frame)
+        return frame_from_body(self.execute(report_id, params))
+
+
+def shared_gate(max_concurrency: int):
+    """A global budget of in-flight report calls shared by many clients."""
+    return threading.BoundedSemaphore(max_concurrency)
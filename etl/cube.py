@@ -0,0 +1,115 @@
+"""
+Prefix-sum cube of the daily IOH and sales history.
+
+In Stock Qty, the in-stock flag and Net Sold are laid out as
+(series × day) arrays, one row per SKU/location pair that appears in the
+history, and summed cumulatively along the day axis, with a leading zero
+day. The sum over any window of days is then the difference of two prefix
+values, so Total Days in Stock, Total In Stock Qty, Net Sold and Sales per
+Day cost O(1) per SKU/location for every window length, and changing the
+window needs neither Cova nor a regroup of the history. Pairs that never
+appear take no space, so the size follows the history rather than
+SKUs × locations.
+"""
+import os
+import numpy as np
+import pandas as pd
+
+from etl.checkpoint import atomic_write
+from etl.forecast import SERIES_KEYS, series_index
+
+MEASURES = {
+    "In Stock Qty": "Total In Stock Qty",
+    "Was In Stock": "Total Days in Stock",
+    "Net Sold":     "Net Sold",
+}
+
+
+class MetricsCube:
+    """
+    ``series`` is a frame of the SKU / Location of each row and ``days``
+    the dates of the columns; ``prefix[name][i, d]`` is the sum of measure
+    ``name`` for series ``i`` over the first ``d`` days.
+    """
+
+    def __init__(self, series: pd.DataFrame, days: pd.DatetimeIndex, prefix: dict):
+        self.series = series
+        self.days = days
+        self.prefix = prefix
+
+    @classmethod
+    def from_history(cls, comb_df: pd.DataFrame, sales_df: pd.DataFrame = None) -> "MetricsCube":
+        """
+        Builds the cube from the historical IOH rows (SKU, Location, Date,
+        In Stock Qty) and, when given, the daily sales rows (SKU, Location,
+        Date, Net Sold). Days on which a pair has no row count as zero.
+        """
+        has_sales = sales_df is not None and not sales_df.empty
+        frames = [comb_df[SERIES_KEYS + ["Date"]]]
+        if has_sales:
+            frames.append(sales_df[SERIES_KEYS + ["Date"]])
+        series, days, rows, cols = series_index(pd.concat(frames, ignore_index=True))
+        shape = (len(series), len(days))
+        flat = rows * shape[1] + cols
+        # the IOH rows come first in ``flat``, the sales rows after them
+        ioh_flat, sales_flat = flat[:len(comb_df)], flat[len(comb_df):]
+
+        def dense(positions: np.ndarray, values: np.ndarray) -> np.ndarray:
+            return np.bincount(positions, weights=values, minlength=shape[0] * shape[1]).reshape(shape)
+
+        qty = pd.to_numeric(comb_df["In Stock Qty"], errors="coerce").fillna(0).to_numpy(dtype=float)
+        daily = {
+            "In Stock Qty": dense(ioh_flat, qty),
+            "Was In Stock": dense(ioh_flat, (qty > 0).astype(float)),
+        }
+        if has_sales:
+            sold = pd.to_numeric(sales_df["Net Sold"], errors="coerce").fillna(0).to_numpy(dtype=float)
+            daily["Net Sold"] = dense(sales_flat, sold)
+        else:
+            daily["Net Sold"] = np.zeros(shape)
+
+        prefix = {
+            name: np.concatenate([np.zeros((shape[0], 1)), values.cumsum(axis=1)], axis=1)
+            for name, values in daily.items()
+        }
+        return cls(series, days, prefix)
+
+    def _bounds(self, days: int, end=None):
+        stop = len(self.days) if end is None else \
+            int(self.days.searchsorted(pd.Timestamp(end).normalize(), side="right"))
+        return max(0, stop - days), stop
+
+    def window_sum(self, measure: str, days: int, end=None) -> np.ndarray:
+        """Per-series sums of ``measure`` over the ``days`` days ending at ``end`` (default: the last day)."""
+        start, stop = self._bounds(days, end)
+        prefix = self.prefix[measure]
+        return prefix[:, stop] - prefix[:, start]
+
+    def window_frame(self, days: int, end=None) -> pd.DataFrame:
+        """
+        One row per SKU/location in the history with Total Days in Stock,
+        Total In Stock Qty, ``<days>d Net Sold`` and Sales per Day
+        (Net Sold / Total Days in Stock, NaN without a day in stock) over
+        the window.
+        """
+        frame = self.series.copy()
+        for measure, column in MEASURES.items():
+            frame[column] = self.window_sum(measure, days, end)
+        frame["Total Days in Stock"] = frame["Total Days in Stock"].astype(int)
+        frame = frame.rename(columns={"Net Sold": f"{days}d Net Sold"})
+        frame["Sales per Day"] = (
+            frame[f"{days}d Net Sold"] / frame["Total Days in Stock"].replace(0, np.nan)
+        )
+        return frame
+
+    def save(self, path: str):
+        atomic_write(path, lambda tmp_path: pd.to_pickle(self, tmp_path))
+
+    @staticmethod
+    def load(path: str) -> "MetricsCube":
+        return pd.read_pickle(path)
+
+
+def cube_path(output_path: str) -> str:
+    """Where the ETL keeps the cube of the report at ``output_path``."""
+    return f"{os.path.splitext(output_path)[0]}.cube.pkl"
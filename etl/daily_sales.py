@@ -0,0 +1,85 @@
+"""
+Per-day sales history kept as (SKU/location series × day) arrays.
+
+Cova's sales report is requested once per day (``DateRangeType`` 9 with the
+same start and end date), so velocity for any window can be recomputed
+locally instead of asking Cova for another aggregate. ``SalesStore`` holds
+one (series × day) array per additive measure; a window is a slice sum
+along the day axis.
+"""
+import numpy as np
+import pandas as pd
+
+from etl.forecast import SERIES_KEYS, series_index
+
+# additive measures kept per day; the average price of a window is
+# Revenue / Net Sold over that window
+MEASURES = ("Net Sold", "Total Cost", "Revenue")
+
+
+class SalesStore:
+    """
+    Daily sales of every SKU/location series.
+
+    ``series`` is a frame of the SKU / Location of each row, ``days`` the
+    consecutive dates of the columns and ``arrays`` maps each of
+    ``MEASURES`` to a float (series × day) array, 0 on days without sales.
+    """
+
+    def __init__(self, series: pd.DataFrame, days: pd.DatetimeIndex, arrays: dict):
+        self.series = series
+        self.days = days
+        self.arrays = arrays
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, keys: list = None) -> "SalesStore":
+        """
+        Builds the store from daily report rows (``Date``, the ``keys``,
+        ``Net Sold``, ``Avg Sold At Price``, ``Total Cost``); rows of the
+        same series and day are added up.
+        """
+        keys = keys or SERIES_KEYS
+        series, days, rows, cols = series_index(df, keys)
+        shape = (len(series), len(days))
+        flat = rows * shape[1] + cols
+
+        def column(name):
+            if name not in df.columns:
+                return np.zeros(len(df))
+            return pd.to_numeric(df[name], errors="coerce").fillna(0).to_numpy(dtype=float)
+
+        measures = {
+            "Net Sold":   column("Net Sold"),
+            "Total Cost": column("Total Cost"),
+            "Revenue":    column("Net Sold") * column("Avg Sold At Price"),
+        }
+        arrays = {
+            name: np.bincount(flat, weights=values, minlength=shape[0] * shape[1]).reshape(shape)
+            for name, values in measures.items()
+        }
+        return cls(series, days, arrays)
+
+    def _window(self, days: int, end=None) -> slice:
+        stop = len(self.days) if end is None else \
+            int(self.days.searchsorted(pd.Timestamp(end).normalize(), side="right"))
+        return slice(max(0, stop - days), stop)
+
+    def window_sum(self, measure: str, days: int, end=None) -> np.ndarray:
+        """Per-series sum of ``measure`` over the ``days`` days ending at ``end`` (default: the last day)."""
+        return self.arrays[measure][:, self._window(days, end)].sum(axis=1)
+
+    def window_frame(self, days: int, end=None) -> pd.DataFrame:
+        """
+        One row per series with ``Net Sold``, ``Avg Sold At Price`` and
+        ``Total Cost`` over the ``days`` days ending at ``end``, in the
+        shape of the aggregate sales report.
+        """
+        net = self.window_sum("Net Sold", days, end)
+        revenue = self.window_sum("Revenue", days, end)
+        frame = self.series.copy()
+        frame["Net Sold"] = net
+        with np.errstate(invalid="ignore", divide="ignore"):
+            frame["Avg Sold At Price"] = np.where(net != 0, revenue / net, 0.0)
+        frame["Total Cost"] = self.window_sum("Total Cost", days, end)
+        return frame
+
@@ -0,0 +1,175 @@
+"""
+Vectorized demand forecasting for every SKU/location series at once.
+
+The daily history is laid out as a (series × day) NumPy matrix and fitted
+with additive Holt-Winters smoothing without trend (ETS(A,N,A)): a level
+and seven day-of-week offsets per series. Each smoothing step updates all
+series in one array operation, so the cost grows with the number of days
+(at most a few months) and not with the number of series.
+
+Missing days (NaN: the SKU was out of stock, so its demand is unknown) leave
+a series' state untouched instead of being read as zero sales.
+"""
+import numpy as np
+import pandas as pd
+
+SERIES_KEYS = ["SKU", "Location"]
+
+DEFAULT_ALPHA = 0.2    # level smoothing
+DEFAULT_GAMMA = 0.1    # day-of-week smoothing
+SEASON = 7             # days per seasonal cycle
+
+
+def series_index(df: pd.DataFrame, keys: list = None, date_col: str = "Date"):
+    """
+    Positions of the rows of a long daily frame in a (series × day) matrix:
+    ``(series, days, rows, cols)``. ``series`` is a frame of the distinct
+    ``keys`` (row i is series i, in order of appearance), ``days`` the
+    consecutive dates from the first to the last in ``df``, and ``rows`` /
+    ``cols`` the series and day index of each row of ``df``.
+    """
+    keys = keys or SERIES_KEYS
+    if df.empty:
+        return (pd.DataFrame(columns=keys), pd.DatetimeIndex([]),
+                np.empty(0, dtype=int), np.empty(0, dtype=int))
+    rows = df.groupby(keys, sort=False, dropna=False).ngroup().to_numpy()
+    series = df[keys].drop_duplicates().reset_index(drop=True)
+    dates = pd.to_datetime(df[date_col]).dt.normalize()
+    first = dates.min()
+    days = pd.date_range(first, dates.max(), freq="D")
+    cols = ((dates - first) // pd.Timedelta(days=1)).to_numpy()
+    return series, days, rows, cols
+
+
+def series_matrix(df: pd.DataFrame, value_col: str, keys: list = None,
+                  date_col: str = "Date"):
+    """
+    Pivots a long frame of daily values into ``(series, days, values)``
+    (see ``series_index``), with NaN wherever a series has no value.
+    """
+    series, days, rows, cols = series_index(df, keys, date_col)
+    values = np.full((len(series), len(days)), np.nan)
+    values[rows, cols] = pd.to_numeric(df[value_col], errors="coerce").to_numpy(dtype=float)
+    return series, days, values
+
+
+class Forecast:
+    """
+    Fitted level and day-of-week offsets of each series.
+
+    ``season[:, d]`` is the offset for weekday ``d`` (Monday = 0); the
+    offsets of a series sum to zero, so ``level`` is its average daily
+    demand over a full week.
+    """
+
+    def __init__(self, level: np.ndarray, season: np.ndarray, last_day: pd.Timestamp):
+        self.level = level
+        self.season = season
+        self.last_day = last_day
+
+    def daily(self, horizon: int, start: int = 1) -> np.ndarray:
+        """
+        (series × ``horizon``) matrix of the forecast for the days
+        ``start`` .. ``start + horizon - 1`` after the last fitted day,
+        clipped at zero.
+        """
+        weekdays = (self.last_day.weekday() + start + np.arange(horizon)) % SEASON
+        return np.clip(self.level[:, None] + self.season[:, weekdays], 0, None)
+
+    def total(self, horizon: int, start: int = 1) -> np.ndarray:
+        """Forecast demand of each series summed over ``horizon`` days."""
+        return self.daily(horizon, start).sum(axis=1)
+
+
+def fit(values: np.ndarray, days: pd.DatetimeIndex,
+        alpha: float = DEFAULT_ALPHA, gamma: float = DEFAULT_GAMMA) -> Forecast:
+    """
+    Fits ETS(A,N,A) with weekly seasonality to every row of ``values``.
+
+    The level starts at each series' mean and the offsets at its mean per
+    weekday minus that mean, so short histories start from a sensible
+    state; the smoothing pass then weights recent weeks more heavily.
+    Series without a single observed day get level 0.
+    """
+    n, t = values.shape
+    weekday = (days.weekday.to_numpy() if t else np.empty(0, dtype=int))
+    observed = ~np.isnan(values)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        counts = observed.sum(axis=1)
+        level = np.where(counts > 0, np.nansum(values, axis=1) / np.maximum(counts, 1), 0.0)
+        season = np.zeros((n, SEASON))
+        for d in range(SEASON):
+            cols = weekday == d
+            if cols.any():
+                day_counts = observed[:, cols].sum(axis=1)
+                day_mean = np.nansum(values[:, cols], axis=1) / np.maximum(day_counts, 1)
+                season[:, d] = np.where(day_counts > 0, day_mean - level, 0.0)
+    season -= season.mean(axis=1, keepdims=True)
+
+    for j in range(t):
+        d = weekday[j]
+        y = values[:, j]
+        seen = observed[:, j]
+        new_level = alpha * (y - season[:, d]) + (1 - alpha) * level
+        new_season = gamma * (y - new_level) + (1 - gamma) * season[:, d]
+        level = np.where(seen, new_level, level)
+        season[:, d] = np.where(seen, new_season, season[:, d])
+    season -= season.mean(axis=1, keepdims=True)
+
+    last_day = days[-1] if t else pd.Timestamp.today().normalize()
+    return Forecast(np.clip(level, 0, None), season, last_day)
+
+
+def forecast_frame(df: pd.DataFrame, value_col: str, keys: list = None,
+                   date_col: str = "Date", horizon: int = 14, start: int = 1,
+                   alpha: float = DEFAULT_ALPHA, gamma: float = DEFAULT_GAMMA) -> pd.DataFrame:
+    """
+    One row per series of ``df`` with its ``keys`` and:
+
+    - ``Forecast per Day``: average daily demand over the ``horizon`` days
+      from day ``start`` after the last day of ``df`` on, seasonality
+      included, so ``Forecast per Day × horizon`` is the demand forecast
+      for exactly those weekdays
+    - ``Forecast Level``: the deseasonalised daily level
+    """
+    series, days, values = series_matrix(df, value_col, keys, date_col)
+    model = fit(values, days, alpha, gamma)
+    horizon = max(int(horizon), 1)
+    series["Forecast per Day"] = model.total(horizon, start) / horizon
+    series["Forecast Level"] = model.level
+    return series
+
+
+def ioh_daily_demand(comb_df: pd.DataFrame, keys: list = None) -> pd.DataFrame:
+    """
+    Daily demand implied by the historical IOH snapshots: the drop in
+    ``In Stock Qty`` from one day to the next. Increases are receipts and
+    count as no sales; days that start out of stock are NaN (unknown
+    demand). ``comb_df`` must be sorted by ``keys`` and Date.
+    """
+    keys = keys or SERIES_KEYS
+    qty = pd.to_numeric(comb_df["In Stock Qty"], errors="coerce")
+    prev = qty.groupby([comb_df[k] for k in keys], sort=False).shift()
+    demand = (prev - qty).clip(lower=0).where(prev > 0)
+    return comb_df[keys + ["Date"]].assign(Demand=demand)
+
+
+def sales_daily_demand(sales_df: pd.DataFrame, comb_df: pd.DataFrame,
+                       keys: list = None) -> pd.DataFrame:
+    """
+    Daily demand from the per-day sales history (``Net Sold`` per SKU,
+    Location and Date). A day in the IOH history without a sales row is a
+    day without sales if the SKU was in stock and unknown demand (NaN) if it
+    was not. ``comb_df`` needs the ``Was In Stock`` flag of ``ioh_metrics``.
+    """
+    keys = keys or SERIES_KEYS
+    sold = sales_df[keys + ["Date", "Net Sold"]].copy()
+    sold["Date"] = pd.to_datetime(sold["Date"]).dt.normalize()
+    days = comb_df[keys + ["Date", "Was In Stock"]].copy()
+    days["Date"] = pd.to_datetime(days["Date"]).dt.normalize()
+    demand = days.merge(sold, on=keys + ["Date"], how="outer")
+    net = pd.to_numeric(demand["Net Sold"], errors="coerce")
+    in_stock = demand["Was In Stock"].fillna(False).astype(bool)
+    demand["Demand"] = net.fillna(0).where(in_stock | net.notna())
+    return demand[keys + ["Date", "Demand"]]
@@ -1,200 +1,309 @@
 import pandas as pd
 from openpyxl import load_workbook
 import os
+import logging
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
-import requests, json
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 
+from etl.cova import (
+    CovaClient,
+    TokenBucket,
+    DEFAULT_COMPANY_ID,
+    DEFAULT_ENTITIES,
+    DEFAULT_CLASSIFICATIONS,
+)
+from etl.checkpoint import DayCheckpoint, RunCheckpoint, params_key
+from etl.forecast import forecast_frame, ioh_daily_demand, sales_daily_demand
+from etl.daily_sales import SalesStore
+from etl.cube import MetricsCube, cube_path
+from etl.stock_runs import stock_run_metrics
+from etl.singleflight import SingleFlight
+from etl.writers import EXTENSIONS, EXCEL, RESERVED_NAMES, partition_name, report_format, write_report
+
 load_dotenv()  # reads COVA_USERNAME, COVA_PASSWORD, COVA_CLIENT from .env
 
-def generate_order(output_path: str, hist_days: int = 30, exclude_today: bool = False):
+logger = logging.getLogger(__name__)
+
+# the "Week" sales columns: the 7 days up to yesterday
+WEEK_DAYS = 7
+
+# runs in flight in this process, shared by identical concurrent requests
+_runs = SingleFlight()
+
+def generate_order(output_path: str, hist_days: int = 30, exclude_today: bool = False,
+                   company_id: int = DEFAULT_COMPANY_ID,
+                   entities: list = None,
+                   classifications: list = None,
+                   client: CovaClient = None,
+                   max_workers: int = 4,
+                   checkpoint_dir: str = None,
+                   resume: bool = True,
+                   cube_days: int = None,
+                   output_format: str = None,
+                   combined_sheet: bool = True,
+                   coverage_days: int = 14):
     """
     Authenticates to Cova, pulls historical IOH, computes metrics,
-    fetches 7-day & custom-range sales, merges everything, and writes
+    fetches daily & 7-day sales, merges everything, and writes
     one Excel sheet per location.
+
+    ``output_format`` ("xlsx", "parquet", "feather" or "csv.gz"; default:
+    from the extension of ``output_path``) picks how the report is written
+    (see ``etl.writers``); the columnar formats write a directory with one
+    file per location instead of a workbook. ``combined_sheet=False``
+    leaves out the All_Locations copy of the location sheets, which
+    halves the write for consumers that read the locations anyway.
+
+    ``company_id``, ``entities`` and ``classifications`` select the tenant
+    (they default to the original single-company setup). Pass ``client`` to
+    reuse an authenticated session and concurrency gate, as batch mode does;
+    ``max_workers`` bounds how many history days are requested at once.
+
+    The week and ``hist_days`` sales windows are summed from the per-day
+    sales history (see ``etl.daily_sales``), which also feeds the demand
+    forecast; the history always reaches back over the last week. The
+    forecast is fitted on whole days only (never today's) and its
+    ``Forecast per Day`` averages the ``coverage_days`` from today on, the
+    days an order placed now has to cover.
+
+    Every closed IOH and sales day is checkpointed under ``checkpoint_dir``
+    (default ``<output dir>/.checkpoints``), so a rerun after a failure only
+    fetches the days that are still missing. With ``resume`` the output of
+    each numbered step is also saved to a run directory keyed by the run's
+    parameters, and a rerun continues after the last completed step; the
+    run directory is removed once the report has been written.
+
+    The history is fetched for ``max(hist_days, cube_days)`` days and kept
+    as a prefix-sum cube next to the report (see ``etl.cube``), from which
+    the in-stock and sales totals of any window up to that length are read
+    without refetching; the report's own metrics use the last ``hist_days``.
     """
+    entities        = list(entities or DEFAULT_ENTITIES)
+    classifications = list(classifications or DEFAULT_CLASSIFICATIONS)
+    now = datetime.now()
+    # the history also covers the week up to yesterday, which the week
+    # sales columns are summed over
+    history_days = max(hist_days, cube_days or 0, WEEK_DAYS + (0 if exclude_today else 1))
+    # checked before any Cova call, so a missing pyarrow fails fast
+    output_format = report_format(output_path, output_format)
 
-    # ── Step 1: Authenticate ────────────────────────────────────────────────
-    USER = os.getenv("COVA_USERNAME")
-    PWD  = os.getenv("COVA_PASSWORD")
-    KEY  = os.getenv("COVA_CLIENT")
-    auth = requests.post(
-        "https://signinbackend.iqmetrix.net/v1/oauth2/token",
-        json={
-            "UsernameOrEmailAddress": USER,
-            "Password":               PWD,
-            "ClientKey":              KEY
-        },
-        headers={"Content-Type": "application/json"}
-    )
-    auth.raise_for_status()
-    token = auth.json()["token"]
-    bearer = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type":  "application/json"
+    if checkpoint_dir is None:
+        checkpoint_dir = os.path.join(os.path.dirname(output_path), ".checkpoints")
+    tenant_params = {
+        "CompanyId":       company_id,
+        "Entities":        sorted(entities),
+        "Classifications": sorted(classifications)
     }
-    now = datetime.now()
+    ioh_days = DayCheckpoint(checkpoint_dir, "ioh", params_key(tenant_params))
+    sales_days = DayCheckpoint(checkpoint_dir, "sales", params_key(tenant_params))
+    stock_runs_path = os.path.join(checkpoint_dir, "stock_runs", f"{params_key(tenant_params)}.pkl")
+    run = None
+    if resume:
+        run = RunCheckpoint(checkpoint_dir, {
+            **tenant_params,
+            "HistDays":     hist_days,
+            "HistoryDays":  history_days,
+            "ExcludeToday": exclude_today,
+            "CoverageDays": coverage_days,
+            "RunDate":      now.strftime("%Y-%m-%d")
+        })
+
+    steps = {}
+
+    def checkpointed(step: str, compute):
+        # reuse a step's saved output from an earlier, failed run; a step
+        # needed twice in this run is only loaded or computed once
+        if step in steps:
+            return steps[step]
+        if run is not None and run.has(step):
+            try:
+                result = run.load(step)
+                logger.info("Resuming %s from %s", step, run.directory)
+                steps[step] = result
+                return result
+            except FileNotFoundError:
+                pass  # just cleared by a finished run with the same parameters
+        result = compute()
+        if run is not None:
+            run.save(step, result)
+        steps[step] = result
+        return result
+
+    # ── Step 1: Authenticate ────────────────────────────────────────────────
+    # deferred until a step actually needs Cova, so a fully resumed run
+    # never signs in
+    def cova() -> CovaClient:
+        nonlocal client
+        if client is None:
+            client = CovaClient(company_id, limiter=TokenBucket())
+        return client
 
     # ── Step 2: Historical IOH ─────────────────────────────────────────────
     def fetch_ioh_for_date(dt: datetime) -> pd.DataFrame:
-        resp = requests.post(
-            "https://covareportservice-prod-westus.azurewebsites.net/"
-            "v2/Companies/131096/Reports/"
-            "1c3c6f4a-d91b-40fa-880f-3852b68de20e/Execute",
-            json={
-                "ReportId":  "1c3c6f4a-d91b-40fa-880f-3852b68de20e",
-                "TimeZone":  "America/Edmonton",
-                "Parameters": json.dumps({
-                    "CompanyId":       131096,
-                    "Date":            dt.strftime("%Y-%m-%d"),
-                    "Entities":        [230791, 167209, 237603],
-                    "Classifications": [3331],
-                    "InStockOnly":     False
-                })
-            },
-            headers=bearer
+        # past days never change, so a saved copy is as good as a refetch
+        closed = dt.date() < now.date()
+        if closed:
+            cached = ioh_days.load(dt)
+            if cached is not None:
+                return cached
+        df = cova().execute_frame(
+            "1c3c6f4a-d91b-40fa-880f-3852b68de20e",
+            {
+                "CompanyId":       company_id,
+                "Date":            dt.strftime("%Y-%m-%d"),
+                "Entities":        entities,
+                "Classifications": classifications,
+                "InStockOnly":     False
+            }
         )
-        resp.raise_for_status()
-        body = resp.json()
-        if not body:
-            return pd.DataFrame()
-        df = pd.DataFrame(body[0].get("Data", []))
-        df["Date"] = pd.to_datetime(dt)
+        if not df.empty:
+            df["Date"] = pd.to_datetime(dt)
+        if closed:
+            ioh_days.save(dt, df)
         return df
 
-    # build combined historical IOH
-    last_day = now - timedelta(days=1) if exclude_today else now
-    ioh_frames = []
-    for i in range(hist_days):
-        day = last_day - timedelta(days=i)
-        df_day = fetch_ioh_for_date(day)
-        if not df_day.empty:
-            ioh_frames.append(df_day)
-    comb_df = pd.concat(ioh_frames, ignore_index=True) if ioh_frames else pd.DataFrame()
-    if comb_df.empty:
-        raise RuntimeError("No historical IOH data fetched")
+    def history_window() -> list:
+        # the days of the IOH and sales history, newest first
+        last_day = now - timedelta(days=1) if exclude_today else now
+        return [last_day - timedelta(days=i) for i in range(history_days)]
+
+    def recent(df: pd.DataFrame) -> pd.DataFrame:
+        # the rows of the last hist_days days of the history
+        if df.empty:
+            return df
+        first_day = pd.Timestamp(history_window()[hist_days - 1].date())
+        return df[pd.to_datetime(df["Date"]) >= first_day]
+
+    def historical_ioh() -> pd.DataFrame:
+        # build combined historical IOH; days are independent, so fetch them
+        # concurrently (the client's gate caps the real number in flight)
+        cova()
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            ioh_frames = [df_day for df_day in pool.map(fetch_ioh_for_date, history_window())
+                          if not df_day.empty]
+        comb_df = pd.concat(ioh_frames, ignore_index=True) if ioh_frames else pd.DataFrame()
+        if comb_df.empty:
+            raise RuntimeError("No historical IOH data fetched")
+        return comb_df
 
     # ── Step 3: Compute IOH metrics ─────────────────────────────────────────
-    comb_df.sort_values(["SKU","Location","Date"], inplace=True)
-    comb_df["Was In Stock"] = comb_df["In Stock Qty"] > 0
-    comb_df["Stock Change"]  = (
-        comb_df.groupby(["SKU","Location"])["Was In Stock"]
-               .diff().fillna(0).astype(int)
-    )
-
-    last_in = (
-        comb_df[comb_df["Was In Stock"]]
-        .groupby(["SKU","Location"])["Date"]
-        .max().reset_index(name="Last In Stock Date")
-    )
-
-    def avg_cycle_days(g):
-        s = g[g["Stock Change"] == 1]["Date"].reset_index(drop=True)
-        e = g[g["Stock Change"] == -1]["Date"].reset_index(drop=True)
-        n = min(len(s), len(e))
-        if n == 0:
-            return 0.0
-        durs = (e[:n].values - s[:n].values) \
-               .astype("timedelta64[D]").astype(int)
-        durs = durs[durs > 0]
-        return float(durs.mean()) if len(durs) else 0.0
-
-    avg   = comb_df.groupby(["SKU","Location"]).apply(avg_cycle_days) \
-                   .reset_index(name="Avg Days In Stock Per Cycle")
-    var   = comb_df.groupby(["SKU","Location"])["In Stock Qty"] \
-                   .std().reset_index(name="Stock Variability")
-    freq  = comb_df[comb_df["Stock Change"]==-1] \
-                   .groupby(["SKU","Location"]).size() \
-                   .reset_index(name="Stockout Frequency")
-
-    comb_df["Days in Stock Index"] = comb_df["Was In Stock"].astype(int)
-    totals = (
-        comb_df.groupby(["SKU","Location"], as_index=False)
-               .agg({
-                   "Days in Stock Index":"sum",
-                   "In Stock Qty":       "sum"
-               })
-               .rename(columns={
-                   "Days in Stock Index":"Total Days in Stock",
-                   "In Stock Qty":       "Total In Stock Qty"
-               })
-    )
-    grouped = totals.merge(last_in, on=["SKU","Location"], how="left")
-    for dfm in (avg, var, freq):
-        grouped = grouped.merge(dfm, on=["SKU","Location"], how="left")
+    def metrics_cube() -> MetricsCube:
+        # the whole history goes into the cube, the metrics use hist_days
+        return MetricsCube.from_history(checkpointed("step2", historical_ioh),
+                                        checkpointed("step5", daily_sales))
+
+    def ioh_metrics(comb_df: pd.DataFrame, sales_df: pd.DataFrame, cube: MetricsCube) -> pd.DataFrame:
+        # stock changes, stockouts, cycles and last in-stock day of the
+        # hist_days window, read from the run-length encoded in-stock
+        # intervals of each series; the index is kept with the checkpoints
+        # and only extended by the closed days it has not seen
+        runs  = stock_run_metrics(comb_df, since=history_window()[hist_days - 1].date(),
+                                  path=stock_runs_path,
+                                  closed_until=(now - timedelta(days=1)).date())
+
+        comb_df = recent(comb_df).sort_values(["SKU","Location","Date"])
+        sales_df = recent(sales_df)
+
+        comb_df["Was In Stock"] = comb_df["In Stock Qty"] > 0
+
+        var   = comb_df.groupby(["SKU","Location"])["In Stock Qty"] \
+                       .std().reset_index(name="Stock Variability")
+
+        totals = cube.window_frame(hist_days, end=history_window()[0].date())[
+            ["SKU","Location","Total Days in Stock","Total In Stock Qty"]
+        ]
+        # day-of-week aware demand forecast, fitted on all series at once;
+        # without a daily sales history, demand is read off the IOH drops
+        if sales_df.empty:
+            demand = ioh_daily_demand(comb_df)
+        else:
+            demand = sales_daily_demand(sales_df, comb_df)
+        # today's sales and stock are still moving: a partial day would
+        # read as a slow one and pull the level down
+        today = pd.Timestamp(now.date())
+        demand = demand[pd.to_datetime(demand["Date"]) < today]
+        last_fitted = pd.to_datetime(demand["Date"]).max() if len(demand) else today - pd.Timedelta(days=1)
+        forecast = forecast_frame(demand, "Demand", horizon=coverage_days,
+                                  start=(today - last_fitted).days)
+
+        grouped = totals.merge(runs, on=["SKU","Location"], how="left")
+        for dfm in (var, forecast):
+            grouped = grouped.merge(dfm, on=["SKU","Location"], how="left")
+        return grouped
 
     # ── Step 4: Current IOH ─────────────────────────────────────────────────
-    inv = requests.post(
-        "https://covareportservice-prod-westus.azurewebsites.net/"
-        "v2/Companies/131096/Reports/"
-        "a8b03840-2e18-4c11-bdb3-6413b972d391/Execute",
-        json={
-            "ReportId":  "a8b03840-2e18-4c11-bdb3-6413b972d391",
-            "TimeZone":  "America/Edmonton",
-            "Parameters": json.dumps({
-                "CompanyId":       131096,
-                "Entities":        [230791,167209,237603],
-                "Classifications": [3331],
+    def current_ioh() -> pd.DataFrame:
+        ioh_df = cova().execute_frame(
+            "a8b03840-2e18-4c11-bdb3-6413b972d391",
+            {
+                "CompanyId":       company_id,
+                "Entities":        entities,
+                "Classifications": classifications,
                 "InStockOnly":     False,
                 "IncludeLocation": True
-            })
-        },
-        headers=bearer
-    )
-    inv.raise_for_status()
-    ioh_df = pd.DataFrame(inv.json()[0].get("Data", [])) if inv.json() else pd.DataFrame()
-    # fill missing first/last received dates to next Thursday
-    to_thu = (3 - now.weekday()) % 7
-    fill_date = (now + timedelta(days=to_thu)).date()
-    for c in ["First Received Date","Last Received Date"]:
-        if c in ioh_df:
-            ioh_df[c] = pd.to_datetime(ioh_df[c]).dt.date.fillna(fill_date)
-
-    # ── Step 5: Sales‐fetch helper ───────────────────────────────────────────
+            }
+        )
+        # fill missing first/last received dates to next Thursday
+        to_thu = (3 - now.weekday()) % 7
+        fill_date = (now + timedelta(days=to_thu)).date()
+        for c in ["First Received Date","Last Received Date"]:
+            if c in ioh_df:
+                ioh_df[c] = pd.to_datetime(ioh_df[c]).dt.date.fillna(fill_date)
+        return ioh_df
+
+    # ── Step 5: Sales‐fetch helper & daily sales history ────────────────────
     def fetch_sales(report_id: str,
                     rename_map: dict,
                     dr_type: int,
-                    start_date: datetime = None,
-                    end_date:   datetime = None) -> pd.DataFrame:
-        # determine window
-        if dr_type == 15:
-            sd = ed = datetime.now()
-        else:
-            sd, ed = start_date, end_date
-
+                    start_date: datetime,
+                    end_date:   datetime) -> pd.DataFrame:
         params = {
-            "CompanyId": 131096,
+            "CompanyId": company_id,
             "DateRange": {
-                "StartDate":     sd.strftime("%Y-%m-%dT00:00:00"),
-                "EndDate":       ed.strftime("%Y-%m-%dT23:59:59"),
+                "StartDate":     start_date.strftime("%Y-%m-%dT00:00:00"),
+                "EndDate":       end_date.strftime("%Y-%m-%dT23:59:59"),
                 "DateRangeType": dr_type
             },
-            "Entities":        [167209,237603,230791],
-            "Classifications": [3331],
+            "Entities":        entities,
+            "Classifications": classifications,
             "SaleType":        0,
             "UseType":         0,
             "DeliveryType":    0
         }
-        payload = {
-            "ReportId":   report_id,
-            "TimeZone":   "America/Edmonton",
-            "Parameters": json.dumps(params)
-        }
-        r = requests.post(
-            f"https://covareportservice-prod-westus.azurewebsites.net/"
-            f"v2/Companies/131096/Reports/{report_id}/Execute",
-            json=payload,
-            headers=bearer
-        )
-        r.raise_for_status()
-        body = r.json()
-        if not body:
-            return pd.DataFrame()
-        df = pd.DataFrame(body[0].get("Data", []))
+        df = cova().execute_frame(report_id, params)
         return df.rename(columns=rename_map)
 
-    # ── Step 6: Fetch 7-day & custom‐range sales ────────────────────────────
+    def fetch_sales_for_date(dt: datetime) -> pd.DataFrame:
+        # like the IOH history, closed days are fetched once and kept
+        closed = dt.date() < now.date()
+        if closed:
+            cached = sales_days.load(dt)
+            if cached is not None:
+                return cached
+        df = fetch_sales(
+            "c1ec9df0-db1e-4698-8d1c-dd640bdbbc04",
+            {},
+            9,
+            start_date=dt,
+            end_date=dt
+        )
+        if not df.empty:
+            df["Date"] = pd.to_datetime(dt.date())
+        if closed:
+            sales_days.save(dt, df)
+        return df
+
+    def daily_sales() -> pd.DataFrame:
+        # one sales report per history day, fetched concurrently
+        cova()
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            frames = [df_day for df_day in pool.map(fetch_sales_for_date, history_window())
+                      if not df_day.empty]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+    # ── Step 6: 7-day & custom‐range sales from the daily history ──────────
     week_map = {
         "Net Sold":          "Week Net Sold",
         "Avg Sold At Price": "Week Avg Price",
@@ -205,72 +314,83 @@ def generate_order(output_path: str, hist_days: int = 30, exclude_today: bool =
         "Avg Sold At Price": f"{hist_days}d Avg Price",
         "Total Cost":        f"{hist_days}d Total Cost"
     }
-
-    # 7-day (excl today) → dr_type=15, no start/end args
-    week_df = fetch_sales(
-        "c1ec9df0-db1e-4698-8d1c-dd640bdbbc04",
-        week_map,
-        15
-    )
-
-    # custom range → dr_type=9, must compute start_sel/end_sel first
-    sel_end   = now - timedelta(days=1) if exclude_today else now
-    sel_start = sel_end - timedelta(days=hist_days - 1)
-    sel_df = fetch_sales(
-        "c1ec9df0-db1e-4698-8d1c-dd640bdbbc04",
-        sel_map,
-        9,
-        start_date=sel_start,
-        end_date=sel_end
-    )
     needed = ["Location","SKU"] + list(sel_map.values())
-    if sel_df.empty:
-        sel_df = pd.DataFrame(columns=needed)
-    else:
-        for col in needed:
-            if col not in sel_df.columns:
-                sel_df[col] = 0
+
+    def period_sales(sales_df: pd.DataFrame):
+        # both windows are summed locally from the daily history, with no
+        # extra Cova call: the 7 days up to yesterday (what the aggregate
+        # report's DateRangeType 15 returned) and the hist_days range
+        if sales_df.empty:
+            return (pd.DataFrame(columns=["Location","SKU"] + list(week_map.values())),
+                    pd.DataFrame(columns=needed))
+        store = SalesStore.from_frame(sales_df)
+        yesterday = (now - timedelta(days=1)).date()
+        week_df = store.window_frame(WEEK_DAYS, end=yesterday).rename(columns=week_map)
+
+        sel_end = history_window()[0]
+        sel_df = store.window_frame(hist_days, end=sel_end.date()).rename(columns=sel_map)
+        if sel_df.empty:
+            sel_df = pd.DataFrame(columns=needed)
+        else:
+            for col in needed:
+                if col not in sel_df.columns:
+                    sel_df[col] = 0
+        return week_df, sel_df
 
     # ── Step 7: Merge & finalize ───────────────────────────────────────────
-    merged = (
-        ioh_df
-        .merge(week_df[["Location","SKU"] + list(week_map.values())],
-               on=["Location","SKU"], how="left")
-        .merge(sel_df[needed], on=["Location","SKU"], how="left")
-        .fillna({**{v:0 for v in week_map.values()},
-                 **{v:0 for v in sel_map.values()}})
-    )
-    merged["Supplier SKU"] = merged["Supplier SKU"].apply(
-        lambda s: next((x for x in str(s).split(",") if x.startswith("CNB-")), "")
-    )
-    final_df = merged.merge(grouped, on=["Location","SKU"], how="left")
-    final_df["Sales per Day"] = (
-        final_df[f"{hist_days}d Net Sold"]
-        / final_df["Total Days in Stock"].replace(0, np.nan)
-    )
-
-    # ── Step 8: Write to Excel ─────────────────────────────────────────────
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    print(f"Writing data to {output_path}")
-    
-    # Add a debug summary sheet
-    with pd.ExcelWriter(output_path, engine="openpyxl", datetime_format="yyyy-mm-dd") as writer:
-        # First write individual location sheets
-        locations = final_df["Location"].unique()
-        print(f"Found {len(locations)} unique locations: {locations}")
-        
-        for loc in locations:
-            sheet = str(loc)[:31].replace(":","-").replace("/","-")
-            print(f"Writing sheet for location: {loc} (sheet name: {sheet})")
-            
-            loc_df = final_df[final_df["Location"]==loc]
-            print(f"  - {len(loc_df)} rows, columns: {loc_df.columns.tolist()}")
-            
-            loc_df.to_excel(writer, sheet_name=sheet, index=False)
+    def merged_report() -> pd.DataFrame:
+        # each input is only loaded or fetched when this step has to run;
+        # the daily sales feed both the forecast and the hist_days window
+        sales_df = checkpointed("step5", daily_sales)
+        grouped = checkpointed("step3", lambda: ioh_metrics(checkpointed("step2", historical_ioh),
+                                                            sales_df, cube))
+        ioh_df = checkpointed("step4", current_ioh)
+        week_df, sel_df = checkpointed("step6", lambda: period_sales(sales_df))
+
+        merged = (
+            ioh_df
+            .merge(week_df[["Location","SKU"] + list(week_map.values())],
+                   on=["Location","SKU"], how="left")
+            .merge(sel_df[needed], on=["Location","SKU"], how="left")
+            .fillna({**{v:0 for v in week_map.values()},
+                     **{v:0 for v in sel_map.values()}})
+        )
+        merged["Supplier SKU"] = merged["Supplier SKU"].apply(
+            lambda s: next((x for x in str(s).split(",") if x.startswith("CNB-")), "")
+        )
+        final_df = merged.merge(grouped, on=["Location","SKU"], how="left")
+        final_df["Sales per Day"] = (
+            final_df[f"{hist_days}d Net Sold"]
+            / final_df["Total Days in Stock"].replace(0, np.nan)
+        )
+        return final_df
+
+    # rebuilt (from the saved steps, when resuming) and written on every
+    # run, as the report path may differ from the one of the resumed run
+    cube = metrics_cube()
+    cube.save(cube_path(output_path))
+    final_df = checkpointed("step7", merged_report)
+
+    # ── Step 8: Write the report ───────────────────────────────────────────
+    logger.info("Writing data to %s (%s)", output_path, output_format)
+    # one pass over the rows splits them by location, in order of first
+    # appearance, instead of a full-frame comparison per location
+    by_location = final_df.groupby("Location", sort=False)
+    logger.info("Found %d unique locations", by_location.ngroups)
+
+    def report_sheets():
+        # First write individual location sheets; names cut to the same
+        # 31 characters are told apart by a suffix
+        taken = {name.lower() for name in RESERVED_NAMES}
+        for loc, loc_df in by_location:
+            sheet = partition_name(loc, taken)
+            logger.debug("Writing sheet %s for location %s: %d rows", sheet, loc, len(loc_df))
+            yield sheet, loc_df
         
         # Also write a combined sheet with all data
-        print("Writing combined 'All_Locations' sheet")
-        final_df.to_excel(writer, sheet_name="All_Locations", index=False)
+        if combined_sheet:
+            logger.debug("Writing combined 'All_Locations' sheet")
+            yield "All_Locations", final_df
         
         # Write a summary sheet with metadata
         summary_data = {
@@ -284,14 +404,48 @@ def generate_order(output_path: str, hist_days: int = 30, exclude_today: bool =
             ],
             "Value": [
                 datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                len(locations),
+                by_location.ngroups,
                 len(final_df["SKU"].unique()),
                 hist_days,
                 "Yes" if exclude_today else "No",
                 ", ".join(final_df.columns)
             ]
         }
-        summary_df = pd.DataFrame(summary_data)
-        summary_df.to_excel(writer, sheet_name="Summary", index=False)
-        
-    print(f"Excel file written successfully to {output_path}")
+        yield "Summary", pd.DataFrame(summary_data)
+
+    write_report(report_sheets(), output_path, output_format)
+    logger.info("Report written successfully to %s", output_path)
+    if run is not None:
+        run.clear()
+
+
+def report_path(output_dir: str, **params) -> str:
+    """
+    The report of a parameter set:
+    ``<output_dir>/Final_Report-<params_key><ext>``, the extension following
+    ``output_format`` (default .xlsx).
+    """
+    ext = EXTENSIONS[params.get("output_format") or EXCEL]
+    return os.path.join(output_dir, f"Final_Report-{params_key(params)}{ext}")
+
+
+def generate_shared(output_dir: str, **params):
+    """
+    ``generate_order`` for interactive use by several users at once.
+
+    The report goes to its own ``report_path`` per parameter set, so runs
+    with different parameters never write the same file, and concurrent
+    calls with identical parameters in this process wait on one run (see
+    ``etl.singleflight``) rather than each querying Cova. Returns
+    ``(output_path, shared)``; ``shared`` is True when another caller's
+    run produced the report.
+
+    Runs with the same parameters in other processes are not merged, but
+    are safe: every run stages the report, its cube and its checkpoints
+    under names of its own and publishes them with an atomic rename
+    (see ``etl.checkpoint.atomic_write`` and ``etl.writers``), so readers
+    see one complete report and the last run to finish wins.
+    """
+    output_path = report_path(output_dir, **params)
+    _, shared = _runs.do(output_path, generate_order, output_path, **params)
+    return output_path, shared
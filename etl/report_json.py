@@ -0,0 +1,125 @@
+"""
+Decoding and ingestion of Cova report responses.
+
+``resp.json()`` keeps the raw text, the whole Python object tree and then
+the DataFrame alive at the same time. When ``ijson`` is installed the
+``Data`` rows are instead parsed one at a time straight off the socket into
+per-column buffers, so peak memory stays close to the final frame.
+
+Whole-body decoding goes through a pluggable decoder: the fastest installed
+library among ``orjson`` and ``ujson``, else the stdlib ``json``. Set
+``COVA_JSON_DECODER`` to force one by name.
+"""
+import os
+import json
+import importlib
+import pandas as pd
+
+try:
+    import ijson
+except ImportError:  # optional dependency: fall back to whole-body decoding
+    ijson = None
+
+
+def _installed_decoders() -> dict:
+    decoders = {}
+    for name in ("orjson", "ujson"):  # fastest first
+        try:
+            decoders[name] = importlib.import_module(name).loads
+        except ImportError:
+            pass
+    decoders["json"] = json.loads
+    return decoders
+
+
+# name -> loads(bytes) for every backend importable here, fastest first
+DECODERS = _installed_decoders()
+
+# ijson prefixes of a result object in "[{"Data": [row, row, ...]}, ...]"
+# and of each of its rows
+RESULT_PREFIX = "item"
+ROWS_PREFIX = "item.Data.item"
+
+# raised when a streamed body ends before its JSON does (a cut connection)
+INCOMPLETE_BODY_ERRORS = (ijson.IncompleteJSONError,) if ijson is not None else ()
+
+
+def streaming_available() -> bool:
+    return ijson is not None
+
+
+def get_decoder(name: str = None):
+    """
+    Returns a ``loads(bytes) -> object`` callable. ``name`` (or the
+    ``COVA_JSON_DECODER`` environment variable) picks a specific backend;
+    otherwise the fastest installed one is used.
+    """
+    name = name or os.getenv("COVA_JSON_DECODER") or "auto"
+    if name == "auto":
+        return next(iter(DECODERS.values()))
+    if name not in DECODERS:
+        raise ValueError(f"JSON decoder '{name}' is not installed. Available: {list(DECODERS)}")
+    return DECODERS[name]
+
+
+def frame_from_body(body) -> pd.DataFrame:
+    """The ``Data`` rows of the first result of a decoded report body."""
+    if not body:
+        return pd.DataFrame()
+    return pd.DataFrame(body[0].get("Data", []))
+
+
+def frame_from_rows(rows) -> pd.DataFrame:
+    """
+    Builds a DataFrame from an iterable of row dicts through columnar
+    buffers, without ever materialising the list of rows. Columns keep their
+    first-seen order and rows missing a key get None, like
+    ``pd.DataFrame(list_of_dicts)``.
+    """
+    columns = {}
+    n_rows = 0
+    for row in rows:
+        for key, value in row.items():
+            buf = columns.get(key)
+            if buf is None:
+                buf = columns[key] = [None] * n_rows
+            buf.append(value)
+        n_rows += 1
+        if len(row) != len(columns):
+            for buf in columns.values():
+                if len(buf) < n_rows:
+                    buf.append(None)
+    return pd.DataFrame(columns)
+
+
+def first_result_rows(stream):
+    """
+    Yields the ``Data`` rows of the first result object of a report body
+    read from ``stream``, like ``frame_from_body``, and stops reading at the
+    end of that object.
+    """
+    builder = None
+    for prefix, event, value in ijson.parse(stream, use_float=True):
+        if builder is not None:
+            builder.event(event, value)
+            if prefix == ROWS_PREFIX and event == "end_map":
+                yield builder.value
+                builder = None
+        elif prefix == ROWS_PREFIX and event == "start_map":
+            builder = ijson.ObjectBuilder()
+            builder.event(event, value)
+        elif prefix == RESULT_PREFIX and event == "end_map":
+            return
+
+
+def stream_report_frame(resp) -> pd.DataFrame:
+    """
+    Parses the ``Data`` rows of a streamed (``stream=True``) report response.
+    Yields the same rows as ``frame_from_body(resp.json())``: any result
+    objects after the first are left unread.
+    """
+    resp.raw.decode_content = True  # let urllib3 undo gzip/deflate
+    try:
+        return frame_from_rows(first_result_rows(resp.raw))
+    finally:
+        resp.close()
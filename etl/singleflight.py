@@ -0,0 +1,47 @@
+"""
+Process-wide de-duplication of identical in-flight ETL runs.
+
+Every Streamlit session runs in the same server process, so when several
+buyers press "Run ETL" with the same parameters at once, ``SingleFlight``
+lets the first call run and makes the others wait for its result instead
+of sending Cova the same report requests again. A run that has finished is
+forgotten: the next request for the same key starts a fresh one.
+"""
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """
+    Maps a key to the call currently running for it. ``do`` either starts
+    the call or joins the one in flight; its exception, if any, is raised
+    in every caller that joined.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key: str, fn, *args, **kwargs):
+        """
+        Runs ``fn(*args, **kwargs)`` unless a call for ``key`` is already
+        in flight. Returns ``(result, shared)``, where ``shared`` is True
+        for callers that waited on another caller's run.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+        if not leader:
+            return future.result(), True
+
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return future.result(), False
@@ -0,0 +1,256 @@
+"""
+Run-length encoded in-stock / out-of-stock intervals of every SKU/location.
+
+Instead of keeping the daily ``Was In Stock`` flags, ``StockRuns`` keeps one
+open run per series (its state and first / last observed day) and the list
+of closed runs. Appending a day updates all series at once and only adds a
+closed run where a series changes state, so cycle lengths, stockout counts,
+the last in-stock day and the current out-of-stock stretch are read from a
+few runs per series rather than from its daily rows.
+
+Days on which a series was not observed (NaN) do not break its run, just as
+the IOH history only compares consecutive rows of a series.
+
+The index is kept on disk between ETL runs (see ``stock_run_metrics``):
+each run appends only the closed days the saved index has not seen yet,
+and the metrics of the ``hist_days`` window are read from the runs that
+reach into it. Closed runs that end before the first day of the history
+are dropped, so the index stays as long as the history, not as long as it
+has been kept.
+"""
+import os
+import logging
+import numpy as np
+import pandas as pd
+
+from etl.checkpoint import atomic_write
+from etl.forecast import SERIES_KEYS, series_matrix
+
+logger = logging.getLogger(__name__)
+
+UNSEEN = -1
+OUT, IN = 0, 1
+
+
+class StockRuns:
+    """
+    Interval index over the series of a (series × day) history.
+
+    Day numbers count from ``origin``. A closed run records its series,
+    state, first and last observed day, ``until``, the day the next run
+    started (the day of the stock change that closed it), and ``after``,
+    the last observed day of the run before it (-1 for a series' first
+    run). ``series`` optionally labels the rows (e.g. SKU and Location).
+    ``kept_from`` is the first day whose closed runs are all still kept
+    (see ``prune``); no window may start before it.
+    """
+
+    def __init__(self, n_series: int, origin: pd.Timestamp, series: pd.DataFrame = None):
+        self.origin = pd.Timestamp(origin).normalize()
+        self.series = series
+        self.last_day = -1
+        self.kept_from = 0
+        self.state = np.full(n_series, UNSEEN, dtype=np.int8)
+        self.first = np.zeros(n_series, dtype=np.int64)
+        self.last = np.zeros(n_series, dtype=np.int64)
+        self.after = np.full(n_series, -1, dtype=np.int64)
+        self._closed = []
+        self._runs = None
+
+    @classmethod
+    def from_matrix(cls, in_stock: np.ndarray, days: pd.DatetimeIndex) -> "StockRuns":
+        """Builds the index from a (series × day) matrix of 1 / 0 / NaN flags."""
+        runs = cls(in_stock.shape[0], days[0] if len(days) else pd.Timestamp.today())
+        for j in range(in_stock.shape[1]):
+            runs.append(in_stock[:, j])
+        return runs
+
+    @property
+    def last_date(self) -> pd.Timestamp:
+        """Date of the last appended day (the day before ``origin`` if none)."""
+        return self.origin + pd.Timedelta(days=self.last_day)
+
+    def add_series(self, n: int):
+        """Adds ``n`` series, not yet observed, after the existing ones."""
+        self.state = np.r_[self.state, np.full(n, UNSEEN, dtype=np.int8)]
+        self.first = np.r_[self.first, np.zeros(n, dtype=np.int64)]
+        self.last = np.r_[self.last, np.zeros(n, dtype=np.int64)]
+        self.after = np.r_[self.after, np.full(n, -1, dtype=np.int64)]
+
+    def append(self, in_stock: np.ndarray, day: int = None):
+        """
+        Adds one day of flags (1 in stock, 0 out of stock, NaN not
+        observed), one per series; ``day`` defaults to the day after the
+        last appended one. Days must be appended in order.
+        """
+        day = self.last_day + 1 if day is None else int(day)
+        if day <= self.last_day:
+            raise ValueError(f"Day {day} is not after the last appended day {self.last_day}")
+        seen = ~np.isnan(in_stock)
+        state = np.where(seen, in_stock > 0, False).astype(np.int8)
+
+        changed = seen & (self.state != UNSEEN) & (self.state != state)
+        if changed.any():
+            idx = np.nonzero(changed)[0]
+            self._closed.append(np.stack([
+                idx, self.state[idx], self.first[idx], self.last[idx],
+                np.full(len(idx), day), self.after[idx]
+            ], axis=1))
+            self.after[idx] = self.last[idx]
+            self._runs = None
+        started = seen & ((self.state == UNSEEN) | changed)
+        self.first[started] = day
+        self.state[seen] = state[seen]
+        self.last[seen] = day
+        self.last_day = day
+
+    def append_date(self, in_stock: np.ndarray, date):
+        """``append`` for a calendar date."""
+        self.append(in_stock, self.day(date))
+
+    def day(self, date) -> int:
+        """Day number of a calendar date."""
+        return (pd.Timestamp(date).normalize() - self.origin).days
+
+    @property
+    def closed(self) -> np.ndarray:
+        """Closed runs as rows of (series, state, first, last, until, after)."""
+        if self._runs is None:
+            self._runs = np.concatenate(self._closed) if self._closed else np.empty((0, 6), dtype=np.int64)
+            self._closed = [self._runs] if len(self._runs) else []
+        return self._runs
+
+    def prune(self, before: int):
+        """Drops the closed runs whose last observed day is before day ``before``."""
+        runs = self.closed
+        self._runs = runs[runs[:, 3] >= before]
+        self._closed = [self._runs] if len(self._runs) else []
+        self.kept_from = max(self.kept_from, before)
+
+    def _count(self, mask: np.ndarray, weights=None) -> np.ndarray:
+        runs = self.closed
+        return np.bincount(runs[mask, 0], weights=None if weights is None else weights[mask],
+                           minlength=len(self.state))
+
+    def stockouts(self, since: int = 0) -> np.ndarray:
+        """
+        Times each series went from in stock to out of stock, counting the
+        changes whose in-stock observation is on or after day ``since``.
+        """
+        runs = self.closed
+        return self._count((runs[:, 1] == IN) & (runs[:, 3] >= since))
+
+    def avg_cycle_days(self, since: int = 0) -> np.ndarray:
+        """
+        Mean length in days of the complete in-stock cycles (from a
+        restock to the next stockout) of each series; 0.0 without one.
+        From ``since`` on, only restocks whose previous out-of-stock
+        observation is on or after that day count.
+        """
+        runs = self.closed
+        complete = (runs[:, 1] == IN) & (runs[:, 5] >= max(since, 0))
+        lengths = (runs[:, 4] - runs[:, 2]).astype(float)
+        n = self._count(complete)
+        total = self._count(complete, lengths)
+        return np.divide(total, n, out=np.zeros(len(n)), where=n > 0)
+
+    def last_in_stock(self, since: int = 0) -> np.ndarray:
+        """Day number of the last in-stock observation of each series on or after ``since``; -1 if none."""
+        runs = self.closed
+        last = np.full(len(self.state), -1, dtype=np.int64)
+        in_runs = runs[(runs[:, 1] == IN) & (runs[:, 3] >= since)]
+        np.maximum.at(last, in_runs[:, 0], in_runs[:, 3])
+        return np.where((self.state == IN) & (self.last >= since), self.last, last)
+
+    def days_out_of_stock(self) -> np.ndarray:
+        """Days each series has been out of stock up to the last appended day; 0 if in stock."""
+        return np.where(self.state == OUT, self.last_day - self.first + 1, 0)
+
+    def dates(self, day_numbers: np.ndarray) -> pd.DatetimeIndex:
+        """Calendar dates of day numbers, NaT for -1."""
+        dates = self.origin + pd.to_timedelta(day_numbers, unit="D")
+        return dates.where(day_numbers >= 0)
+
+    def save(self, path: str):
+        self.closed  # one array of closed runs pickles smaller than many
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        atomic_write(path, lambda tmp_path: pd.to_pickle(self, tmp_path))
+
+    @staticmethod
+    def load(path: str) -> "StockRuns":
+        return pd.read_pickle(path)
+
+
+def _update(runs: StockRuns, series: pd.DataFrame, days: pd.DatetimeIndex,
+            values: np.ndarray, keys: list) -> np.ndarray:
+    # rows of ``series`` in ``runs`` (adding the new ones), then the days
+    # of ``values`` the index has not seen yet
+    known = pd.MultiIndex.from_frame(runs.series[keys])
+    pos = known.get_indexer(pd.MultiIndex.from_frame(series[keys]))
+    new = pos < 0
+    if new.any():
+        pos[new] = len(runs.series) + np.arange(new.sum())
+        runs.add_series(int(new.sum()))
+        runs.series = pd.concat([runs.series, series[new]], ignore_index=True)
+    column = np.full(len(runs.series), np.nan)
+    for j, day in enumerate(days):
+        if day > runs.last_date:
+            column[:] = np.nan
+            column[pos] = values[:, j]
+            runs.append_date(column, day)
+    return pos
+
+
+def stock_run_metrics(comb_df: pd.DataFrame, keys: list = None, since=None,
+                      path: str = None, closed_until=None) -> pd.DataFrame:
+    """
+    Stock-cycle metrics per series of the historical IOH rows (the keys,
+    Date and In Stock Qty): Last In Stock Date, Avg Days In Stock Per
+    Cycle, Stockout Frequency and Days Out of Stock.
+
+    ``since`` (a date) limits the first three to the window from that day
+    to the last day of ``comb_df``; Days Out of Stock is the whole current
+    stretch. With ``path``, the index saved there is extended with the
+    days up to ``closed_until`` (days that can no longer change) it has
+    not seen and saved again, and the later days are only added for this
+    call. The saved index is rebuilt when ``comb_df`` does not reach back
+    to its last day, or reaches further back than the runs it kept; before
+    saving, the runs ending before ``comb_df`` (or ``since``) are dropped.
+    """
+    keys = keys or SERIES_KEYS
+    flags = comb_df[keys + ["Date"]].assign(
+        Flag=(pd.to_numeric(comb_df["In Stock Qty"], errors="coerce") > 0).astype(float))
+    series, days, values = series_matrix(flags, "Flag", keys)
+    origin = days[0] if len(days) else pd.Timestamp.today()
+
+    runs = None
+    if path is not None and os.path.exists(path):
+        try:
+            runs = StockRuns.load(path)
+        except Exception as e:
+            logger.warning("Ignoring unreadable stock-run index %s: %s", path, e)
+    if runs is not None and len(days) and (
+            not (days[0] - pd.Timedelta(days=1) <= runs.last_date <= days[-1])
+            or runs.day(days[0]) < runs.kept_from):
+        # a gap since the saved index, an index ahead of this history, or a
+        # history reaching back before the runs the index kept
+        runs = None
+    if runs is None:
+        runs = StockRuns(0, origin, series.iloc[:0])
+
+    closed = days if closed_until is None else days[days <= pd.Timestamp(closed_until).normalize()]
+    pos = _update(runs, series, closed, values[:, :len(closed)], keys)
+    if path is not None:
+        if len(days):
+            first = days[0] if since is None else min(days[0], pd.Timestamp(since).normalize())
+            runs.prune(max(runs.day(first), 0))
+        runs.save(path)
+    if len(closed) < len(days):
+        _update(runs, series, days[len(closed):], values[:, len(closed):], keys)
+
+    since = 0 if since is None else max(runs.day(since), 0)
+    series["Last In Stock Date"] = runs.dates(runs.last_in_stock(since)[pos])
+    series["Avg Days In Stock Per Cycle"] = runs.avg_cycle_days(since)[pos]
+    series["Stockout Frequency"] = runs.stockouts(since)[pos]
+    series["Days Out of Stock"] = runs.days_out_of_stock()[pos]
+    return series
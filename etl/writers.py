@@ -0,0 +1,259 @@
+"""
+Output formats of the ETL report.
+
+The report is a sequence of named partitions: one per location, the
+combined All_Locations and the Summary. In the Excel format each partition
+is a worksheet of one workbook. The columnar formats (Parquet, Arrow IPC /
+Feather, gzipped CSV) write a directory named like the report. Each run
+writes one file per partition (``<partition><ext>``) into a staging
+subdirectory of its own, renames it to a generation directory when
+complete and publishes that by atomically replacing the
+``partitions.json`` manifest, which lists the partitions in order and names
+their generation. BI tools and ``read_partitions`` load these far faster
+than a workbook, and a reader that has opened the manifest keeps reading
+one complete generation while later runs publish theirs; only generations
+older than the last ``KEEP_GENERATIONS`` are removed.
+
+Parquet and Feather keep the column types. CSV has none, so the manifest
+of a CSV.gz report records each partition's column types and
+``read_partitions`` reads every value as text and restores them: SKU
+codes keep leading zeros and dates come back as dates. Object columns
+holding mixed types (e.g. the Summary values) come back as text.
+
+Partition names are sheet names, cut to Excel's 31 characters; locations
+whose names only differ after that get a ``~2``, ``~3``, ... suffix (see
+``partition_name``), and ``write_report`` refuses duplicate names.
+
+Parquet and Feather need the optional ``pyarrow`` package; CSV.gz and
+Excel work with pandas and openpyxl alone (see ``available_formats``).
+Either way the report is written beside its final path and moved into
+place when complete.
+"""
+import os
+import json
+import shutil
+import tempfile
+import pandas as pd
+
+from etl.checkpoint import atomic_write
+
+try:
+    import pyarrow  # noqa: F401  (used by pandas for Parquet / Feather)
+except ImportError:  # optional dependency: only Excel and CSV.gz are available
+    pyarrow = None
+
+EXCEL, PARQUET, FEATHER, CSV_GZ = "xlsx", "parquet", "feather", "csv.gz"
+EXTENSIONS = {
+    EXCEL:   ".xlsx",
+    PARQUET: ".parquet",
+    FEATHER: ".feather",
+    CSV_GZ:  ".csv.gz",
+}
+ARROW_FORMATS = (PARQUET, FEATHER)
+
+MANIFEST = "partitions.json"
+GENERATION_PREFIX = "gen-"
+KEEP_GENERATIONS = 3
+
+# longest sheet name Excel accepts
+MAX_NAME = 31
+# the partitions every report has besides its locations
+RESERVED_NAMES = ("All_Locations", "Summary")
+
+
+def available_formats() -> list:
+    """The formats that can be written here: the Arrow ones only with pyarrow."""
+    return [f for f in EXTENSIONS if f not in ARROW_FORMATS or pyarrow is not None]
+
+
+def report_format(output_path: str, output_format: str = None) -> str:
+    """
+    The format to write ``output_path`` in: ``output_format`` when given,
+    otherwise the one its extension names (Excel for anything unknown).
+    Raises ImportError up front for an Arrow format without pyarrow.
+    """
+    fmt = output_format
+    if fmt is None:
+        fmt = next((f for f, ext in EXTENSIONS.items() if output_path.lower().endswith(ext)), EXCEL)
+    if fmt not in EXTENSIONS:
+        raise ValueError(f"Unknown report format '{fmt}'. Available: {list(EXTENSIONS)}")
+    if fmt in ARROW_FORMATS and pyarrow is None:
+        raise ImportError(f"Writing the report as {fmt} needs the 'pyarrow' package")
+    return fmt
+
+
+def partition_name(location, taken: set = None) -> str:
+    """
+    Sheet / file name of a location's partition. With ``taken`` (the
+    lower-cased names already given out, as Excel compares sheet names
+    without case), a name in use gets a ``~<n>`` suffix instead and is
+    added to ``taken``.
+    """
+    base = str(location).replace(":", "-").replace("/", "-")
+    name = base[:MAX_NAME]
+    if taken is None:
+        return name
+    n = 1
+    while name.lower() in taken:
+        n += 1
+        suffix = f"~{n}"
+        name = base[:MAX_NAME - len(suffix)] + suffix
+    taken.add(name.lower())
+    return name
+
+
+def _arrow_safe(df: pd.DataFrame) -> pd.DataFrame:
+    # Arrow needs one type per column: mixed object columns (e.g. the
+    # Summary values) are written as text
+    mixed = [c for c in df.columns
+             if df[c].dtype == object and pd.api.types.infer_dtype(df[c], skipna=True).startswith("mixed")]
+    if not mixed:
+        return df
+    return df.assign(**{c: df[c].map(lambda v: v if pd.isna(v) else str(v)) for c in mixed})
+
+
+def _column_types(df: pd.DataFrame) -> dict:
+    return {str(col): str(dtype) for col, dtype in df.dtypes.items()}
+
+
+def _restore_types(df: pd.DataFrame, types: dict) -> pd.DataFrame:
+    # the CSV was read as text: convert each column back to its written type
+    columns = {}
+    for col, kind in types.items():
+        if col not in df.columns:
+            continue
+        dtype = pd.api.types.pandas_dtype(kind)
+        s = df[col]
+        if pd.api.types.is_bool_dtype(dtype):
+            columns[col] = s.map({"True": True, "False": False}).astype(dtype)
+        elif pd.api.types.is_datetime64_any_dtype(dtype):
+            columns[col] = pd.to_datetime(s).astype(dtype)
+        elif pd.api.types.is_numeric_dtype(dtype):
+            columns[col] = pd.to_numeric(s).astype(dtype)
+        elif isinstance(dtype, pd.CategoricalDtype):
+            columns[col] = s.astype("category")
+    return df.assign(**columns) if columns else df
+
+
+def _write_file(df: pd.DataFrame, path: str, fmt: str):
+    if fmt == PARQUET:
+        _arrow_safe(df).to_parquet(path, index=False)
+    elif fmt == FEATHER:
+        _arrow_safe(df).reset_index(drop=True).to_feather(path)
+    else:
+        df.to_csv(path, index=False, compression="gzip")
+
+
+def _prune_generations(path: str, keep: str):
+    # drop the oldest generations; the last few stay for readers that
+    # opened an earlier manifest and are still reading its files. Staging
+    # directories of runs still writing are not generations yet.
+    generations = []
+    for entry in os.scandir(path):
+        if entry.is_dir() and entry.name.startswith(GENERATION_PREFIX):
+            try:
+                generations.append((entry.stat().st_mtime, entry.name))
+            except FileNotFoundError:
+                pass  # pruned by another run meanwhile
+    generations.sort(reverse=True)
+    try:
+        keep = {keep, _manifest(path)["directory"]}
+    except (OSError, ValueError, KeyError):
+        keep = {keep}
+    for _, name in generations[KEEP_GENERATIONS:]:
+        if name not in keep:
+            shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+
+
+def _unique(partitions):
+    # two partitions with one name would overwrite each other
+    seen = set()
+    for name, df in partitions:
+        if name.lower() in seen:
+            raise ValueError(f"Duplicate report partition name '{name}'")
+        seen.add(name.lower())
+        yield name, df
+
+
+def write_report(partitions, output_path: str, output_format: str = None) -> str:
+    """
+    Writes ``(name, frame)`` pairs, in order, as the report at
+    ``output_path``. ``partitions`` may be a generator, so each frame can
+    be built just before it is written. Returns the format used.
+    """
+    fmt = report_format(output_path, output_format)
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+
+    if fmt == EXCEL:
+        def write_workbook(tmp_path: str):
+            with pd.ExcelWriter(tmp_path, engine="openpyxl", datetime_format="yyyy-mm-dd") as writer:
+                for name, df in _unique(partitions):
+                    df.to_excel(writer, sheet_name=name, index=False)
+
+        atomic_write(output_path, write_workbook, suffix=EXTENSIONS[EXCEL])
+        return fmt
+
+    os.makedirs(output_path, exist_ok=True)
+    staging_dir = tempfile.mkdtemp(dir=output_path, prefix=f".{GENERATION_PREFIX}")
+    try:
+        names, types = [], {}
+        for name, df in _unique(partitions):
+            _write_file(df, os.path.join(staging_dir, f"{name}{EXTENSIONS[fmt]}"), fmt)
+            names.append(name)
+            if fmt == CSV_GZ:
+                types[name] = _column_types(df)
+    except BaseException:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+    gen_dir = os.path.join(output_path, os.path.basename(staging_dir)[1:])
+    os.rename(staging_dir, gen_dir)
+    manifest = {"format": fmt, "partitions": names, "directory": os.path.basename(gen_dir)}
+    if types:
+        manifest["types"] = types
+
+    def write_manifest(tmp_path: str):
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+
+    atomic_write(os.path.join(output_path, MANIFEST), write_manifest)
+    _prune_generations(output_path, manifest["directory"])
+    return fmt
+
+
+def is_partitioned(path: str) -> bool:
+    """True for a report written in one of the directory formats."""
+    return os.path.isfile(os.path.join(path, MANIFEST))
+
+
+def _manifest(path: str) -> dict:
+    with open(os.path.join(path, MANIFEST)) as f:
+        return json.load(f)
+
+
+def list_partitions(path: str) -> list:
+    """Partition names of a directory report, in the order they were written."""
+    return _manifest(path)["partitions"]
+
+
+def read_partitions(path: str, names=None) -> dict:
+    """
+    ``{name: DataFrame}`` for the partitions of a directory report (all of
+    them when ``names`` is None), in written order, with the column types
+    they were written with.
+    """
+    manifest = _manifest(path)
+    fmt = manifest["format"]
+    directory = os.path.join(path, manifest["directory"])
+    frames = {}
+    for name in manifest["partitions"]:
+        if names is not None and name not in names:
+            continue
+        file_path = os.path.join(directory, f"{name}{EXTENSIONS[fmt]}")
+        if fmt == PARQUET:
+            frames[name] = pd.read_parquet(file_path)
+        elif fmt == FEATHER:
+            frames[name] = pd.read_feather(file_path)
+        else:
+            frames[name] = _restore_types(pd.read_csv(file_path, compression="gzip", dtype=str),
+                                          manifest["types"][name])
+    return frames
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# the ETL is imported as the etl package and the app modules by name,
+# as main.py does
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (project_root, os.path.join(project_root, "app")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,99 @@
+import pandas as pd
+import pytest
+
+import catalogue
+from catalogue import load_catalogue
+
+
+class Template:
+    def __init__(self, sha256: str):
+        self.sha256 = sha256
+
+
+@pytest.fixture
+def parses(monkeypatch):
+    """Counts the sheet parses; the in-memory catalogues start empty."""
+    monkeypatch.setattr(catalogue, "_memory", type(catalogue._memory)())
+    calls = []
+
+    def read_sheet(template, names):
+        calls.append(template.sha256)
+        return pd.DataFrame({"AGLC SKU": ["CNB-001", "CNB-002"], "Format": ["Vape", "Vape"],
+                             "EachesPerCase": [6, 12]})
+    monkeypatch.setattr(catalogue, "read_sheet", read_sheet)
+    return calls
+
+
+def test_same_template_is_parsed_once(tmp_path, parses):
+    first, reused_first = load_catalogue(Template("a"), str(tmp_path))
+    second, reused_second = load_catalogue(Template("a"), str(tmp_path))
+    catalogue._memory.clear()
+    third, reused_third = load_catalogue(Template("a"), str(tmp_path))
+
+    assert (reused_first, reused_second, reused_third) == (False, True, True)
+    assert parses == ["a"]
+    pd.testing.assert_frame_equal(first, third)
+    assert [p.name for p in tmp_path.iterdir()] == [f"a-v{catalogue.CATALOGUE_FORMAT}.pkl"]
+
+
+def test_least_recently_used_catalogue_is_evicted(tmp_path, parses, monkeypatch):
+    monkeypatch.setattr(catalogue, "MEMORY_ENTRIES", 2)
+    for sha in ("a", "b", "a", "c"):
+        load_catalogue(Template(sha), str(tmp_path))
+
+    kept = [key.rsplit("/", 1)[-1].split("-")[0] for key in catalogue._memory]
+    assert kept == ["a", "c"]
+
+
+def test_format_version_change_rebuilds_the_cache(tmp_path, parses, monkeypatch):
+    load_catalogue(Template("a"), str(tmp_path))
+    monkeypatch.setattr(catalogue, "CATALOGUE_FORMAT", catalogue.CATALOGUE_FORMAT + 1)
+    _, reused = load_catalogue(Template("a"), str(tmp_path))
+
+    assert not reused
+    assert parses == ["a", "a"]
+
+
+def test_session_changes_stay_out_of_the_shared_catalogue(tmp_path, parses):
+    df, _ = load_catalogue(Template("a"), str(tmp_path))
+    df["EachesPerCase"] = 1
+    df.loc[0, "AGLC SKU"] = "changed"
+    df["New"] = 0
+
+    again, _ = load_catalogue(Template("a"), str(tmp_path))
+    assert again["EachesPerCase"].tolist() == [6, 12]
+    assert again["AGLC SKU"].tolist() == ["CNB-001", "CNB-002"]
+    assert "New" not in again.columns
+
+
+def test_compact_frame_encodes_repeated_text_and_narrows_integers():
+    df = pd.DataFrame({
+        "AGLC SKU":      ["00123", "00124", "00125", "00126"],
+        "Format":        ["Vape", "Vape", "Flower", "Vape"],
+        "EachesPerCase": [6, 12, 6, 24],
+        "Big":           [0, 0, 0, 2**40],
+        "Sealed":        [True, False, True, True],
+    })
+    df.attrs["header_row"] = 3
+    compact = catalogue.compact_frame(df)
+
+    assert compact["AGLC SKU"].tolist() == ["00123", "00124", "00125", "00126"]
+    assert not isinstance(compact["AGLC SKU"].dtype, pd.CategoricalDtype)
+    assert isinstance(compact["Format"].dtype, pd.CategoricalDtype)
+    assert compact["EachesPerCase"].dtype == "int32"
+    assert compact["Big"].dtype == "int64"
+    assert compact["Sealed"].dtype == bool
+    assert compact.attrs == {"header_row": 3}
+    pd.testing.assert_frame_equal(compact.astype(df.dtypes.to_dict()), df)
+
+
+def test_unreadable_cache_file_is_parsed_again(tmp_path, parses):
+    load_catalogue(Template("a"), str(tmp_path))
+    catalogue._memory.clear()
+    (tmp_path / f"a-v{catalogue.CATALOGUE_FORMAT}.pkl").write_bytes(b"cut off")
+
+    df, reused = load_catalogue(Template("a"), str(tmp_path))
+
+    assert not reused
+    assert parses == ["a", "a"]
+    assert df["EachesPerCase"].tolist() == [6, 12]
@@ -0,0 +1,102 @@
+import pytest
+import requests
+
+from etl import cova
+from etl.cova import CovaClient
+
+
+class Response:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code}")
+
+    def close(self):
+        pass
+
+
+class Session:
+    """Answers 401 to every token but the one in ``valid``."""
+
+    def __init__(self, valid):
+        self.valid = valid
+        self.sent = []
+
+    def post(self, url, json=None, headers=None, stream=False):
+        self.sent.append(headers["Authorization"])
+        if headers["Authorization"] != self.valid:
+            return Response(401)
+        return Response(200, body="rows")
+
+
+def headers(token):
+    return {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+
+
+def test_expired_token_is_refreshed_once_and_the_request_resent(monkeypatch):
+    signins = []
+
+    def authenticate(session, env_prefix):
+        signins.append(env_prefix)
+        return headers("fresh")
+    monkeypatch.setattr(cova, "authenticate", authenticate)
+
+    shared = headers("stale")
+    session = Session(valid="Bearer fresh")
+    client = CovaClient(session=session, headers=shared, env_prefix="TENANT", max_retries=0)
+
+    assert client._post("url", {}, lambda resp: resp.body) == "rows"
+    assert session.sent == ["Bearer stale", "Bearer fresh"]
+    assert signins == ["TENANT"]
+    # clients sharing the headers get the new token too
+    assert shared["Authorization"] == "Bearer fresh"
+
+
+def test_a_second_401_is_raised(monkeypatch):
+    monkeypatch.setattr(cova, "authenticate", lambda session, env_prefix: headers("also rejected"))
+    session = Session(valid="Bearer never")
+    client = CovaClient(session=session, headers=headers("stale"), max_retries=0)
+
+    with pytest.raises(requests.HTTPError):
+        client._post("url", {}, lambda resp: resp.body)
+    assert len(session.sent) == 2
+
+
+def test_token_refreshed_by_another_client_is_not_refreshed_again(monkeypatch):
+    signins = []
+    monkeypatch.setattr(cova, "authenticate",
+                        lambda session, env_prefix: signins.append(env_prefix) or headers("newer"))
+    client = CovaClient(session=Session(valid="Bearer fresh"), headers=headers("fresh"))
+
+    # a request sent with the old token comes back after the refresh
+    client.refresh_token("Bearer stale")
+    assert signins == []
+    assert client.headers["Authorization"] == "Bearer fresh"
+
+
+def test_recorded_bodies_are_saved_and_decoded_with_the_chosen_decoder(tmp_path):
+    body = b'[{"Data": [{"SKU": "00123", "Qty": 2}]}]'
+    decoded = []
+
+    class BodySession(Session):
+        def post(self, url, json=None, headers=None, stream=False):
+            resp = super().post(url, json, headers, stream)
+            resp.content = body
+            return resp
+
+    def decoder(content):
+        decoded.append(content)
+        return cova.json.loads(content)
+
+    client = CovaClient(session=BodySession(valid="Bearer t"), headers=headers("t"),
+                        decoder=decoder, record_dir=str(tmp_path))
+    frame = client.execute_frame("report", {})
+
+    assert frame.to_dict("records") == [{"SKU": "00123", "Qty": 2}]
+    assert decoded == [body]
+    [recorded] = tmp_path.iterdir()
+    assert recorded.read_bytes() == body
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+
+from etl.cube import MetricsCube
+
+
+def history():
+    # A is carried at both stores, B only at Store 2, C only shows up in sales
+    days = pd.date_range("2024-03-01", periods=4, freq="D")
+    ioh = pd.DataFrame({
+        "SKU":          ["A"] * 8 + ["B"] * 4,
+        "Location":     ["Store 1"] * 4 + ["Store 2"] * 4 + ["Store 2"] * 4,
+        "Date":         list(days) * 3,
+        "In Stock Qty": [5, 0, 3, 2,   1, 1, 0, 0,   9, 8, 7, 6],
+    })
+    sales = pd.DataFrame({
+        "SKU":      ["A", "A", "B", "C"],
+        "Location": ["Store 1", "Store 1", "Store 2", "Store 1"],
+        "Date":     [days[0], days[3], days[2], days[3]],
+        "Net Sold": [2, 4, 1, 3],
+    })
+    return ioh, sales
+
+
+def test_cube_keeps_only_the_pairs_in_the_history():
+    cube = MetricsCube.from_history(*history())
+
+    pairs = list(cube.series.itertuples(index=False, name=None))
+    assert pairs == [("A", "Store 1"), ("A", "Store 2"), ("B", "Store 2"), ("C", "Store 1")]
+    assert all(prefix.shape == (4, 5) for prefix in cube.prefix.values())
+
+
+def test_window_frame_sums_the_last_days():
+    cube = MetricsCube.from_history(*history())
+    window = cube.window_frame(2).set_index(["SKU", "Location"])
+
+    assert window.loc[("A", "Store 1"), "Total Days in Stock"] == 2
+    assert window.loc[("A", "Store 1"), "Total In Stock Qty"] == 5
+    assert window.loc[("A", "Store 1"), "2d Net Sold"] == 4
+    assert window.loc[("A", "Store 1"), "Sales per Day"] == 2
+    assert window.loc[("B", "Store 2"), "2d Net Sold"] == 1
+    assert window.loc[("A", "Store 2"), "Total Days in Stock"] == 0
+    assert np.isnan(window.loc[("C", "Store 1"), "Sales per Day"])
+
+    earlier = cube.window_frame(1, end="2024-03-01").set_index(["SKU", "Location"])
+    assert earlier.loc[("A", "Store 1"), "1d Net Sold"] == 2
@@ -0,0 +1,39 @@
+import pandas as pd
+import pytest
+
+from etl.daily_sales import SalesStore
+
+
+def sales():
+    return pd.DataFrame({
+        "Date":              pd.to_datetime(["2024-03-01", "2024-03-01", "2024-03-03", "2024-03-04", "2024-03-04"]),
+        "SKU":               ["A", "A", "A", "B", "A"],
+        "Location":          ["Store"] * 5,
+        "Net Sold":          [1, 2, 4, 5, 1],
+        "Avg Sold At Price": [10.0, 13.0, 8.0, 20.0, 12.0],
+        "Total Cost":        [4.0, 8.0, 16.0, 30.0, 4.0],
+    })
+
+
+def test_rows_of_a_day_are_added_and_missing_days_are_zero():
+    store = SalesStore.from_frame(sales())
+
+    assert list(store.days) == list(pd.date_range("2024-03-01", "2024-03-04"))
+    assert store.series.to_dict("records") == [{"SKU": "A", "Location": "Store"},
+                                               {"SKU": "B", "Location": "Store"}]
+    assert store.arrays["Net Sold"].tolist() == [[3, 0, 4, 1], [0, 0, 0, 5]]
+
+
+def test_window_frame_matches_the_aggregate_report():
+    store = SalesStore.from_frame(sales())
+
+    window = store.window_frame(3, end="2024-03-03").set_index("SKU")
+    assert window.loc["A", "Net Sold"] == 7
+    # revenue 10 + 26 + 32 over 7 units
+    assert window.loc["A", "Avg Sold At Price"] == pytest.approx(68 / 7)
+    assert window.loc["A", "Total Cost"] == 28
+    assert window.loc["B", "Net Sold"] == 0
+    assert window.loc["B", "Avg Sold At Price"] == 0
+
+    last = store.window_frame(1).set_index("SKU")
+    assert last["Net Sold"].to_dict() == {"A": 1, "B": 5}
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+
+from diagnostics import Diagnostics, OFF, INFO, DEBUG
+
+
+class Recorder:
+    """Stands in for ``st``: records what render draws."""
+
+    def __init__(self):
+        self.calls = []
+
+    def expander(self, title, expanded=False):
+        self.calls.append(("expander", title))
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        return lambda value: self.calls.append((name, value))
+
+
+def test_messages_above_the_level_are_not_formatted():
+    calls = []
+
+    def costly():
+        calls.append(1)
+        return 42
+
+    diag = Diagnostics(INFO)
+    diag.info("kept {}", costly)
+    diag.debug("dropped {}", costly)
+    diag.frame(lambda: calls.append(2))
+
+    assert len(diag) == 1
+    assert calls == [1]
+    assert Diagnostics(OFF).entries == []
+
+
+def test_kept_entries_hold_no_reference_to_the_pipeline_frames():
+    frame = pd.DataFrame({"SKU": np.arange(1000), "Qty": np.ones(1000)})
+    diag = Diagnostics(DEBUG)
+    diag.debug("columns {}", frame.columns)
+    diag.frame(frame.head)
+    diag.info("{:.1f} MB", lambda df=frame: df.memory_usage(deep=True).sum() / 1e6)
+
+    _, kind, _, first = diag.entries[0]
+    assert first == "columns ['SKU', 'Qty']"
+    _, kind, _, head = diag.entries[1]
+    assert kind == "frame" and len(head) == 5
+    assert not np.shares_memory(head["Qty"].to_numpy(), frame["Qty"].to_numpy())
+    assert all(not callable(entry[3]) for entry in diag.entries)
+
+
+def test_render_groups_entries_by_section():
+    diag = Diagnostics(DEBUG)
+    diag.info("start")
+    diag.section("Location Store")
+    diag.code("keys {}", list(range(100)))
+    target = Recorder()
+    diag.render(target)
+
+    assert target.calls[0] == ("expander", "Diagnostics (2 messages)")
+    assert ("text", "start") in target.calls
+    assert ("markdown", "**Location Store**") in target.calls
+    code = next(value for name, value in target.calls if name == "code")
+    assert code.endswith("(100 items)")
@@ -0,0 +1,102 @@
+import io
+import os
+import stat
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+import download_order_form
+import session_store
+from template_file import TemplateFile
+
+
+def workbook_bytes() -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        zf.writestr("[Content_Types].xml", "<Types/>")
+        zf.writestr("xl/workbook.xml", "<workbook/>")
+    return buffer.getvalue()
+
+
+class Response:
+    def __init__(self, status_code: int, body: bytes = b"", headers: dict = None):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.body = body
+        self.headers = {"Content-Length": str(len(body)), **(headers or {})}
+        self.closed = False
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.body), chunk_size):
+            yield self.body[i:i + chunk_size]
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise requests.HTTPError(self.status_code)
+
+    def close(self):
+        self.closed = True
+
+
+class Site:
+    """Serves the template with an ETag and answers 304 to a matching If-None-Match."""
+
+    def __init__(self):
+        self.requests = []
+
+    def get(self, url, params=None, headers=None, stream=False):
+        self.requests.append(headers)
+        if headers.get("If-None-Match") == '"v1"':
+            return Response(304)
+        return Response(200, workbook_bytes(), {"ETag": '"v1"'})
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(download_order_form, "TEMPLATE_CACHE_PATH", str(tmp_path / "form.xlsm"))
+    monkeypatch.setattr(download_order_form, "TEMPLATE_META_PATH", str(tmp_path / "template.json"))
+    return tmp_path
+
+
+def test_unchanged_template_is_reused_on_304(cache):
+    site = Site()
+    first = download_order_form._download(site)
+    second = download_order_form._download(site)
+
+    assert "If-None-Match" not in site.requests[0]
+    assert site.requests[1]["If-None-Match"] == '"v1"'
+    assert (second.path, second.sha256, second.size) == (first.path, first.sha256, first.size)
+
+
+def test_concurrent_meta_saves_never_leave_a_partial_file(cache):
+    path = cache / "form.xlsm"
+    path.write_bytes(workbook_bytes())
+    template = TemplateFile(str(path))
+
+    def save_and_load(i):
+        download_order_form._save_template_meta(template, {"ETag": f'"v{i}"'})
+        return download_order_form._load_template_meta()
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        metas = list(pool.map(save_and_load, range(200)))
+
+    assert all(meta.get("sha256") == template.sha256 for meta in metas)
+    assert sorted(os.listdir(cache)) == ["form.xlsm", "template.json"]
+
+
+def test_saved_cookies_are_owner_only_and_restored(tmp_path, monkeypatch):
+    fernet = pytest.importorskip("cryptography.fernet")
+    monkeypatch.setenv("ORDER_FORM_COOKIE_KEY", fernet.Fernet.generate_key().decode())
+    path = str(tmp_path / "order_form" / "session.bin")
+    session = requests.Session()
+    session.cookies.set("auth", "token", domain="retail.albertacannabis.org", path="/")
+
+    assert session_store.save_cookies(session, path)
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert os.listdir(os.path.dirname(path)) == ["session.bin"]
+
+    restored = requests.Session()
+    assert session_store.load_cookies(restored, path)
+    assert restored.cookies.get("auth") == "token"
@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from etl.forecast import forecast_frame
+
+# eight weeks ending on a Sunday
+DAYS = pd.date_range("2024-03-04", "2024-04-28")
+WEEKEND = 10.0
+WEEKDAY = 2.0
+
+
+def weekly_demand() -> pd.DataFrame:
+    demand = np.where(DAYS.weekday >= 5, WEEKEND, WEEKDAY)
+    return pd.DataFrame({"SKU": "A", "Location": "Store", "Date": DAYS, "Demand": demand})
+
+
+def per_day(**kwargs) -> float:
+    return forecast_frame(weekly_demand(), "Demand", **kwargs)["Forecast per Day"].iloc[0]
+
+
+def test_two_weeks_average_out_to_the_level():
+    level = forecast_frame(weekly_demand(), "Demand")["Forecast Level"].iloc[0]
+    assert per_day(horizon=14) == pytest.approx(level)
+    assert level == pytest.approx((5 * WEEKDAY + 2 * WEEKEND) / 7, rel=0.05)
+
+
+def test_partial_week_follows_the_weekdays_it_covers():
+    # day 1 after the last (Sunday) is a Monday
+    weekdays = per_day(horizon=3, start=1)           # Mon-Wed
+    weekend = per_day(horizon=3, start=5)            # Fri-Sun
+    week_and_a_half = per_day(horizon=10, start=1)   # Mon-Wed of the week after too
+
+    assert weekdays == pytest.approx(WEEKDAY, abs=0.5)
+    assert weekend == pytest.approx((WEEKDAY + 2 * WEEKEND) / 3, abs=0.5)
+    assert weekdays < week_and_a_half < weekend
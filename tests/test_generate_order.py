@@ -0,0 +1,139 @@
+import os
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+import etl.generate_order as generate_order_module
+from etl.cube import MetricsCube, cube_path
+from etl.generate_order import generate_order
+from etl.writers import read_partitions
+
+IOH_HISTORY = "1c3c6f4a-d91b-40fa-880f-3852b68de20e"
+IOH_CURRENT = "a8b03840-2e18-4c11-bdb3-6413b972d391"
+SALES = "c1ec9df0-db1e-4698-8d1c-dd640bdbbc04"
+
+
+class FakeCova:
+    """Answers the three reports the ETL runs with two SKUs at one store."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def execute_frame(self, report_id: str, params: dict) -> pd.DataFrame:
+        self.calls += 1
+        if report_id == IOH_HISTORY:
+            return pd.DataFrame({"SKU": ["A", "B"], "Location": ["Store"] * 2, "In Stock Qty": [5, 0]})
+        if report_id == IOH_CURRENT:
+            return pd.DataFrame({"SKU": ["A", "B"], "Location": ["Store"] * 2, "In Stock Qty": [5, 0],
+                                 "Supplier SKU": ["CNB-1", "CNB-2"]})
+        if report_id == SALES:
+            return pd.DataFrame({"SKU": ["A"], "Location": ["Store"], "Net Sold": [2],
+                                 "Avg Sold At Price": [10.0], "Total Cost": [12.0]})
+        raise AssertionError(f"unexpected report {report_id}")
+
+
+class NoCova:
+    def execute_frame(self, report_id: str, params: dict):
+        raise AssertionError("a resumed run should not call Cova")
+
+
+def test_resume_to_new_path_writes_the_cube(tmp_path, monkeypatch):
+    checkpoints = str(tmp_path / "checkpoints")
+    first_path = str(tmp_path / "a.xlsx")
+
+    # the first run saves every step, then fails while writing the report
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+    monkeypatch.setattr(generate_order_module, "write_report", fail)
+    with pytest.raises(OSError):
+        generate_order(first_path, hist_days=3, client=FakeCova(), checkpoint_dir=checkpoints)
+    monkeypatch.undo()
+
+    # resumed from the saved steps, to another path and format
+    second_path = str(tmp_path / "b.csv.gz")
+    generate_order(second_path, hist_days=3, client=NoCova(), checkpoint_dir=checkpoints)
+
+    assert os.path.isdir(second_path)
+    cube = MetricsCube.load(cube_path(second_path))
+    window = cube.window_frame(3)
+    assert set(window["SKU"]) == {"A", "B"}
+
+
+@pytest.mark.parametrize("output_name", ["same.xlsx", "same.csv.gz"])
+def test_identical_runs_in_parallel_do_not_collide(tmp_path, output_name):
+    # as from separate server processes: SingleFlight does not merge them
+    checkpoints = str(tmp_path / "checkpoints")
+    output_path = str(tmp_path / output_name)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(generate_order, output_path, hist_days=3, client=FakeCova(),
+                               checkpoint_dir=checkpoints)
+                   for _ in range(4)]
+        for future in futures:
+            future.result()
+
+    assert os.path.exists(output_path)
+    assert MetricsCube.load(cube_path(output_path)).window_frame(3)["SKU"].nunique() == 2
+    leftovers = [name for name in os.listdir(tmp_path) if name.startswith(".")]
+    assert leftovers == []
+
+
+class PartialTodayCova(FakeCova):
+    """Sells 2 of SKU A on every closed day and nothing yet today."""
+
+    def execute_frame(self, report_id: str, params: dict) -> pd.DataFrame:
+        df = super().execute_frame(report_id, params)
+        if report_id == SALES and params["DateRange"]["StartDate"].startswith(date.today().isoformat()):
+            df["Net Sold"] = 0
+        return df
+
+
+def test_forecast_leaves_out_today(tmp_path):
+    output_path = str(tmp_path / "report.csv.gz")
+    generate_order(output_path, hist_days=5, exclude_today=False, client=PartialTodayCova(),
+                   checkpoint_dir=str(tmp_path / "checkpoints"), coverage_days=10)
+
+    store = read_partitions(output_path)["Store"].set_index("SKU")
+    assert store.loc["A", "Forecast per Day"] == pytest.approx(2.0)
+
+
+def test_week_and_history_sales_are_summed_from_the_daily_reports(tmp_path):
+    # FakeCova sells 2 of A on every day asked for
+    output_path = str(tmp_path / "report.csv.gz")
+    cova = FakeCova()
+    generate_order(output_path, hist_days=3, client=cova, checkpoint_dir=str(tmp_path / "checkpoints"))
+
+    row = read_partitions(output_path)["Store"].set_index("SKU").loc["A"]
+    assert row["Week Net Sold"] == 14
+    assert row["3d Net Sold"] == 6
+    assert row["3d Avg Price"] == 10.0
+    assert row["3d Total Cost"] == 36.0
+
+
+class TwoStoreCova(FakeCova):
+    """The IOH reports list West before East."""
+
+    def execute_frame(self, report_id: str, params: dict) -> pd.DataFrame:
+        df = super().execute_frame(report_id, params)
+        if report_id == SALES:
+            return df
+        return pd.concat([df.assign(Location="West"), df.assign(Location="East")], ignore_index=True)
+
+
+@pytest.mark.parametrize("combined_sheet", [True, False])
+def test_each_location_gets_its_own_rows_in_order(tmp_path, combined_sheet):
+    output_path = str(tmp_path / "report.csv.gz")
+    generate_order(output_path, hist_days=3, client=TwoStoreCova(),
+                   checkpoint_dir=str(tmp_path / "checkpoints"), combined_sheet=combined_sheet)
+
+    sheets = read_partitions(output_path)
+    expected = ["West", "East"] + (["All_Locations"] if combined_sheet else []) + ["Summary"]
+    assert list(sheets) == expected
+    for location in ("West", "East"):
+        assert set(sheets[location]["Location"]) == {location}
+        assert sorted(sheets[location]["SKU"]) == ["A", "B"]
+    if combined_sheet:
+        combined = sheets["All_Locations"]
+        pd.testing.assert_frame_equal(
+            combined, pd.concat([sheets["West"], sheets["East"]], ignore_index=True))
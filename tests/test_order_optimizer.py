@@ -0,0 +1,34 @@
+from order_optimizer import LIMIT_AVAILABLE, LIMIT_BUDGET, optimize_orders
+
+
+def test_budget_left_after_a_cut_line_goes_to_cheaper_lines():
+    # A needs 3 cases at $100 and is cut to 2; the $50 left buys B's 2 cases at $10
+    result = optimize_orders([30, 20], [10, 10], ["L", "L"], ["A", "B"],
+                             unit_cost=[10, 1], budget=250)
+    assert result["Order Qty"].tolist() == [2, 2]
+    assert result["Order Limited By"].tolist() == [LIMIT_BUDGET, ""]
+
+
+def test_cut_line_does_not_starve_later_lines_that_fit():
+    # B (2 cases at $60) no longer fits after A; C (1 case at $30) still does
+    result = optimize_orders([40, 20, 10], [10, 10, 10], ["L"] * 3, ["A", "B", "C"],
+                             unit_cost=[5, 6, 3], budget=250)
+    assert result["Order Qty"].tolist() == [4, 0, 1]
+    assert result["Order Limited By"].tolist() == ["", LIMIT_BUDGET, ""]
+
+
+def test_supply_and_budget_both_bind():
+    # X has 3 cases for two stores; L1 then only affords one of its two,
+    # and L2's budget is spent on its X case before Y
+    result = optimize_orders(
+        units_needed=[20, 20, 10],
+        case_size=[10, 10, 10],
+        locations=["L1", "L2", "L2"],
+        skus=["X", "X", "Y"],
+        unit_cost=[10, 10, 5],
+        available_cases=[3, 3, None],
+        budget=120,
+        priority=[3, 2, 1],
+    )
+    assert result["Order Qty"].tolist() == [1, 1, 0]
+    assert result["Order Limited By"].tolist() == [LIMIT_BUDGET, LIMIT_AVAILABLE, LIMIT_BUDGET]
@@ -0,0 +1,37 @@
+import pandas as pd
+
+from output_schema import order_schema, LOCATION_SHEET, ALL_LOCATIONS_SHEET, CATALOGUE_SHEET
+
+
+def merged() -> pd.DataFrame:
+    return pd.DataFrame({
+        "AGLC SKU":            ["CNB-1", "CNB-2"],
+        "In Stock Qty":        [3.0, None],
+        "30d Net Sold":        [12, 0],
+        "2d Net Sold":         [1, 1],
+        "Last In Stock Date":  ["2024-03-01", "not a date"],
+        "Location":            ["Store", "Store"],
+    })
+
+
+def test_window_columns_follow_hist_days():
+    sheet = order_schema(30).apply(merged())
+    assert sheet["30d Net Sold"].tolist() == [12, 0]
+    assert "2d Net Sold" not in sheet.columns
+    assert "30d Avg Price" in sheet.columns
+
+
+def test_location_sheets_keep_the_merged_values():
+    sheet = order_schema(30, LOCATION_SHEET).apply(merged())
+    assert sheet["Last In Stock Date"].tolist() == ["2024-03-01", "not a date"]
+    assert sheet["In Stock Qty"].isna().tolist() == [False, True]
+    assert "Location" not in sheet.columns
+
+
+def test_combined_and_catalogue_sheets_type_dates_and_stock():
+    for kind in (ALL_LOCATIONS_SHEET, CATALOGUE_SHEET):
+        sheet = order_schema(30, kind).apply(merged())
+        assert sheet["In Stock Qty"].tolist() == [3, 0]
+        assert sheet["Last In Stock Date"].iloc[0] == pd.Timestamp("2024-03-01")
+        assert pd.isna(sheet["Last In Stock Date"].iloc[1])
+    assert "Location" in order_schema(30, ALL_LOCATIONS_SHEET).apply(merged()).columns
@@ -0,0 +1,66 @@
+import io
+import json
+
+import pandas as pd
+import pytest
+
+from etl import report_json
+from etl.report_json import frame_from_body, stream_report_frame
+
+
+class Raw(io.BytesIO):
+    decode_content = False
+
+
+class Response:
+    def __init__(self, body):
+        self.raw = Raw(json.dumps(body).encode())
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+# two result objects: only the first one's Data is the report
+BODY = [
+    {"Data": [{"SKU": "00123", "Qty": 2, "Detail": {"Size": 1.5}},
+              {"SKU": "CNB-7", "Price": 9.25, "Detail": {"Size": 3}}]},
+    {"Data": [{"SKU": "OTHER", "Qty": 99}]},
+]
+
+
+def test_streaming_reads_only_the_first_result_like_the_whole_body():
+    resp = Response(BODY)
+    streamed = stream_report_frame(resp)
+
+    pd.testing.assert_frame_equal(streamed, frame_from_body(BODY))
+    assert list(streamed["SKU"]) == ["00123", "CNB-7"]
+    assert resp.closed
+
+
+def test_streaming_stops_at_the_end_of_the_first_result():
+    raw = json.dumps(BODY).encode()
+    stream = io.BytesIO(raw + b"not json")
+    rows = list(report_json.first_result_rows(stream))
+
+    assert [row["SKU"] for row in rows] == ["00123", "CNB-7"]
+
+
+def test_every_installed_decoder_reads_the_same_frame():
+    raw = json.dumps(BODY).encode()
+    frames = [frame_from_body(loads(raw)) for loads in report_json.DECODERS.values()]
+
+    for frame in frames[1:]:
+        pd.testing.assert_frame_equal(frame, frames[0])
+
+
+def test_decoder_is_picked_by_name_or_environment(monkeypatch):
+    monkeypatch.delenv("COVA_JSON_DECODER", raising=False)
+    assert report_json.get_decoder() is next(iter(report_json.DECODERS.values()))
+    assert report_json.get_decoder("json") is json.loads
+
+    monkeypatch.setenv("COVA_JSON_DECODER", "json")
+    assert report_json.get_decoder() is json.loads
+
+    with pytest.raises(ValueError):
+        report_json.get_decoder("no-such-decoder")
@@ -0,0 +1,43 @@
+import pandas as pd
+import pytest
+
+from sheet_assembly import order_columns
+
+
+def merged() -> pd.DataFrame:
+    return pd.DataFrame({
+        "Sales per Day":    [1.0, None, 2.0],
+        "Forecast per Day": [1.5, None, None],
+        "In Stock Qty":     [4, 0, 10],
+        "On Order Qty":     [2, None, 0],
+        "EachesPerCase":    [6, 12, None],
+    })
+
+
+def test_order_formula_columns():
+    frame = merged()
+    columns, demand = order_columns(frame, 10, "Sales per Day",
+                                    on_order_col="On Order Qty", case_col="EachesPerCase")
+
+    # the forecast where there is one, the sales rate otherwise
+    assert demand.tolist() == [1.5, 0.0, 2.0]
+    assert columns["Projected Need"].tolist() == [15.0, 0.0, 20.0]
+    assert columns["Current Inventory"].tolist() == [6.0, 0.0, 10.0]
+    assert columns["Units Needed"].tolist() == [9.0, 0.0, 10.0]
+    assert columns["Cases Needed"].tolist() == [1.5, 0.0, 10.0]
+    assert columns["Order Qty"].tolist() == columns["Cases Needed"].tolist()
+    # computed for one assign: the merged frame itself is left alone
+    pd.testing.assert_frame_equal(frame, merged())
+
+
+def test_placeholders_without_on_order_and_case_size():
+    columns, _ = order_columns(merged().drop(columns=["On Order Qty", "EachesPerCase"]),
+                               10, "Sales per Day")
+    assert columns["On Order"] == 0
+    assert columns["Case Size"] == 1
+    assert columns["Cases Needed"].tolist() == pytest.approx([11.0, 0.0, 10.0])
+
+
+def test_without_stock_only_the_projected_need():
+    columns, _ = order_columns(merged().drop(columns=["In Stock Qty"]), 10, "Sales per Day")
+    assert set(columns) == {"Sales per Day", "Projected Need"}
@@ -0,0 +1,80 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import pytest
+
+from etl import singleflight
+from etl.singleflight import SingleFlight
+
+
+class CountingFuture(Future):
+    """Counts the callers waiting on it, so a test can release the run once they all are."""
+
+    def __init__(self):
+        super().__init__()
+        self.waiting = threading.Semaphore(0)
+
+    def result(self, timeout=None):
+        if not self.done():
+            self.waiting.release()
+        return super().result(timeout)
+
+
+def wait_for_waiters(flight, key, count):
+    future = flight._calls[key]
+    for _ in range(count):
+        assert future.waiting.acquire(timeout=5)
+
+
+@pytest.fixture
+def flight(monkeypatch):
+    monkeypatch.setattr(singleflight, "Future", CountingFuture)
+    return SingleFlight()
+
+
+def test_callers_with_one_key_share_a_single_run(flight):
+    started, release = threading.Event(), threading.Event()
+    runs = []
+
+    def run():
+        runs.append(1)
+        started.set()
+        assert release.wait(5)
+        return "report"
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        leader = pool.submit(flight.do, "key", run)
+        assert started.wait(5)
+        followers = [pool.submit(flight.do, "key", run) for _ in range(3)]
+        wait_for_waiters(flight, "key", 3)
+        release.set()
+
+        assert leader.result() == ("report", False)
+        assert [f.result() for f in followers] == [("report", True)] * 3
+    assert len(runs) == 1
+
+
+def test_failure_reaches_every_caller_and_the_key_runs_again(flight):
+    started, release = threading.Event(), threading.Event()
+
+    def fail():
+        started.set()
+        assert release.wait(5)
+        raise OSError("Cova down")
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(flight.do, "key", fail)
+        assert started.wait(5)
+        follower = pool.submit(flight.do, "key", fail)
+        wait_for_waiters(flight, "key", 1)
+        release.set()
+        for future in (leader, follower):
+            with pytest.raises(OSError):
+                future.result()
+
+    assert flight.do("key", lambda: "retried") == ("retried", False)
+
+
+def test_different_keys_run_separately(flight):
+    assert flight.do("a", lambda: 1) == (1, False)
+    assert flight.do("b", lambda: 2) == (2, False)
@@ -0,0 +1,115 @@
+import pandas as pd
+import pytest
+
+from etl.stock_runs import StockRuns, stock_run_metrics
+
+DAYS = pd.date_range("2024-03-01", periods=8)
+
+
+def history(flags: dict) -> pd.DataFrame:
+    rows = [
+        {"SKU": sku, "Location": "Store", "Date": day, "In Stock Qty": qty}
+        for sku, qtys in flags.items()
+        for day, qty in zip(DAYS, qtys)
+        if qty is not None
+    ]
+    return pd.DataFrame(rows)
+
+
+def metrics(df: pd.DataFrame, **kwargs) -> pd.DataFrame:
+    return stock_run_metrics(df, **kwargs).set_index("SKU")
+
+
+def test_cycle_days_pair_each_restock_with_the_next_stockout():
+    df = history({
+        # in stock from the start: that first stretch is not a full cycle,
+        # the restock on day 3 lasts 3 days
+        "A": [4, 4, 0, 2, 2, 2, 0, 5],
+        # cycles of 2 days (day 1 → 3) and 1 day (day 5 → 6)
+        "B": [0, 3, 3, 0, 0, 1, 0, 0],
+        # a day without a row does not break the run
+        "C": [0, 6, None, 6, 0, 0, 0, 0],
+    })
+    result = metrics(df)
+    assert result["Avg Days In Stock Per Cycle"].to_dict() == {"A": 3.0, "B": 1.5, "C": 3.0}
+    assert result["Stockout Frequency"].to_dict() == {"A": 2, "B": 2, "C": 1}
+    assert result["Last In Stock Date"].to_dict() == {"A": DAYS[7], "B": DAYS[5], "C": DAYS[3]}
+    assert result["Days Out of Stock"].to_dict() == {"A": 0, "B": 2, "C": 4}
+
+
+def test_window_counts_only_changes_inside_it():
+    df = history({"B": [0, 3, 3, 0, 0, 1, 0, 0]})
+    result = metrics(df, since=DAYS[4])
+    # only the day 5 → 6 cycle starts and ends in the window
+    assert result.loc["B", "Avg Days In Stock Per Cycle"] == 1.0
+    assert result.loc["B", "Stockout Frequency"] == 1
+    # the current stretch is counted in full
+    assert result.loc["B", "Days Out of Stock"] == 2
+
+
+def test_saved_index_is_extended_with_new_days(tmp_path):
+    path = str(tmp_path / "stock_runs" / "tenant.pkl")
+    df = history({
+        "A": [4, 4, 0, 2, 2, 2, 0, 5],
+        "B": [0, 3, 3, 0, 0, 1, 0, 0],
+    })
+    metrics(df[df["Date"] <= DAYS[4]], path=path)
+    # the next run's history starts later and brings a series first
+    # reported after the saved days
+    later = pd.concat([df[df["Date"] >= DAYS[2]],
+                       history({"N": [None, None, None, None, None, 1, 0, 1]})])
+    resumed = metrics(later, since=DAYS[2], path=path, closed_until=DAYS[6])
+    fresh = metrics(pd.concat([df, history({"N": [None, None, None, None, None, 1, 0, 1]})]),
+                    since=DAYS[2])
+    pd.testing.assert_frame_equal(resumed, fresh.loc[resumed.index])
+
+
+@pytest.mark.parametrize("since", [None, DAYS[3]])
+def test_window_matches_a_history_cut_to_the_window(since):
+    df = history({
+        "A": [4, 4, 0, 2, 2, 2, 0, 5],
+        "B": [0, 3, 3, 0, 0, 1, 0, 0],
+        "C": [0, 6, None, 6, 0, 0, 0, 0],
+    })
+    cut = df if since is None else df[df["Date"] >= since]
+    windowed = metrics(df, since=since)
+    expected = metrics(cut)
+    columns = ["Last In Stock Date", "Avg Days In Stock Per Cycle", "Stockout Frequency"]
+    pd.testing.assert_frame_equal(windowed[columns], expected[columns])
+
+
+def test_longer_history_than_the_saved_index_rebuilds_it(tmp_path):
+    path = str(tmp_path / "stock_runs" / "tenant.pkl")
+    df = history({
+        "A": [4, 4, 0, 2, 2, 2, 0, 5],
+        "B": [0, 3, 3, 0, 0, 1, 0, 0],
+    })
+    # saved from a run with a shorter history
+    metrics(df[df["Date"] >= DAYS[4]], path=path)
+
+    rebuilt = metrics(df, path=path)
+    pd.testing.assert_frame_equal(rebuilt, metrics(df))
+
+
+def test_saved_index_drops_runs_before_the_history(tmp_path):
+    path = str(tmp_path / "stock_runs" / "tenant.pkl")
+    df = history({"B": [0, 3, 3, 0, 0, 1, 0, 0]})
+    metrics(df[df["Date"] <= DAYS[4]], path=path)
+    metrics(df[df["Date"] >= DAYS[4]], path=path)
+
+    runs = StockRuns.load(path)
+    assert runs.kept_from == runs.day(DAYS[4])
+    assert (runs.closed[:, 3] >= runs.kept_from).all()
+    assert len(runs.closed) == 2
+
+
+def test_unreadable_saved_index_is_logged_and_rebuilt(tmp_path, caplog):
+    df = history({"A": [4, 4, 0, 2, 2, 2, 0, 5]})
+    path = tmp_path / "runs.pkl"
+    path.write_bytes(b"cut off")
+
+    with caplog.at_level("WARNING", logger="etl.stock_runs"):
+        result = metrics(df, path=str(path))
+
+    assert result.equals(metrics(df))
+    assert "Ignoring unreadable stock-run index" in caplog.text
@@ -0,0 +1,68 @@
+import hashlib
+import io
+import zipfile
+
+import pytest
+
+from template_file import NotATemplateError, stream_to_file
+
+
+def workbook_bytes() -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        zf.writestr("[Content_Types].xml", "<Types/>")
+        zf.writestr("xl/workbook.xml", "<workbook/>")
+        zf.writestr("xl/worksheets/sheet1.xml", "<worksheet/>" * 5000)
+    return buffer.getvalue()
+
+
+class Response:
+    def __init__(self, body: bytes, content_length: int = None, chunk: int = 1000):
+        self.body = body
+        self.chunk = chunk
+        self.headers = {"Content-Length": str(len(body) if content_length is None else content_length)}
+        self.closed = False
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.body), self.chunk):
+            yield self.body[i:i + self.chunk]
+
+    def close(self):
+        self.closed = True
+
+
+def test_download_is_written_with_its_hash(tmp_path):
+    body = workbook_bytes()
+    dest = tmp_path / "template.xlsm"
+    resp = Response(body)
+
+    template = stream_to_file(resp, str(dest))
+
+    assert dest.read_bytes() == body
+    assert template.size == len(body)
+    assert template.sha256 == hashlib.sha256(body).hexdigest()
+    assert resp.closed
+
+
+def test_truncated_download_leaves_the_old_template(tmp_path):
+    body = workbook_bytes()
+    dest = tmp_path / "template.xlsm"
+    dest.write_bytes(b"previous")
+
+    with pytest.raises(RuntimeError, match="truncated"):
+        stream_to_file(Response(body[:len(body) // 2], content_length=len(body)), str(dest))
+
+    assert dest.read_bytes() == b"previous"
+    assert [p.name for p in tmp_path.iterdir()] == ["template.xlsm"]
+
+
+def test_html_page_is_not_saved_and_its_start_is_kept(tmp_path):
+    page = b"<html><body>Please sign in</body></html>" * 100
+    dest = tmp_path / "template.xlsm"
+
+    with pytest.raises(NotATemplateError) as raised:
+        stream_to_file(Response(page), str(dest), max_error_body=2000)
+
+    assert raised.value.head.startswith(b"<html>")
+    assert 2000 <= len(raised.value.head) < len(page)
+    assert not dest.exists()
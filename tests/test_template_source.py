@@ -0,0 +1,91 @@
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import template_source
+from template_file import TemplateFile
+from template_source import TEMPLATE_FILENAME, acquire_order_form
+
+
+def failed_download():
+    raise RuntimeError("site down")
+
+
+def write_workbook(path):
+    with zipfile.ZipFile(path, "w") as zf:
+        zf.writestr("[Content_Types].xml", "<Types/>")
+        zf.writestr("xl/workbook.xml", "<workbook/>")
+
+
+@pytest.fixture
+def downloaded(tmp_path, monkeypatch):
+    path = tmp_path / "download.xlsm"
+    write_workbook(path)
+    monkeypatch.setattr(template_source, "download_order_form", lambda: TemplateFile(str(path)))
+    return path
+
+
+def test_downloaded_template_is_used(tmp_path, downloaded):
+    result = acquire_order_form(str(tmp_path))
+
+    assert result["source"] == "download"
+    assert result["template"].path == str(downloaded)
+    assert result["error"] is None
+
+
+def test_failed_download_falls_back_to_a_valid_local_copy(tmp_path, monkeypatch):
+    monkeypatch.setattr(template_source, "download_order_form", failed_download)
+    monkeypatch.setattr(template_source, "check_excel_file", lambda path: True)
+    write_workbook(tmp_path / TEMPLATE_FILENAME)
+
+    result = acquire_order_form(str(tmp_path))
+
+    assert result["source"] == "local"
+    assert result["template"].path == str(tmp_path / TEMPLATE_FILENAME)
+    assert [level for level, _ in result["messages"]] == ["warning", "info"]
+
+
+def test_invalid_local_copy_is_reported_as_an_error(tmp_path, monkeypatch):
+    monkeypatch.setattr(template_source, "download_order_form", failed_download)
+    (tmp_path / TEMPLATE_FILENAME).write_text("<html>Sign in</html>")
+
+    result = acquire_order_form(str(tmp_path))
+
+    assert result["template"] is None
+    assert isinstance(result["error"], ValueError)
+
+
+def test_without_any_template_the_user_is_asked_for_one(tmp_path, monkeypatch):
+    monkeypatch.setattr(template_source, "download_order_form", failed_download)
+
+    result = acquire_order_form(str(tmp_path))
+
+    assert result["template"] is None and result["error"] is None
+    assert result["messages"][0][0] == "warning"
+
+
+def test_template_is_fetched_while_the_etl_runs(tmp_path, monkeypatch):
+    # each task waits for the other to have started: run one after the
+    # other, this would time out
+    etl_started, download_started = threading.Event(), threading.Event()
+    path = tmp_path / "download.xlsm"
+    write_workbook(path)
+
+    def download():
+        download_started.set()
+        assert etl_started.wait(5)
+        return TemplateFile(str(path))
+    monkeypatch.setattr(template_source, "download_order_form", download)
+
+    def etl():
+        etl_started.set()
+        assert download_started.wait(5)
+        return "report"
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        etl_future = pool.submit(etl)
+        template_future = pool.submit(acquire_order_form, str(tmp_path))
+        assert template_future.result()["source"] == "download"
+        assert etl_future.result() == "report"
@@ -0,0 +1,47 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from order_optimizer import LIMIT_SHELF
+from whatif import order_scenarios
+
+TODAY = date(2024, 3, 1)
+
+
+def items():
+    return pd.DataFrame({"AGLC SKU": ["X", "Y"], "Location": ["Store", "Store"]})
+
+
+def test_scenarios_order_whole_cases():
+    # 10 and 20 days of cover: X needs 20 / 40 units of 12 per case
+    # (1.7 / 3.3 cases), Y 5 / 10 units of 6 per case (0.8 / 1.7 cases)
+    cube = order_scenarios(items(), [2, 0.5], [0, 0], [12, 6],
+                           [date(2024, 3, 4)], buffers=[7, 17], today=TODAY)
+
+    short = cube.scenario(date(2024, 3, 4), 7)
+    assert short["Cases Needed"].tolist() == pytest.approx([1.7, 0.8])
+    assert short["Order Qty"].tolist() == [2, 1]
+    assert cube.scenario(date(2024, 3, 4), 17)["Order Qty"].tolist() == [3, 2]
+    assert cube.summary()["Order Qty"].tolist() == [3, 5]
+
+
+def test_scenarios_keep_to_the_shelf_limit():
+    # X would order 4 cases of 12, but 30 units on hand leave room for 2 under 60
+    cube = order_scenarios(items(), [3, 0], [30, 0], [12, 6],
+                           [date(2024, 3, 8)], buffers=[14], today=TODAY, shelf_units=60)
+
+    scenario = cube.scenario(date(2024, 3, 8), 14)
+    assert scenario["Units Needed"].tolist() == [33, 0]
+    assert scenario["Order Qty"].tolist() == [2, 0]
+    assert scenario["Order Limited By"].tolist() == [LIMIT_SHELF, ""]
+    assert cube.summary()["Lines Limited"].tolist() == [1]
+
+
+def test_scenarios_share_the_budget_like_the_order_sheets():
+    cube = order_scenarios(items(), [3, 3], [0, 0], [10, 10],
+                           [date(2024, 3, 8)], buffers=[14], today=TODAY,
+                           unit_cost=[1, 1], budget=100)
+
+    # 63 units each: the budget buys 10 cases of the 12 asked for
+    assert cube.summary()["Order Qty"].tolist() == [10]
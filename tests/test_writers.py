@@ -0,0 +1,74 @@
+import os
+
+import pandas as pd
+import pytest
+
+from etl import writers
+from etl.writers import CSV_GZ, KEEP_GENERATIONS, read_partitions, write_report
+
+
+def report(value):
+    return [("Store", pd.DataFrame({"SKU": ["A"], "Qty": [value]}))]
+
+
+def generations(path):
+    return [name for name in os.listdir(path) if name.startswith(writers.GENERATION_PREFIX)]
+
+
+def test_rewrite_keeps_the_published_generation_readable(tmp_path):
+    path = str(tmp_path / "report.csv.gz")
+    write_report(report(1), path, CSV_GZ)
+    first = writers._manifest(path)["directory"]
+
+    write_report(report(2), path, CSV_GZ)
+
+    assert read_partitions(path)["Store"]["Qty"].tolist() == [2]
+    # a reader still holding the first manifest can read its files
+    assert os.path.isfile(os.path.join(path, first, "Store.csv.gz"))
+
+
+def test_old_generations_are_pruned(tmp_path):
+    path = str(tmp_path / "report.csv.gz")
+    for value in range(KEEP_GENERATIONS + 2):
+        write_report(report(value), path, CSV_GZ)
+
+    assert len(generations(path)) == KEEP_GENERATIONS
+    assert writers._manifest(path)["directory"] in generations(path)
+
+
+def test_arrow_formats_are_offered_only_with_pyarrow(monkeypatch):
+    monkeypatch.setattr(writers, "pyarrow", None)
+    assert writers.available_formats() == [writers.EXCEL, CSV_GZ]
+
+
+def test_locations_sharing_the_first_31_characters_get_their_own_partitions():
+    taken = {name.lower() for name in writers.RESERVED_NAMES}
+    long_name = "Downtown Edmonton Whyte Avenue Store"
+    names = [writers.partition_name(loc, taken)
+             for loc in (long_name + " North", long_name + " South", "summary", "Summary")]
+
+    assert names[0] == long_name[:31]
+    assert names[1] == long_name[:29] + "~2"
+    assert names[2:] == ["summary~2", "Summary~3"]
+    assert all(len(name) <= writers.MAX_NAME for name in names)
+
+
+def test_duplicate_partition_names_are_refused(tmp_path):
+    path = str(tmp_path / "report.csv.gz")
+    with pytest.raises(ValueError):
+        write_report(report(1) + report(2), path, CSV_GZ)
+
+
+def test_csv_partitions_keep_their_types(tmp_path):
+    df = pd.DataFrame({
+        "SKU":        ["00123", "CNB-7", None],
+        "Qty":        [1, 2, 3],
+        "Price":      [1.5, None, 2.0],
+        "In Stock":   [True, False, True],
+        "Last Date":  pd.to_datetime(["2024-03-01", None, "2024-03-03"]),
+        "Brand":      pd.Series(["A", "B", "A"], dtype="category"),
+    })
+    path = str(tmp_path / "report.csv.gz")
+    write_report([("Store", df)], path, CSV_GZ)
+
+    pd.testing.assert_frame_equal(read_partitions(path)["Store"], df)
@@ -0,0 +1,102 @@
+from datetime import datetime
+
+import openpyxl
+import pandas as pd
+import pytest
+
+import xlsx_reader
+from template_file import TemplateFile
+from xlsx_reader import BACKENDS, CATALOGUE_SHEETS, quick_check, read_sheet
+
+
+@pytest.fixture
+def sheet_with_gaps(tmp_path):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Catalogue"
+    ws.append(["AGLC SKU", "Qty", "Price", "Received", "Note"])
+    ws.append(["CNB-1", 1, 2.5, datetime(2024, 1, 1), "x"])
+    ws.append(["CNB-2", "", None, None, 3])
+    ws.append(["CNB-3", 3, " ", datetime(2024, 1, 3), None])
+    ws.append([None, 4, 6, None, "y"])
+    path = tmp_path / "gaps.xlsx"
+    wb.save(path)
+    return str(path)
+
+
+def test_numbers_with_blanks_are_numeric(sheet_with_gaps):
+    df = read_sheet(sheet_with_gaps, "Catalogue", header_detect=False, backend="iterparse")
+    assert df["Qty"].dtype == "float64"
+    assert df["Price"].dtype == "float64"
+    assert df["Qty"].isna().tolist() == [False, True, False, False]
+    # a column with real text keeps its values as they are
+    assert df["Note"].tolist()[:2] == ["x", 3]
+
+
+@pytest.mark.skipif("calamine" not in BACKENDS, reason="python-calamine is not installed")
+def test_backends_agree_on_sheet_with_gaps(sheet_with_gaps):
+    iterparse = read_sheet(sheet_with_gaps, "Catalogue", header_detect=False, backend="iterparse")
+    calamine = read_sheet(sheet_with_gaps, "Catalogue", header_detect=False, backend="calamine")
+    assert dict(iterparse.dtypes) == dict(calamine.dtypes)
+    pd.testing.assert_frame_equal(iterparse, calamine)
+
+
+def order_form(path, headers=("AGLC SKU", "Description", "EachesPerCase"), sheet="Catalogue"):
+    wb = openpyxl.Workbook()
+    wb.active.title = "Order Form"
+    ws = wb.create_sheet(sheet)
+    ws.append(["AGLC Manual Order Form"])
+    ws.append([])
+    ws.append(list(headers))
+    ws.append(["00123", "Flower 3.5g", 12])
+    ws.append(["CNB-2", "Pre-roll", 24])
+    wb.save(path)
+    return str(path)
+
+
+def test_quick_check_finds_the_catalogue_header(tmp_path):
+    verdict = quick_check(order_form(tmp_path / "form.xlsx"))
+
+    assert verdict["valid"] and verdict["usable"]
+    assert verdict["sheet"] == "Catalogue"
+    assert verdict["sheets"] == ["Order Form", "Catalogue"]
+    assert verdict["header_row"] == 3
+    assert verdict["missing_headers"] == []
+
+
+def test_quick_check_names_the_missing_headers(tmp_path):
+    verdict = quick_check(order_form(tmp_path / "form.xlsx", headers=("AGLC SKU", "Description"),
+                                     sheet="Catalog"))
+
+    assert verdict["valid"] and not verdict["usable"]
+    assert verdict["sheet"] == "Catalog"
+    assert verdict["missing_headers"] == ["EachesPerCase"]
+
+
+def test_quick_check_rejects_a_page_saved_as_a_workbook(tmp_path):
+    path = tmp_path / "form.xlsm"
+    path.write_text("<html>Sign in</html>")
+    verdict = quick_check(str(path))
+
+    assert not verdict["valid"] and not verdict["usable"]
+    assert verdict["error"].startswith("BadZipFile")
+
+
+def test_template_is_read_through_a_memory_map_like_read_excel(tmp_path, monkeypatch):
+    path = order_form(tmp_path / "form.xlsm", sheet="Catalog",
+                      headers=("AGLC SKU", None, "EachesPerCase", "EachesPerCase"))
+    maps, original = [], xlsx_reader.map_file
+
+    def map_file(p):
+        maps.append(original(p))
+        return maps[-1]
+    monkeypatch.setattr(xlsx_reader, "map_file", map_file)
+
+    df = read_sheet(TemplateFile(path), CATALOGUE_SHEETS, backend="iterparse")
+
+    expected = pd.read_excel(path, sheet_name="Catalog", header=2)
+    assert list(df.columns) == list(expected.columns) == ["AGLC SKU", "Unnamed: 1", "EachesPerCase", "EachesPerCase.1"]
+    assert df["AGLC SKU"].tolist() == ["00123", "CNB-2"]
+    assert (df.attrs["sheet"], df.attrs["header_row"]) == ("Catalog", 3)
+    # the template was mapped, not read into memory, and the map is released
+    assert len(maps) == 1 and maps[0].closed